@@ -0,0 +1,150 @@
+"""Run the reduction benchmarks and compare them against recorded baselines.
+
+Usage::
+
+    python -m benchmarks.run [--scale small] [--update] [NAME ...]
+"""
+
+import argparse
+import gc
+import importlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from benchmarks.workloads import workloads
+from satreduce.reducer import shrink_sat
+
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+METRICS = ("wall_time", "test_calls", "peak_memory")
+
+
+def run_workload(workload):
+    calls = 0
+
+    def test(clauses):
+        nonlocal calls
+        calls += 1
+        return workload.test(clauses)
+
+    # Otherwise the peak depends on how close the garbage collector happens
+    # to be to its next run, which varies with what ran before.
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = shrink_sat(workload.clauses, test)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_time": elapsed,
+        "test_calls": calls,
+        "peak_memory": peak,
+        "initial_clauses": len(workload.clauses),
+        "final_clauses": len(result),
+    }
+
+
+def load_baselines(path=BASELINES):
+    try:
+        with open(path) as i:
+            return json.load(i)
+    except FileNotFoundError:
+        return {}
+
+
+def compare(result, baseline, tolerance):
+    """Returns a list of (metric, ratio) pairs where ``result`` is worse than
+    ``baseline`` by more than ``tolerance``."""
+    regressions = []
+    for metric in METRICS:
+        if metric not in baseline or baseline[metric] <= 0:
+            continue
+        ratio = result[metric] / baseline[metric]
+        if ratio > tolerance:
+            regressions.append((metric, ratio))
+    return regressions
+
+
+def format_row(name, result, baseline):
+    parts = [f"{name:<24}"]
+    for metric, fmt in (
+        ("wall_time", "{:8.2f}s"),
+        ("test_calls", "{:8d} tests"),
+        ("peak_memory", "{:8.1f}MB"),
+    ):
+        value = result[metric]
+        if metric == "peak_memory":
+            value /= 1024 * 1024
+        cell = fmt.format(value)
+        if baseline and baseline.get(metric):
+            cell += f" ({result[metric] / baseline[metric]:5.2f}x)"
+        parts.append(cell)
+    return "  ".join(parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", help="Only run these workloads")
+    parser.add_argument(
+        "--scale",
+        action="append",
+        choices=["small", "medium", "large"],
+        help="Only run workloads of this scale. May be repeated.",
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Record the results as the new baselines",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.25,
+        help="Ratio to baseline above which a metric counts as a regression",
+    )
+    parser.add_argument("--baselines", default=BASELINES)
+    args = parser.parse_args(argv)
+
+    # The reducer only imports this once a pass needs it, and under
+    # tracemalloc that would count towards whichever workload ran first.
+    # benchmarks.startup measures import times instead.
+    importlib.import_module("satreduce.decomposition")
+
+    baselines = load_baselines(args.baselines)
+    results = {}
+    failed = False
+
+    for workload in workloads():
+        if args.names and workload.name not in args.names:
+            continue
+        if args.scale and workload.scale not in args.scale:
+            continue
+        result = run_workload(workload)
+        results[workload.name] = result
+        baseline = baselines.get(workload.name)
+        print(format_row(workload.name, result, baseline), flush=True)
+        if baseline and not args.update:
+            for metric, ratio in compare(result, baseline, args.tolerance):
+                failed = True
+                print(f"  REGRESSION: {metric} is {ratio:.2f}x baseline")
+
+    if args.update:
+        baselines.update(results)
+        with open(args.baselines, "w") as o:
+            json.dump(baselines, o, indent=2, sort_keys=True)
+            o.write("\n")
+        return 0
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Measure how long satreduce modules take to import in a fresh interpreter.
+
+Usage::
+
+    python -m benchmarks.startup [--update] [--repeat 5]
+
+This matters when satreduce is used as a library from interestingness
+tests, which pay the import cost on every test run. It also fails if any
+of the core modules pull in a dependency that is only needed by some
+passes or by the command line interface.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.run import BASELINES
+from benchmarks.run import compare
+from benchmarks.run import load_baselines
+
+
+# Modules that should be cheap to import, and the dependencies they must not
+# load when imported.
+CORE_MODULES = ["satreduce.dimacscnf", "satreduce.minisat", "satreduce.reducer"]
+HEAVY_DEPENDENCIES = ["networkx", "attrs", "click"]
+
+MODULES = CORE_MODULES + ["satreduce.__main__"]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def measure_import(module, repeat=5):
+    """Returns the fastest of ``repeat`` imports of ``module``, each in a new
+    interpreter, and the heavy dependencies it loaded."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p)
+    best = None
+    loaded = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                PROBE.format(module=module, heavy=HEAVY_DEPENDENCIES),
+            ],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.splitlines()
+        elapsed = float(out[0])
+        loaded = [m for m in out[1].split(",") if m] if len(out) > 1 else []
+        best = elapsed if best is None else min(best, elapsed)
+    return best, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Record the results as the new baselines",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.5,
+        help="Ratio to baseline above which an import time counts as a regression",
+    )
+    parser.add_argument("--baselines", default=BASELINES)
+    args = parser.parse_args(argv)
+
+    baselines = load_baselines(args.baselines)
+    results = {}
+    failed = False
+
+    for module in MODULES:
+        elapsed, loaded = measure_import(module, args.repeat)
+        name = f"import {module}"
+        result = {"wall_time": elapsed}
+        results[name] = result
+        baseline = baselines.get(name)
+        line = f"{name:<32}  {1000 * elapsed:8.1f}ms"
+        if baseline and baseline.get("wall_time"):
+            line += f" ({elapsed / baseline['wall_time']:5.2f}x)"
+        print(line, flush=True)
+        if module in CORE_MODULES and loaded:
+            failed = True
+            print(f"  REGRESSION: loads {', '.join(loaded)}")
+        if baseline and not args.update:
+            for metric, ratio in compare(result, baseline, args.tolerance):
+                failed = True
+                print(f"  REGRESSION: {metric} is {ratio:.2f}x baseline")
+
+    if args.update:
+        baselines.update(results)
+        with open(args.baselines, "w") as o:
+            json.dump(baselines, o, indent=2, sort_keys=True)
+            o.write("\n")
+        return 0
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""Generated reduction workloads for benchmarking.
+
+Each workload pairs a CNF with a deterministic, in-process interestingness
+predicate, so that runs are reproducible. Most predicates only depend on
+properties that are invariant under the renamings the reducer performs.
+The exception is chain_implication, which asks about variables 1 and n by
+number, so what it reduces to depends on how variables are renumbered.
+"""
+
+import random
+from itertools import combinations
+
+
+def is_satisfiable(clauses):
+    """A small DPLL solver, so that benchmarks don't depend on external
+    solvers being installed."""
+    return _dpll([frozenset(c) for c in clauses])
+
+
+def _dpll(clauses):
+    while True:
+        if not clauses:
+            return True
+        unit = None
+        for c in clauses:
+            if not c:
+                return False
+            if len(c) == 1:
+                unit = next(iter(c))
+                break
+        if unit is None:
+            break
+        clauses = _assign(clauses, unit)
+
+    counts = {}
+    for c in clauses:
+        for l in c:
+            counts[l] = counts.get(l, 0) + 1
+    literal = max(counts, key=lambda l: (counts[l], l))
+    return _dpll(_assign(clauses, literal)) or _dpll(_assign(clauses, -literal))
+
+
+def _assign(clauses, literal):
+    return [c - {-literal} for c in clauses if literal not in c]
+
+
+def random_ksat(n_variables, n_clauses, k, seed):
+    rnd = random.Random(seed)
+    return [
+        [v * rnd.choice((-1, 1)) for v in rnd.sample(range(1, n_variables + 1), k)]
+        for _ in range(n_clauses)
+    ]
+
+
+def unsatisfiable_random_ksat(n_variables, n_clauses, k, seed):
+    while True:
+        clauses = random_ksat(n_variables, n_clauses, k, seed)
+        if not is_satisfiable(clauses):
+            return clauses
+        seed += 1
+
+
+def planted_ksat(n_variables, n_clauses, k, seed):
+    """Random k-SAT where every clause is satisfied by a hidden assignment."""
+    rnd = random.Random(seed)
+    solution = {v: rnd.random() < 0.5 for v in range(1, n_variables + 1)}
+    clauses = []
+    while len(clauses) < n_clauses:
+        clause = [
+            v * rnd.choice((-1, 1)) for v in rnd.sample(range(1, n_variables + 1), k)
+        ]
+        if any((l > 0) == solution[abs(l)] for l in clause):
+            clauses.append(clause)
+    return clauses
+
+
+def pigeonhole(n_holes):
+    """n_holes + 1 pigeons in n_holes holes. Unsatisfiable."""
+
+    def var(pigeon, hole):
+        return pigeon * n_holes + hole + 1
+
+    clauses = [[var(p, h) for h in range(n_holes)] for p in range(n_holes + 1)]
+    for h in range(n_holes):
+        for p, q in combinations(range(n_holes + 1), 2):
+            clauses.append([-var(p, h), -var(q, h)])
+    return clauses
+
+
+def chain(n):
+    return [[-i, i + 1] for i in range(1, n + 1)]
+
+
+def industrial(n_communities, community_size, clauses_per_community, seed):
+    """Clusters of densely connected variables joined by a few bridging
+    clauses, roughly the shape of many real-world instances."""
+    rnd = random.Random(seed)
+    clauses = []
+    for c in range(n_communities):
+        base = c * community_size
+        for _ in range(clauses_per_community):
+            width = rnd.choice((2, 2, 3, 3, 3, 4))
+            variables = rnd.sample(range(base + 1, base + community_size + 1), width)
+            clauses.append([v * rnd.choice((-1, 1)) for v in variables])
+        if c > 0:
+            a = rnd.randint(base - community_size + 1, base)
+            b = rnd.randint(base + 1, base + community_size)
+            clauses.append([-a, b])
+    return clauses
+
+
+def unsatisfiable(clauses):
+    return len(clauses) > 0 and all(clauses) and not is_satisfiable(clauses)
+
+
+def satisfiable_with_wide_clause(k):
+    def test(clauses):
+        return any(len(c) >= k for c in clauses) and is_satisfiable(clauses)
+
+    return test
+
+
+def chain_implication(n):
+    def test(clauses):
+        clauses = list(clauses)
+        return (
+            is_satisfiable(clauses)
+            and is_satisfiable(clauses + [[1], [n]])
+            and is_satisfiable(clauses + [[-1], [-n]])
+            and not is_satisfiable(clauses + [[1], [-n]])
+        )
+
+    return test
+
+
+def shares_wide_clauses(count):
+    """At least ``count`` clauses of width >= 3 all mentioning one variable."""
+
+    def test(clauses):
+        occurrences = {}
+        for c in clauses:
+            if len(c) >= 3:
+                for l in c:
+                    occurrences[abs(l)] = occurrences.get(abs(l), 0) + 1
+        return any(n >= count for n in occurrences.values())
+
+    return test
+
+
+class Workload:
+    def __init__(self, name, scale, clauses, test):
+        self.name = name
+        self.scale = scale
+        self.clauses = clauses
+        self.test = test
+
+    def __repr__(self):
+        return f"Workload({self.name!r}, scale={self.scale!r})"
+
+
+def workloads():
+    yield Workload(
+        "random-3sat-unsat-12",
+        "small",
+        unsatisfiable_random_ksat(12, 80, 3, 0),
+        unsatisfiable,
+    )
+    yield Workload(
+        "random-3sat-unsat-20",
+        "medium",
+        unsatisfiable_random_ksat(20, 130, 3, 0),
+        unsatisfiable,
+    )
+    yield Workload(
+        "planted-3sat-30",
+        "small",
+        planted_ksat(30, 120, 3, 0),
+        satisfiable_with_wide_clause(3),
+    )
+    yield Workload(
+        "planted-3sat-80",
+        "medium",
+        planted_ksat(80, 320, 3, 0),
+        satisfiable_with_wide_clause(3),
+    )
+    yield Workload("pigeonhole-3", "small", pigeonhole(3), unsatisfiable)
+    yield Workload("pigeonhole-4", "medium", pigeonhole(4), unsatisfiable)
+    yield Workload("chain-10", "small", chain(10), chain_implication(10))
+    yield Workload("chain-40", "medium", chain(40), chain_implication(40))
+    yield Workload(
+        "industrial-10x30", "medium", industrial(10, 30, 60, 0), shares_wide_clauses(3)
+    )
+    yield Workload(
+        "industrial-50x40", "large", industrial(50, 40, 100, 0), shares_wide_clauses(3)
+    )
+    yield Workload(
+        "industrial-200x50",
+        "large",
+        industrial(200, 50, 120, 0),
+        shares_wide_clauses(4),
+    )
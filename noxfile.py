@@ -192,6 +192,13 @@ def coverage(session: Session) -> None:
     session.run("coverage", *args)
 
 
+@session(python=python_versions[0])
+def benchmarks(session: Session) -> None:
+    """Run the reduction benchmarks against the recorded baselines."""
+    session.install(".")
+    session.run("python", "-m", "benchmarks.run", *session.posargs)
+
+
 @session(python=python_versions[0])
 def typeguard(session: Session) -> None:
     """Runtime type checking using Typeguard."""
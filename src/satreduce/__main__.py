@@ -1,20 +1,40 @@
 import hashlib
+import json
 import os
 import random
+import re
 import shlex
 import signal
-import subprocess
 import sys
-import time
+import threading
 import traceback
 from shutil import which
-from tempfile import TemporaryDirectory
 
 import click
 
+from satreduce.adaptive import AdaptiveTimeout
+from satreduce.adaptive import ParallelismController
+from satreduce.batch import BatchReducer
+from satreduce.batch import find_batch_files
+from satreduce.batch import format_batch_report
 from satreduce.dimacscnf import clauses_to_dimacs
 from satreduce.dimacscnf import dimacs_to_clauses
+from satreduce.distributed import AuthenticationFailed
+from satreduce.distributed import Coordinator
+from satreduce.distributed import NoWorkers
+from satreduce.distributed import parse_address
+from satreduce.distributed import run_worker
+from satreduce.limits import CgroupsUnavailable
+from satreduce.limits import ResourceLimits
+from satreduce.profiler import SamplingProfiler
 from satreduce.reducer import SATShrinker
+from satreduce.runner import DifferentialTest
+from satreduce.runner import PythonTest
+from satreduce.runner import TestCommand
+from satreduce.runner import load_test_function
+from satreduce.trace import ReplayOracle
+from satreduce.trace import TraceWriter
+from satreduce.trace import UnseenCandidate
 
 
 def validate_command(ctx, param, value):
@@ -31,31 +51,38 @@ def validate_command(ctx, param, value):
     return [command] + parts[1:]
 
 
-def signal_group(sp, signal):
-    gid = os.getpgid(sp.pid)
-    assert gid != os.getgid()
-    os.killpg(gid, signal)
+def validate_python_test(ctx, param, value):
+    if value is None:
+        return None
+    # Like python -m, look for the test's module in the current directory.
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+    try:
+        load_test_function(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    return value
 
 
-def interrupt_wait_and_kill(sp, timeout=0.1):
-    if sp.returncode is None:
-        try:
-            # In case the subprocess forked. Python might hang if you don't close
-            # all pipes.
-            for pipe in [sp.stdout, sp.stderr, sp.stdin]:
-                if pipe:
-                    pipe.close()
-            signal_group(sp, signal.SIGINT)
-            for _ in range(10):
-                if sp.poll() is not None:
-                    return
-                time.sleep(timeout)
-            signal_group(sp, signal.SIGKILL)
-        except ProcessLookupError:  # pragma: no cover
-            # This is incredibly hard to trigger reliably, because it only happens
-            # if the process exits at exactly the wrong time.
-            pass
-        sp.wait(timeout=timeout)
+def validate_regex(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        re.compile(value, re.MULTILINE)
+    except re.error as e:
+        raise click.BadParameter(f"{value!r} is not a valid regular expression: {e}")
+    return value
+
+
+def validate_exit_codes(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        return frozenset(int(code) for code in value.split(","))
+    except ValueError:
+        raise click.BadParameter(
+            f"{value!r} is not a comma separated list of exit codes"
+        ) from None
 
 
 @click.command(
@@ -90,12 +117,105 @@ returns 0.
         "as failing the test"
     ),
 )
+@click.option(
+    "--property",
+    "test_property",
+    default="any",
+    type=click.Choice(["any", "unsat"]),
+    help=(
+        "What the test checks for. With unsat, the test must only be "
+        "interesting for unsatisfiable formulas, and satreduce uses minisat "
+        "to find a minimal unsatisfiable subset before confirming it with the "
+        "test and polishing it with the usual passes."
+    ),
+)
+@click.option(
+    "--mus-algorithm",
+    default="deletion",
+    type=click.Choice(["deletion", "quickxplain"]),
+    help=(
+        "How to find minimal unsatisfiable subsets with --property=unsat. "
+        "quickxplain is faster when the subset is much smaller than the "
+        "formula."
+    ),
+)
+@click.option(
+    "--stdout-match",
+    default=None,
+    callback=validate_regex,
+    help=(
+        "Only count a test as interesting if its standard output matches this "
+        "regular expression. Output is read as it arrives and the test is "
+        "stopped as soon as it matches, so its exit code is ignored unless "
+        "--exit-codes is also given."
+    ),
+)
+@click.option(
+    "--stderr-match",
+    default=None,
+    callback=validate_regex,
+    help="Like --stdout-match, but for standard error.",
+)
+@click.option(
+    "--exit-codes",
+    default=None,
+    callback=validate_exit_codes,
+    help=(
+        "Comma separated exit codes that count as interesting. Defaults to 0, "
+        "or to any exit code when --stdout-match or --stderr-match is given."
+    ),
+)
+@click.option(
+    "--adaptive-timeout/--no-adaptive-timeout",
+    default=False,
+    help=(
+        "Time out each test at a multiple of the 99th percentile of recent "
+        "test runtimes, scaled down as the formula shrinks. --timeout is "
+        "then the upper limit, and is used for the initial test."
+    ),
+)
+@click.option(
+    "--timeout-multiplier",
+    default=5.0,
+    type=click.FloatRange(min=1.0),
+    help="Multiple of the observed runtime to use with --adaptive-timeout.",
+)
+@click.option(
+    "--min-timeout",
+    default=0.1,
+    type=click.FloatRange(min=0.0),
+    help="Lower limit in seconds for --adaptive-timeout.",
+)
 @click.option(
     "--parallelism",
     default=os.cpu_count(),
     type=click.INT,
     help="Number of tests to run in parallel.",
 )
+@click.option(
+    "--adaptive-parallelism/--no-adaptive-parallelism",
+    default=False,
+    help=(
+        "Adjust the number of tests run in parallel as the reduction goes, "
+        "based on test throughput, load average and memory pressure. "
+        "--parallelism is then the number to start with."
+    ),
+)
+@click.option(
+    "--min-parallelism",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Lower limit for --adaptive-parallelism.",
+)
+@click.option(
+    "--max-parallelism",
+    default=0,
+    type=click.INT,
+    help=(
+        "Upper limit for --adaptive-parallelism. If set to <= 0 then twice "
+        "the number of CPUs is used."
+    ),
+)
 @click.option(
     "--input-type",
     default="all",
@@ -109,9 +229,248 @@ How to pass input to the test function. Options are:
 4. all (the default) does all of the above.
     """.strip(),
 )
-@click.argument("test", callback=validate_command)
+@click.option(
+    "--max-tests",
+    default=0,
+    type=click.INT,
+    help=(
+        "Stop after running this many tests and keep the best result found so "
+        "far. If set to <= 0 then there is no limit."
+    ),
+)
+@click.option(
+    "--deadline",
+    default=0,
+    type=click.FLOAT,
+    help=(
+        "Stop after this many seconds and keep the best result found so far. "
+        "If set to <= 0 then there is no limit."
+    ),
+)
+@click.option(
+    "--stats",
+    default="",
+    help=(
+        "Write per-pass performance statistics as JSON to this file and print "
+        "a summary table when the reduction finishes"
+    ),
+)
+@click.option(
+    "--record-trace",
+    default="",
+    help=(
+        "Append the cache key, verdict and latency of every test run to this "
+        "file, for later use with --replay-trace"
+    ),
+)
+@click.option(
+    "--replay-trace",
+    default="",
+    help=(
+        "Answer tests from a trace written by --record-trace instead of "
+        "running the test command"
+    ),
+)
+@click.option(
+    "--replay-unseen",
+    default="uninteresting",
+    type=click.Choice(["uninteresting", "run", "error"]),
+    help=(
+        "What to do with candidates that are not in the replayed trace: treat "
+        "them as uninteresting, run the real test, or stop with an error."
+    ),
+)
+@click.option(
+    "--simulate-latency/--no-simulate-latency",
+    default=False,
+    help="When replaying a trace, sleep for each test's recorded latency",
+)
+@click.option(
+    "--canonical-labelling/--no-canonical-labelling",
+    default=False,
+    help=(
+        "Share cached test results between candidates that differ only in how "
+        "variables are numbered or which polarity they have. Only use this "
+        "if your test is insensitive to such renamings."
+    ),
+)
+@click.option(
+    "--split-components/--no-split-components",
+    default=False,
+    help=(
+        "When the formula has several components that share no variables, "
+        "reduce each of them concurrently in its own sub-reducer"
+    ),
+)
+@click.option(
+    "--coarse-threshold",
+    default=1000,
+    type=click.INT,
+    help=(
+        "For formulas with at least this many clauses, first try deleting "
+        "whole regions of related clauses before working clause by clause. "
+        "If set to <= 0 then this is disabled."
+    ),
+)
+@click.option(
+    "--listen",
+    default="",
+    help=(
+        "Run tests on remote satreduce-worker processes instead of locally. "
+        "Accepts connections from workers on this HOST:PORT."
+    ),
+)
+@click.option(
+    "--auth-key-file",
+    default="",
+    type=click.Path(dir_okay=False),
+    help="File containing the shared secret that workers must authenticate with",
+)
+@click.option(
+    "--heartbeat-timeout",
+    default=10.0,
+    type=click.FLOAT,
+    help=(
+        "Consider a worker lost if nothing is heard from it for this many "
+        "seconds, and give its test to another worker"
+    ),
+)
+@click.option(
+    "--worker-timeout",
+    default=300.0,
+    type=click.FLOAT,
+    help=(
+        "Stop with an error if no workers have been connected for this many "
+        "seconds while a test is waiting to run. If set to <= 0 then wait "
+        "forever."
+    ),
+)
+@click.option(
+    "--batch",
+    multiple=True,
+    type=click.Path(exists=True, resolve_path=True, allow_dash=False),
+    help=(
+        "Reduce this file, or every .cnf file in this directory, instead of "
+        "FILENAME. May be given several times. All of the files are reduced "
+        "at once and share --parallelism test slots between them."
+    ),
+)
+@click.option(
+    "--batch-active",
+    default=0,
+    type=click.INT,
+    help=(
+        "With --batch, how many files to have in progress at once. If set to "
+        "<= 0 then twice --parallelism is used."
+    ),
+)
+@click.option(
+    "--python-test",
+    default=None,
+    metavar="MODULE:FUNCTION",
+    callback=validate_python_test,
+    help=(
+        "Use this Python function as the test instead of a TEST command. It "
+        "is imported once and called with each candidate as a tuple of "
+        "clauses, each a tuple of ints, and the candidate is interesting if "
+        "it returns a true value. Don't pass TEST when using this."
+    ),
+)
+@click.option(
+    "--python-test-processes/--python-test-threads",
+    default=False,
+    help=(
+        "Run --python-test in a pool of worker processes rather than in "
+        "threads of this one. Use processes if the test can hang or crash, "
+        "or holds the GIL for long enough to stop tests running in "
+        "parallel. Calls that time out in a thread can't be stopped."
+    ),
+)
+@click.option(
+    "--differential",
+    nargs=2,
+    default=None,
+    metavar="SOLVER SOLVER",
+    help=(
+        "Use two SAT solver commands as the test instead of a TEST command. "
+        "Both are run at once with the candidate file as their last argument, "
+        "and it is interesting if one says it is satisfiable and the other "
+        "says it isn't. Answers are read from exit codes 10 and 20 or from "
+        "'s SATISFIABLE' and 's UNSATISFIABLE' lines. Don't pass TEST when "
+        "using this."
+    ),
+)
+@click.option(
+    "--check-models/--no-check-models",
+    default=False,
+    help=(
+        "With --differential, also count a candidate as interesting if a "
+        "solver claims it is satisfiable but prints a model (on 'v' lines) "
+        "that doesn't satisfy it."
+    ),
+)
+@click.option(
+    "--memory-limit",
+    default=0,
+    type=click.INT,
+    help=(
+        "Limit each test to this many megabytes of memory. If set to <= 0 "
+        "then there is no limit. Tests that go over it are uninteresting, "
+        "and counted separately in --stats when that can be detected, which "
+        "needs --cgroups."
+    ),
+)
+@click.option(
+    "--cpu-time-limit",
+    default=0,
+    type=click.FLOAT,
+    help=(
+        "Limit each test process to this many seconds of CPU time. If set to "
+        "<= 0 then there is no limit."
+    ),
+)
+@click.option(
+    "--pin-cpus/--no-pin-cpus",
+    default=False,
+    help="Run each of the --parallelism concurrent tests on a CPU of its own.",
+)
+@click.option(
+    "--cgroups/--no-cgroups",
+    default=False,
+    help=(
+        "Run each of the --parallelism concurrent tests in a cgroup of its "
+        "own, which enforces --memory-limit on the test as a whole and "
+        "reports when it was exceeded. Needs cgroup v2 with the current "
+        "cgroup delegated to you."
+    ),
+)
+@click.option(
+    "--profile",
+    default="",
+    help=(
+        "Sample the stacks of the threads doing reduction work while it runs "
+        "and write the profile to this file, separating time spent running "
+        "tests and waiting for them from time spent in the reducer itself. "
+        "Files ending in .prof or .pstats are written in pstats format and "
+        "anything else as collapsed stacks for flamegraph tools."
+    ),
+)
+@click.option(
+    "--profile-format",
+    default=None,
+    type=click.Choice(["collapsed", "pstats"]),
+    help="Write --profile in this format regardless of its file extension",
+)
+@click.option(
+    "--profile-interval",
+    default=0.005,
+    type=click.FloatRange(min=0, min_open=True),
+    help="How many seconds apart --profile samples are taken",
+)
+@click.argument("test", required=False)
 @click.argument(
     "filename",
+    required=False,
     type=click.Path(exists=True, resolve_path=True, dir_okay=False, allow_dash=False),
 )
 def main(
@@ -121,8 +480,99 @@ def main(
     filename,
     test,
     timeout,
+    adaptive_timeout,
+    timeout_multiplier,
+    min_timeout,
+    test_property,
+    mus_algorithm,
+    stdout_match,
+    stderr_match,
+    exit_codes,
     parallelism,
+    adaptive_parallelism,
+    min_parallelism,
+    max_parallelism,
+    stats,
+    max_tests,
+    deadline,
+    record_trace,
+    replay_trace,
+    replay_unseen,
+    simulate_latency,
+    canonical_labelling,
+    split_components,
+    coarse_threshold,
+    listen,
+    auth_key_file,
+    heartbeat_timeout,
+    worker_timeout,
+    batch,
+    batch_active,
+    python_test,
+    python_test_processes,
+    differential,
+    check_models,
+    memory_limit,
+    cpu_time_limit,
+    pin_cpus,
+    cgroups,
+    profile,
+    profile_format,
+    profile_interval,
 ):
+    if python_test is not None and differential:
+        raise click.UsageError("--python-test can't be used with --differential")
+    if python_test is not None or differential:
+        # There is no TEST command, so the only argument is the file.
+        source = "--python-test" if python_test is not None else "--differential"
+        if filename is not None:
+            raise click.UsageError(f"TEST can't be used with {source}")
+        if listen:
+            raise click.UsageError(f"--listen can't be used with {source}")
+        if differential:
+            differential = [validate_command(None, None, c) for c in differential]
+        if test is not None:
+            filename = click.Path(
+                exists=True, resolve_path=True, dir_okay=False, allow_dash=False
+            ).convert(test, None, click.get_current_context())
+            test = None
+    elif test is None:
+        raise click.UsageError("Missing argument 'TEST'.")
+    else:
+        test = validate_command(None, None, test)
+
+    if batch:
+        if filename is not None:
+            raise click.UsageError("FILENAME can't be used with --batch")
+        for option, value in [
+            ("--backup", backup),
+            ("--listen", listen),
+            ("--record-trace", record_trace),
+            ("--replay-trace", replay_trace),
+        ]:
+            if value:
+                raise click.UsageError(f"{option} can't be used with --batch")
+    elif filename is None:
+        raise click.UsageError("Missing argument 'FILENAME'.")
+
+    if listen and not auth_key_file:
+        raise click.UsageError("--listen requires --auth-key-file")
+
+    controller = None
+    if adaptive_parallelism:
+        if max_parallelism <= 0:
+            max_parallelism = 2 * (os.cpu_count() or 1)
+        if min_parallelism > max_parallelism:
+            raise click.BadParameter(
+                "must not be above --max-parallelism", param_hint="--min-parallelism"
+            )
+        controller = ParallelismController(
+            min_parallelism=min_parallelism,
+            max_parallelism=max_parallelism,
+            initial=parallelism,
+        )
+        parallelism = max_parallelism
+
     if debug:
         # This is a debugging option so that when the reducer seems to be taking
         # a long time you can Ctrl-\ to find out what it's up to. I have no idea
@@ -132,6 +582,124 @@ def main(
 
         signal.signal(signal.SIGQUIT, dump_trace)
 
+    if profile:
+        profiler = SamplingProfiler(interval=profile_interval)
+
+        def write_profile():
+            profiler.stop()
+            profiler.write(profile, profile_format)
+            click.echo(profiler.format_summary())
+
+        profiler.start()
+        click.get_current_context().call_on_close(write_profile)
+
+    if timeout <= 0:
+        timeout = None
+
+    adaptive_timeout_settings = None
+    if adaptive_timeout:
+        if timeout is not None and timeout < min_timeout:
+            raise click.BadParameter(
+                "must not be above --timeout", param_hint="--min-timeout"
+            )
+        adaptive_timeout_settings = {
+            "multiplier": timeout_multiplier,
+            "floor": min_timeout,
+            "cap": timeout,
+        }
+
+    limits = None
+    limit_settings = {
+        "memory": memory_limit * 1024 * 1024 if memory_limit > 0 else None,
+        "cpu_time": cpu_time_limit if cpu_time_limit > 0 else None,
+        "pin_cpus": pin_cpus,
+        "cgroups": cgroups,
+    }
+    if any(limit_settings.values()):
+        if python_test is not None:
+            raise click.UsageError("Resource limits can't be used with --python-test")
+        limits = make_limits(
+            parallelism * (len(differential) if differential else 1), limit_settings
+        )
+        click.get_current_context().call_on_close(limits.close)
+
+    python_test_function = None
+    if python_test is not None:
+        # The function doesn't care what the file is called, so one of these
+        # (and its worker processes) can serve every file in a batch.
+        python_test_function = PythonTest(
+            python_test,
+            processes=python_test_processes,
+            timeout=timeout,
+            debug=debug,
+            adaptive_timeout=(
+                AdaptiveTimeout(**adaptive_timeout_settings)
+                if adaptive_timeout_settings is not None
+                else None
+            ),
+        )
+
+    def make_test_command(filename):
+        if python_test_function is not None:
+            return python_test_function
+        if differential:
+            return DifferentialTest(
+                differential,
+                basename=os.path.basename(filename),
+                timeout=timeout,
+                debug=debug,
+                adaptive_timeout=(
+                    AdaptiveTimeout(**adaptive_timeout_settings)
+                    if adaptive_timeout_settings is not None
+                    else None
+                ),
+                check_models=check_models,
+                limits=limits,
+            )
+        return TestCommand(
+            test,
+            basename=os.path.basename(filename),
+            input_type=input_type,
+            timeout=timeout,
+            debug=debug,
+            adaptive_timeout=(
+                AdaptiveTimeout(**adaptive_timeout_settings)
+                if adaptive_timeout_settings is not None
+                else None
+            ),
+            stdout_match=stdout_match,
+            stderr_match=stderr_match,
+            exit_codes=exit_codes,
+            limits=limits,
+        )
+
+    shrinker_options = dict(
+        debug=debug,
+        test_property=None if test_property == "any" else test_property,
+        mus_algorithm=mus_algorithm,
+        max_tests=max_tests if max_tests > 0 else None,
+        deadline=deadline if deadline > 0 else None,
+        canonical_labelling=canonical_labelling,
+        split_components=split_components,
+        coarse_threshold=coarse_threshold if coarse_threshold > 0 else None,
+    )
+
+    if batch:
+        try:
+            run_batch(
+                find_batch_files(batch),
+                make_test_command,
+                shrinker_options,
+                parallelism=parallelism,
+                controller=controller,
+                max_active=batch_active if batch_active > 0 else None,
+                stats=stats,
+            )
+        finally:
+            if python_test_function is not None:
+                python_test_function.kill_all()
+        return
+
     if not backup:
         backup = filename + os.extsep + "bak"
 
@@ -140,58 +708,7 @@ def main(
     except FileNotFoundError:
         pass
 
-    base = os.path.basename(filename)
-    first_call = True
-
-    def test_clauses(clauses):
-        nonlocal first_call
-        if not clauses or not all(clauses):
-            assert not first_call
-            return False
-        cnf = clauses_to_dimacs(clauses)
-        with TemporaryDirectory() as d:
-            working = os.path.join(d, base)
-            with open(working, "w") as o:
-                o.write(cnf)
-
-            if input_type in ("all", "arg"):
-                command = test + [working]
-            else:
-                command = test
-
-            kwargs = dict(
-                universal_newlines=True,
-                preexec_fn=os.setsid,
-                cwd=d,
-            )
-            if input_type in ("all", "stdin"):
-                kwargs["stdin"] = subprocess.PIPE
-                input_string = cnf
-            else:
-                kwargs["stdin"] = subprocess.DEVNULL
-                input_string = ""
-
-            if not debug:
-                kwargs["stdout"] = subprocess.DEVNULL
-                kwargs["stderr"] = subprocess.DEVNULL
-
-            sp = subprocess.Popen(command, **kwargs)
-
-            try:
-                sp.communicate(input_string, timeout=timeout)
-            except subprocess.TimeoutExpired:
-                if first_call:
-                    raise ValueError(
-                        f"Initial test call exceeded timeout of {timeout}s. Try raising or disabling timeout."
-                    )
-                return False
-            finally:
-                first_call = False
-                interrupt_wait_and_kill(sp)
-            return sp.returncode == 0
-
-    if timeout <= 0:
-        timeout = None
+    test_clauses = make_test_command(filename)
 
     with open(filename, "r") as o:
         initial = o.read()
@@ -199,19 +716,277 @@ def main(
     with open(backup, "w") as o:
         o.write(initial)
 
-    shrinker = SATShrinker(
-        dimacs_to_clauses(initial),
-        test_clauses,
-        debug=debug,
-        parallelism=parallelism,
-    )
+    test_function = test_clauses
+    coordinator = None
+    if listen:
+        coordinator = Coordinator(
+            *parse_address(listen),
+            key=read_key(auth_key_file),
+            config={
+                "command": test,
+                "basename": test_clauses.basename,
+                "input_type": input_type,
+                "timeout": timeout,
+                "adaptive_timeout": adaptive_timeout_settings,
+                "stdout_match": stdout_match,
+                "stderr_match": stderr_match,
+                "exit_codes": None if exit_codes is None else sorted(exit_codes),
+                "limits": limit_settings if limits is not None else None,
+            },
+            heartbeat_timeout=heartbeat_timeout,
+            worker_timeout=worker_timeout if worker_timeout > 0 else None,
+        )
+        host, port = coordinator.address
+        click.echo(f"Waiting for workers on {host}:{port}", err=True)
+        test_function = coordinator.test_function
+
+    if replay_trace:
+        test_function = ReplayOracle(
+            replay_trace,
+            fallback=test_clauses if replay_unseen == "run" else None,
+            strict=replay_unseen == "error",
+            simulate_latency=simulate_latency,
+        )
+
+    trace = TraceWriter(record_trace) if record_trace else None
+
+    try:
+        shrinker = SATShrinker(
+            dimacs_to_clauses(initial),
+            test_function,
+            parallelism=parallelism,
+            parallelism_controller=controller,
+            trace=trace,
+            **shrinker_options,
+        )
+    except UnseenCandidate as e:
+        raise unseen_candidate_error(replay_trace, e) from None
+    except NoWorkers as e:
+        coordinator.close()
+        raise click.ClickException(str(e)) from None
+
+    shrinker.on_cancel(test_clauses.kill_all)
+    if coordinator is not None:
+        shrinker.on_cancel(coordinator.close)
 
     @shrinker.on_reduce
     def _(clauses):
         with open(filename, "w") as o:
             o.write(clauses_to_dimacs(clauses))
 
-    shrinker.reduce()
+    try:
+        shrinker.reduce()
+        if shrinker.budget_exhausted:
+            click.echo(
+                "Stopped early because the reduction budget ran out. "
+                f"Best result so far has {len(shrinker.current)} clauses."
+            )
+    except UnseenCandidate as e:
+        raise unseen_candidate_error(replay_trace, e) from None
+    except NoWorkers as e:
+        raise click.ClickException(str(e)) from None
+    finally:
+        test_clauses.kill_all()
+        if coordinator is not None:
+            coordinator.close()
+        if trace is not None:
+            trace.close()
+        if stats:
+            report = shrinker.stats_report()
+            if test_clauses.adaptive_timeout is not None:
+                report["timeout"] = test_clauses.adaptive_timeout.as_dict()
+            if limits is not None:
+                report["limits"] = limits.as_dict()
+            with open(stats, "w") as o:
+                json.dump(report, o, indent=2)
+            click.echo(shrinker.format_stats())
+
+
+def unseen_candidate_error(trace, e):
+    return click.ClickException(
+        f"Candidate {e.args[0]} is not in the replayed trace {trace}, and "
+        "--replay-unseen=error was given"
+    )
+
+
+def run_batch(
+    filenames,
+    make_test_command,
+    shrinker_options,
+    parallelism,
+    controller,
+    max_active,
+    stats,
+):
+    if not filenames:
+        raise click.UsageError("--batch didn't find any files to reduce")
+
+    batch = BatchReducer(
+        parallelism,
+        controller=controller,
+        max_active=max_active,
+        progress=lambda result: click.echo(
+            f"[{len(batch.results)}/{len(filenames)}] {result}"
+        ),
+    )
+
+    for filename in filenames:
+
+        def make_shrinker(filename=filename, **shared):
+            with open(filename, "r") as o:
+                initial = o.read()
+            with open(filename + os.extsep + "bak", "w") as o:
+                o.write(initial)
+            test_clauses = make_test_command(filename)
+            shrinker = SATShrinker(
+                dimacs_to_clauses(initial), test_clauses, **shrinker_options, **shared
+            )
+            if not isinstance(test_clauses, PythonTest):
+                # A Python test is shared with the other files, so stopping
+                # this one mustn't kill its workers.
+                shrinker.on_cancel(test_clauses.kill_all)
+
+            @shrinker.on_reduce
+            def _(clauses):
+                with open(filename, "w") as o:
+                    o.write(clauses_to_dimacs(clauses))
+
+            return shrinker
+
+        batch.add(os.path.relpath(filename), make_shrinker)
+
+    batch.run()
+    report = batch.report()
+    click.echo(format_batch_report(report))
+    if stats:
+        with open(stats, "w") as o:
+            json.dump(report, o, indent=2)
+    if report["failed"]:
+        raise click.ClickException(
+            f"{report['failed']} of {report['files']} files could not be reduced"
+        )
+
+
+def make_limits(slots, settings):
+    try:
+        return ResourceLimits(max(1, slots), **settings)
+    except CgroupsUnavailable as e:
+        raise click.ClickException(str(e))
+
+
+def read_key(path):
+    with open(path, "rb") as i:
+        key = i.read().strip()
+    if not key:
+        raise click.BadParameter(f"{path} is empty", param_hint="--auth-key-file")
+    return key
+
+
+@click.command(
+    help="""
+Runs interestingness tests on behalf of a satreduce coordinator started with
+--listen. ADDRESS is the HOST:PORT the coordinator is listening on.
+""".strip()
+)
+@click.option(
+    "--auth-key-file",
+    required=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="File containing the secret shared with the coordinator",
+)
+@click.option(
+    "--parallelism",
+    default=os.cpu_count(),
+    type=click.INT,
+    help="Number of tests to run in parallel.",
+)
+@click.option(
+    "--test",
+    required=True,
+    help=(
+        "Test command to run on this host. Workers never run a command sent "
+        "by the coordinator, but warn if this one differs from it."
+    ),
+)
+@click.option(
+    "--debug/--no-debug",
+    default=False,
+    is_flag=True,
+    help=("Show the output of the test command"),
+)
+@click.argument("address")
+def worker(address, auth_key_file, parallelism, test, debug):
+    key = read_key(auth_key_file)
+    test = validate_command(None, None, test)
+
+    limits = []
+    limits_lock = threading.Lock()
+
+    def make_limits_once(config):
+        # Every connection to the coordinator shares this host's slots.
+        with limits_lock:
+            if not limits and config.get("limits"):
+                limits.append(make_limits(parallelism, config["limits"]))
+            return limits[0] if limits else None
+
+    warned = []
+
+    def make_test(config):
+        # The coordinator's command is only a hint, as it may name paths
+        # that are different on this host.
+        theirs = config.get("command") or []
+        with limits_lock:
+            if theirs != test and not warned:
+                warned.append(True)
+                click.echo(
+                    f"Warning: the coordinator runs {shlex.join(theirs)} but "
+                    f"this worker runs {shlex.join(test)}",
+                    err=True,
+                )
+        command = TestCommand(
+            test,
+            basename=os.path.basename(config["basename"]),
+            input_type=config["input_type"],
+            timeout=config["timeout"],
+            debug=debug,
+            adaptive_timeout=(
+                AdaptiveTimeout(**config["adaptive_timeout"])
+                if config.get("adaptive_timeout")
+                else None
+            ),
+            stdout_match=config.get("stdout_match"),
+            stderr_match=config.get("stderr_match"),
+            exit_codes=config.get("exit_codes"),
+            limits=make_limits_once(config),
+        )
+        # The coordinator has already checked that the initial test passes,
+        # so a timeout on a worker is just reported back like any other.
+        command.first_call = False
+        return command
+
+    errors = []
+
+    def work():
+        try:
+            run_worker(parse_address(address), key, make_test)
+        except (AuthenticationFailed, OSError, click.ClickException) as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work) for _ in range(max(1, parallelism))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for l in limits:
+        l.close()
+    for e in errors:
+        if isinstance(e, click.ClickException):
+            raise e
+    if errors and len(errors) == len(threads):
+        e = errors[0]
+        if isinstance(e, AuthenticationFailed):
+            raise click.ClickException(f"Could not authenticate with {address}")
+        raise click.ClickException(f"Could not connect to {address}: {e}")
 
 
 if __name__ == "__main__":
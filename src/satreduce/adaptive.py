@@ -0,0 +1,233 @@
+"""Adjusting how many tests run at once, and how long each may take, while
+a reduction is in progress."""
+
+import math
+import os
+from collections import deque
+from threading import Condition
+from threading import Lock
+from time import monotonic
+
+
+def system_load_average():
+    """The one minute load average, or None if it isn't available."""
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+
+
+def system_memory_available(meminfo="/proc/meminfo"):
+    """The fraction of memory that is available for new work, or None if it
+    can't be determined."""
+    values = {}
+    try:
+        with open(meminfo) as i:
+            for line in i:
+                name, _, rest = line.partition(":")
+                values[name] = int(rest.split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    try:
+        return values["MemAvailable"] / values["MemTotal"]
+    except (KeyError, ZeroDivisionError):
+        return None
+
+
+class ParallelismController:
+    """Limits the number of tests running concurrently, and adjusts that
+    limit as the reduction goes.
+
+    After every ``window`` completed tests the controller measures
+    throughput (tests completed per second) and picks a new limit between
+    ``min_parallelism`` and ``max_parallelism``:
+
+    * If the fraction of memory available has dropped below
+      ``min_free_memory`` it halves the limit.
+    * If the load average is above ``max_load`` (by default the number of
+      CPUs) the machine is oversubscribed, e.g. because each test is itself
+      multi-threaded, so it lowers the limit by one.
+    * Otherwise it hill climbs: it keeps moving the limit in the same
+      direction while throughput holds up and turns around when it drops.
+      It only raises the limit if tests were actually queueing for a slot,
+      as otherwise more slots can't help.
+
+    Every change is recorded in ``decisions``.
+    """
+
+    def __init__(
+        self,
+        min_parallelism=1,
+        max_parallelism=None,
+        initial=None,
+        window=20,
+        max_load=None,
+        min_free_memory=0.1,
+        tolerance=0.1,
+        load_average=system_load_average,
+        memory_available=system_memory_available,
+        clock=monotonic,
+    ):
+        if max_parallelism is None:
+            max_parallelism = os.cpu_count() or 1
+        if not 1 <= min_parallelism <= max_parallelism:
+            raise ValueError(
+                f"Invalid parallelism limits: min={min_parallelism}, "
+                f"max={max_parallelism}"
+            )
+        if initial is None:
+            initial = max_parallelism
+        self.min_parallelism = min_parallelism
+        self.max_parallelism = max_parallelism
+        self.limit = max(min_parallelism, min(initial, max_parallelism))
+        self.window = window
+        self.max_load = max_load if max_load is not None else (os.cpu_count() or 1)
+        self.min_free_memory = min_free_memory
+        self.tolerance = tolerance
+        self.decisions = []
+        self.__load_average = load_average
+        self.__memory_available = memory_available
+        self.__clock = clock
+        self.__condition = Condition()
+        self.__in_flight = 0
+        self.__completed = 0
+        self.__saturated = False
+        self.__direction = 1
+        self.__last_throughput = None
+        self.__start = clock()
+        self.__window_start = self.__start
+
+    def acquire(self):
+        """Blocks until a test may start."""
+        with self.__condition:
+            while self.__in_flight >= self.limit:
+                self.__saturated = True
+                self.__condition.wait()
+            self.__in_flight += 1
+            if self.__in_flight >= self.limit:
+                self.__saturated = True
+
+    def release(self):
+        """Records that a test started with ``acquire`` has finished."""
+        with self.__condition:
+            self.__in_flight -= 1
+            self.__completed += 1
+            if self.__completed >= self.window:
+                self.__adjust()
+            self.__condition.notify_all()
+
+    def __adjust(self):
+        now = self.__clock()
+        elapsed = max(now - self.__window_start, 1e-6)
+        throughput = self.__completed / elapsed
+        memory = self.__memory_available()
+        load = self.__load_average()
+
+        if memory is not None and memory < self.min_free_memory:
+            target = self.limit // 2
+            reason = "memory pressure"
+            self.__direction = -1
+        elif load is not None and load > self.max_load:
+            target = self.limit - 1
+            reason = "load average"
+            self.__direction = -1
+        else:
+            last = self.__last_throughput
+            if last is not None and throughput < last * (1 - self.tolerance):
+                self.__direction = -self.__direction
+                reason = "throughput fell"
+            else:
+                reason = "throughput held"
+            target = self.limit + self.__direction
+            if target > self.limit and not self.__saturated:
+                target = self.limit
+
+        target = max(self.min_parallelism, min(target, self.max_parallelism))
+        if target != self.limit:
+            self.decisions.append(
+                {
+                    "time": now - self.__start,
+                    "from": self.limit,
+                    "to": target,
+                    "reason": reason,
+                    "throughput": throughput,
+                    "load_average": load,
+                    "memory_available": memory,
+                }
+            )
+            self.limit = target
+
+        self.__last_throughput = throughput
+        self.__completed = 0
+        self.__saturated = False
+        self.__window_start = now
+
+    def as_dict(self):
+        with self.__condition:
+            return {
+                "min": self.min_parallelism,
+                "max": self.max_parallelism,
+                "limit": self.limit,
+                "decisions": list(self.decisions),
+            }
+
+
+class AdaptiveTimeout:
+    """Chooses a timeout for each test from the runtimes of recent tests
+    that completed.
+
+    The timeout is ``multiplier`` times the ``quantile`` of the last
+    ``window`` runtimes, kept between ``floor`` and ``cap``. Each runtime is
+    first scaled by the ratio of the size of the candidate being tested to
+    the size of the one it was measured on, so that timeouts shrink along
+    with the formula. The shortest runtime recorded is taken to be the
+    test's fixed start-up cost, which doesn't depend on the size, so only
+    the part of each runtime above it is scaled. Until anything has been
+    measured the timeout is ``cap``.
+    """
+
+    def __init__(self, multiplier=5.0, quantile=0.99, floor=0.1, cap=None, window=200):
+        if cap is not None and cap < floor:
+            raise ValueError(f"Timeout cap {cap} is below the floor {floor}")
+        self.multiplier = multiplier
+        self.quantile = quantile
+        self.floor = floor
+        self.cap = cap
+        self.__samples = deque(maxlen=window)
+        self.__lock = Lock()
+
+    def record(self, runtime, size):
+        """Records that a test of a candidate of ``size`` completed in
+        ``runtime`` seconds."""
+        with self.__lock:
+            self.__samples.append((runtime, max(size, 1)))
+
+    def timeout_for(self, size):
+        """Returns the timeout to use for a candidate of ``size``, or None if
+        there should be no timeout."""
+        with self.__lock:
+            samples = list(self.__samples)
+        if not samples:
+            return self.cap
+        size = max(size, 1)
+        fixed = min(runtime for runtime, _ in samples)
+        scaled = sorted(
+            fixed + (runtime - fixed) * size / sample_size
+            for runtime, sample_size in samples
+        )
+        index = min(len(scaled) - 1, math.ceil(self.quantile * len(scaled)) - 1)
+        timeout = max(self.floor, self.multiplier * scaled[max(index, 0)])
+        if self.cap is not None:
+            timeout = min(timeout, self.cap)
+        return timeout
+
+    def as_dict(self):
+        with self.__lock:
+            samples = len(self.__samples)
+        return {
+            "multiplier": self.multiplier,
+            "quantile": self.quantile,
+            "floor": self.floor,
+            "cap": self.cap,
+            "samples": samples,
+        }
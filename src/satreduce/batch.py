@@ -0,0 +1,195 @@
+"""Reducing many files at once on one shared pool of test slots.
+
+Each file gets its own SATShrinker running in its own thread, but they all
+run their tests on the same executor and take slots from the same
+ParallelismController. A reduction in a sequential stretch only holds one
+slot at a time, so the rest go to whichever reductions have candidates to
+try, rather than sitting idle until it finishes.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from threading import Thread
+from time import monotonic
+
+from satreduce.adaptive import ParallelismController
+
+
+def find_batch_files(paths, extension=".cnf"):
+    """Expands ``paths`` into a list of files to reduce. Directories are
+    searched recursively for files ending in ``extension``, in sorted
+    order, and files are included as given."""
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for f in sorted(files):
+                    if f.endswith(extension):
+                        result.append(os.path.join(root, f))
+        else:
+            result.append(path)
+    return list(dict.fromkeys(result))
+
+
+class BatchResult:
+    """The outcome of reducing one file in a batch."""
+
+    def __init__(self, name):
+        self.name = name
+        self.initial_clauses = None
+        self.final_clauses = None
+        self.test_calls = 0
+        self.test_time = 0.0
+        self.wall_time = 0.0
+        self.budget_exhausted = False
+        self.error = None
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "initial_clauses": self.initial_clauses,
+            "final_clauses": self.final_clauses,
+            "test_calls": self.test_calls,
+            "test_time": self.test_time,
+            "wall_time": self.wall_time,
+            "budget_exhausted": self.budget_exhausted,
+            "error": self.error,
+        }
+
+    def __str__(self):
+        if self.error is not None:
+            return f"{self.name}: {self.error}"
+        return (
+            f"{self.name}: {self.initial_clauses} -> {self.final_clauses} "
+            f"clauses, {self.test_calls} tests in {self.wall_time:.2f}s"
+            + (" (budget exhausted)" if self.budget_exhausted else "")
+        )
+
+
+class BatchReducer:
+    """Runs many reductions at once, sharing ``parallelism`` test slots
+    between them.
+
+    Jobs are added with ``add(name, make_shrinker)``, where
+    ``make_shrinker(**shared)`` must construct a SATShrinker passing the
+    keyword arguments it is given on to it. At most ``max_active``
+    reductions are in progress at once, which bounds how many formulas are
+    held in memory. ``progress`` is called with each BatchResult as its
+    reduction finishes.
+    """
+
+    def __init__(self, parallelism, controller=None, max_active=None, progress=None):
+        parallelism = max(1, parallelism)
+        if controller is None:
+            controller = ParallelismController(
+                min_parallelism=parallelism,
+                max_parallelism=parallelism,
+                initial=parallelism,
+            )
+        self.controller = controller
+        self.parallelism = controller.max_parallelism
+        self.max_active = max_active if max_active else 2 * self.parallelism
+        self.results = []
+        self.__progress = progress
+        self.__jobs = []
+        self.__lock = Lock()
+        self.__wall_time = 0.0
+
+    def add(self, name, make_shrinker):
+        self.__jobs.append((name, make_shrinker))
+
+    def __len__(self):
+        return len(self.__jobs)
+
+    def run(self):
+        """Reduces every file that has been added, returning the results in
+        the order the files were added."""
+        start = monotonic()
+        queue = list(reversed(list(enumerate(self.__jobs))))
+        results = {}
+        executor = ThreadPoolExecutor(max_workers=self.parallelism)
+        shared = {
+            "parallelism": self.parallelism,
+            "parallelism_controller": self.controller,
+            "executor": executor,
+            # Idle slots are better spent on other files than on guesses.
+            "speculate": False,
+        }
+
+        def work():
+            while True:
+                with self.__lock:
+                    if not queue:
+                        return
+                    index, (name, make_shrinker) = queue.pop()
+                result = self.__reduce(name, make_shrinker, shared)
+                with self.__lock:
+                    results[index] = result
+                    self.results.append(result)
+                    if self.__progress is not None:
+                        self.__progress(result)
+
+        threads = [Thread(target=work) for _ in range(min(self.max_active, len(queue)))]
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            executor.shutdown(wait=True)
+            self.__wall_time = monotonic() - start
+        self.results = [results[i] for i in sorted(results)]
+        return self.results
+
+    def __reduce(self, name, make_shrinker, shared):
+        result = BatchResult(name)
+        start = monotonic()
+        try:
+            shrinker = make_shrinker(**shared)
+            result.initial_clauses = len(shrinker.current)
+            try:
+                shrinker.reduce()
+            finally:
+                result.final_clauses = len(shrinker.current)
+                result.budget_exhausted = shrinker.budget_exhausted
+                total = shrinker.stats_report()["total"]
+                result.test_calls = total["test_calls"]
+                result.test_time = total["test_time"]
+        except Exception as e:
+            result.error = str(e) or type(e).__name__
+        result.wall_time = monotonic() - start
+        return result
+
+    def report(self):
+        """Returns a JSON-serialisable summary of the whole batch."""
+        wall_time = self.__wall_time
+        test_calls = sum(r.test_calls for r in self.results)
+        test_time = sum(r.test_time for r in self.results)
+        return {
+            "files": len(self.results),
+            "failed": sum(r.error is not None for r in self.results),
+            "initial_clauses": sum(r.initial_clauses or 0 for r in self.results),
+            "final_clauses": sum(r.final_clauses or 0 for r in self.results),
+            "test_calls": test_calls,
+            "wall_time": wall_time,
+            "tests_per_second": test_calls / wall_time if wall_time > 0 else 0.0,
+            "slot_utilisation": (
+                test_time / (wall_time * self.parallelism) if wall_time > 0 else 0.0
+            ),
+            "parallelism": self.controller.as_dict(),
+            "results": [r.as_dict() for r in self.results],
+        }
+
+
+def format_batch_report(report):
+    """Summarises a report from BatchReducer.report."""
+    return (
+        f"{report['files']} files ({report['failed']} failed): "
+        f"{report['initial_clauses']} -> {report['final_clauses']} clauses, "
+        f"{report['test_calls']} tests in {report['wall_time']:.2f}s "
+        f"({report['tests_per_second']:.1f} tests/s, "
+        f"{100 * report['slot_utilisation']:.0f}% of "
+        f"{report['parallelism']['max']} slots busy)"
+    )
@@ -0,0 +1,163 @@
+"""Canonical forms of CNF formulas up to renaming and negating variables.
+
+Formulas are viewed as a graph with a node for each literal and each
+clause, with literals joined to the clauses that contain them and to their
+own negation. Two formulas are isomorphic (equal up to a permutation of
+variables combined with flipping the polarity of some of them) exactly when
+these graphs are.
+
+For small formulas we compute an exact canonical labelling by colour
+refinement plus individualisation, in the style of nauty. For larger ones
+(or ones whose symmetry makes the search too expensive) we fall back to the
+stable colouring itself, which is a strong isomorphism invariant but may
+occasionally give the same key to non-isomorphic formulas.
+"""
+
+import hashlib
+
+
+class SearchBudgetExceeded(Exception):
+    pass
+
+
+class ClauseGraph:
+    def __init__(self, clauses):
+        clauses = sorted({tuple(sorted(set(c))) for c in clauses})
+        variables = sorted({abs(l) for c in clauses for l in c})
+        self.variables = variables
+        index = {}
+        for v in variables:
+            index[v] = len(index)
+            index[-v] = len(index)
+        self.n_literals = len(index)
+        self.clauses = clauses
+        self.literal_of = {i: l for l, i in index.items()}
+        # Nodes 0 .. n_literals - 1 are literals, paired so that node i ^ 1 is
+        # the negation of node i. The remaining nodes are clauses.
+        self.neighbours = [[] for _ in range(self.n_literals + len(clauses))]
+        for j, c in enumerate(clauses):
+            node = self.n_literals + j
+            for l in c:
+                self.neighbours[node].append(index[l])
+                self.neighbours[index[l]].append(node)
+
+    def initial_colouring(self):
+        return [0] * self.n_literals + [1 + len(c) for c in self.clauses]
+
+    def refine(self, colours):
+        """Refines ``colours`` until it is equitable. Colours are always
+        renumbered in order of their signatures so that the result depends
+        only on the isomorphism class of the coloured graph."""
+        n_colours = len(set(colours))
+        while True:
+            signatures = []
+            for node, colour in enumerate(colours):
+                signature = (
+                    colour,
+                    colours[node ^ 1] if node < self.n_literals else -1,
+                    tuple(sorted(colours[n] for n in self.neighbours[node])),
+                )
+                signatures.append(signature)
+            ranks = {s: i for i, s in enumerate(sorted(set(signatures)))}
+            colours = [ranks[s] for s in signatures]
+            if len(ranks) == n_colours:
+                return colours
+            n_colours = len(ranks)
+
+    def relabel(self, colours):
+        """Given a colouring in which every literal has a distinct colour,
+        returns the formula obtained by numbering variables in order of the
+        colour of their lowest coloured literal and making that literal
+        positive."""
+        order = sorted(
+            range(0, self.n_literals, 2),
+            key=lambda i: min(colours[i], colours[i + 1]),
+        )
+        renaming = {}
+        for k, i in enumerate(order, 1):
+            if colours[i] < colours[i + 1]:
+                positive, negative = i, i + 1
+            else:
+                positive, negative = i + 1, i
+            renaming[self.literal_of[positive]] = k
+            renaming[self.literal_of[negative]] = -k
+        return tuple(
+            sorted(
+                {tuple(sorted(renaming[l] for l in c)) for c in self.clauses},
+                key=lambda s: (len(s), s),
+            )
+        )
+
+    def canonical_form(self, budget):
+        """Returns the lexicographically least relabelling reachable by
+        individualisation-refinement. Raises SearchBudgetExceeded if this
+        would take more than ``budget`` refinements."""
+        best = None
+        remaining = budget
+
+        def search(colours):
+            nonlocal best, remaining
+            remaining -= 1
+            if remaining < 0:
+                raise SearchBudgetExceeded()
+            colours = self.refine(colours)
+            cells = {}
+            for node in range(self.n_literals):
+                cells.setdefault(colours[node], []).append(node)
+            target = min(
+                (c for c in cells.values() if len(c) > 1),
+                key=lambda c: (len(c), colours[c[0]]),
+                default=None,
+            )
+            if target is None:
+                form = self.relabel(colours)
+                if best is None or (len(form), form) < (len(best), best):
+                    best = form
+                return
+            for node in target:
+                # Individualise node by giving it a colour that sorts just
+                # below the rest of its cell.
+                child = [2 * c + 1 for c in colours]
+                child[node] -= 1
+                search(child)
+
+        search(self.initial_colouring())
+        return best
+
+
+def canonical_form(clauses, budget=1000):
+    """Returns a canonical representative of the isomorphism class of
+    ``clauses``, or raises SearchBudgetExceeded."""
+    return ClauseGraph(clauses).canonical_form(budget)
+
+
+def invariant_hash(clauses):
+    """A hash of the stable colouring of ``clauses``. Isomorphic formulas
+    always have the same hash."""
+    graph = ClauseGraph(clauses)
+    colours = graph.refine(graph.initial_colouring())
+    summary = (
+        len(graph.variables),
+        len(graph.clauses),
+        sorted(colours[: graph.n_literals]),
+        sorted(
+            tuple(sorted(colours[n] for n in graph.neighbours[graph.n_literals + j]))
+            for j in range(len(graph.clauses))
+        ),
+    )
+    return hashlib.sha1(repr(summary).encode("utf-8")).hexdigest()
+
+
+def isomorphism_key(clauses, max_exact_variables=12, budget=1000):
+    """Returns a pair ``(key, exact)``. Isomorphic formulas always get the
+    same key. If ``exact`` is True then formulas with that key are
+    guaranteed to be isomorphic."""
+    n_variables = len({abs(l) for c in clauses for l in c})
+    if n_variables <= max_exact_variables:
+        try:
+            form = canonical_form(clauses, budget)
+        except SearchBudgetExceeded:
+            pass
+        else:
+            return "exact:" + repr(form), True
+    return "hash:" + invariant_hash(clauses), False
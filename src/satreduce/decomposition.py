@@ -7,7 +7,6 @@ from networkx import strongly_connected_components
 
 from satreduce.booleanequivalence import BooleanEquivalence
 from satreduce.booleanequivalence import Inconsistency
-from satreduce.minisat import find_solution
 
 
 @attrs.define
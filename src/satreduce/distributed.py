@@ -0,0 +1,366 @@
+"""Running interestingness tests on worker processes on other machines.
+
+A ``Coordinator`` listens on a TCP port and hands out candidates to any
+number of workers (see ``run_worker``), each of which runs the test locally
+and reports back whether the candidate was interesting. The protocol is
+newline delimited JSON:
+
+1. The coordinator sends ``{"type": "challenge", "nonce": ...}`` and the
+   worker must reply with ``{"type": "auth", "nonce": ..., "digest": ...}``
+   with a nonce of its own, where the digest is the HMAC-SHA256 of both
+   nonces under the shared key.
+2. The coordinator replies with ``{"type": "welcome", "config": ...,
+   "digest": ...}`` describing how the test should be run. Its digest
+   covers both nonces and the configuration, so the worker knows that the
+   coordinator has the key too before it trusts the configuration.
+3. The coordinator sends ``{"type": "job", "id": ..., "clauses": ...}`` and
+   the worker eventually replies ``{"type": "result", "id": ...,
+   "interesting": ..., "timed_out": ..., "limit_exceeded": ...}``.
+
+Workers send ``{"type": "heartbeat"}`` every few seconds. A worker that
+stops sending anything for ``heartbeat_timeout`` seconds, or whose
+connection drops, is considered lost and its job is given to another
+worker. If no workers at all are connected for ``worker_timeout`` seconds
+then tests fail with ``NoWorkers`` rather than waiting forever.
+"""
+
+import hmac
+import json
+import os
+import queue
+import socket
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from hashlib import sha256
+from time import monotonic
+
+from satreduce.reducer import ResourceLimitExceeded
+from satreduce.reducer import TimedOut
+
+
+HEARTBEAT_INTERVAL = 1.0
+
+
+class AuthenticationFailed(Exception):
+    pass
+
+
+class NoWorkers(Exception):
+    pass
+
+
+class Connection:
+    """A JSON lines connection over a socket."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.__reader = sock.makefile("r", encoding="utf-8")
+        self.__send_lock = threading.Lock()
+
+    def send(self, message):
+        data = (json.dumps(message) + "\n").encode("utf-8")
+        with self.__send_lock:
+            self.sock.sendall(data)
+
+    def receive(self):
+        line = self.__reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed")
+        return json.loads(line)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def digest(key, role, *parts):
+    """The HMAC-SHA256 of ``parts`` under ``key``. Including the ``role``
+    of the sender means that a digest one side sends can't be replayed as
+    the other's."""
+    message = "\n".join((role,) + parts)
+    return hmac.new(key, message.encode("utf-8"), sha256).hexdigest()
+
+
+def encode_config(config):
+    return json.dumps(config, sort_keys=True)
+
+
+class Job:
+    def __init__(self, job_id, clauses):
+        self.id = job_id
+        self.clauses = clauses
+        self.future = Future()
+
+
+class Coordinator:
+    """Serves test jobs to remote workers. ``test_function`` can be passed
+    to a ``SATShrinker`` as its test, and blocks until some worker has run
+    the candidate, or raises ``NoWorkers`` if there have been no workers to
+    run it on for ``worker_timeout`` seconds."""
+
+    def __init__(
+        self,
+        host,
+        port,
+        key,
+        config=None,
+        heartbeat_timeout=10.0,
+        worker_timeout=300.0,
+    ):
+        self.key = key
+        self.config = config or {}
+        self.heartbeat_timeout = heartbeat_timeout
+        self.worker_timeout = worker_timeout
+        self.__jobs = queue.Queue()
+        self.__next_id = 0
+        self.__lock = threading.Lock()
+        self.__closed = threading.Event()
+        self.__connections = set()
+        self.__no_workers_since = monotonic()
+        self.workers_lost = 0
+        self.jobs_requeued = 0
+
+        self.__server = socket.create_server((host, port))
+        self.address = self.__server.getsockname()[:2]
+        self.__accept_thread = threading.Thread(target=self.__accept, daemon=True)
+        self.__accept_thread.start()
+
+    @property
+    def n_workers(self):
+        with self.__lock:
+            return len(self.__connections)
+
+    def test_function(self, clauses):
+        with self.__lock:
+            if self.__closed.is_set():
+                return False
+            job = Job(self.__next_id, [list(c) for c in clauses])
+            self.__next_id += 1
+            self.__jobs.put(job)
+        if self.worker_timeout is None:
+            return job.future.result()
+        while True:
+            try:
+                return job.future.result(
+                    timeout=min(self.worker_timeout, HEARTBEAT_INTERVAL)
+                )
+            except FutureTimeout:
+                pass
+            with self.__lock:
+                if self.__connections:
+                    continue
+                waited = monotonic() - self.__no_workers_since
+            if waited >= self.worker_timeout:
+                raise NoWorkers(
+                    f"No workers have connected for {self.worker_timeout:g} seconds"
+                )
+
+    def close(self):
+        """Stops accepting work. Any jobs not yet finished are treated as
+        uninteresting."""
+        with self.__lock:
+            self.__closed.set()
+        self.__server.close()
+        with self.__lock:
+            connections = list(self.__connections)
+        for connection in connections:
+            connection.close()
+        # Connections requeue their jobs while holding the lock, and only if
+        # we aren't closed yet, so once we have the lock nothing more can
+        # be added to the queue.
+        with self.__lock:
+            jobs = []
+            while True:
+                try:
+                    jobs.append(self.__jobs.get_nowait())
+                except queue.Empty:
+                    break
+        for job in jobs:
+            if not job.future.done():
+                job.future.set_result(False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __accept(self):
+        while not self.__closed.is_set():
+            try:
+                sock, _ = self.__server.accept()
+            except OSError:
+                return
+            threading.Thread(
+                target=self.__serve, args=(Connection(sock),), daemon=True
+            ).start()
+
+    def __authenticate(self, connection):
+        nonce = os.urandom(16).hex()
+        connection.send({"type": "challenge", "nonce": nonce})
+        reply = connection.receive()
+        worker_nonce = str(reply.get("nonce"))
+        if reply.get("type") != "auth" or not hmac.compare_digest(
+            str(reply.get("digest")), digest(self.key, "worker", nonce, worker_nonce)
+        ):
+            raise AuthenticationFailed()
+        connection.send(
+            {
+                "type": "welcome",
+                "config": self.config,
+                "digest": digest(
+                    self.key,
+                    "coordinator",
+                    nonce,
+                    worker_nonce,
+                    encode_config(self.config),
+                ),
+            }
+        )
+
+    def __serve(self, connection):
+        connection.sock.settimeout(self.heartbeat_timeout)
+        try:
+            self.__authenticate(connection)
+        except (AuthenticationFailed, OSError, ValueError):
+            connection.close()
+            return
+
+        with self.__lock:
+            self.__connections.add(connection)
+        job = None
+        try:
+            while not self.__closed.is_set():
+                try:
+                    job = self.__jobs.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                connection.send({"type": "job", "id": job.id, "clauses": job.clauses})
+                while True:
+                    message = connection.receive()
+                    if message.get("type") == "result" and message.get("id") == job.id:
+                        if message.get("timed_out"):
+                            job.future.set_exception(TimedOut())
+                        elif message.get("limit_exceeded"):
+                            job.future.set_exception(
+                                ResourceLimitExceeded(message["limit_exceeded"])
+                            )
+                        else:
+                            job.future.set_result(bool(message["interesting"]))
+                        job = None
+                        break
+        except (OSError, ValueError):
+            # Includes timeouts from a worker that has stopped sending
+            # heartbeats.
+            with self.__lock:
+                self.workers_lost += 1
+        finally:
+            with self.__lock:
+                self.__connections.discard(connection)
+                if not self.__connections:
+                    self.__no_workers_since = monotonic()
+            connection.close()
+            if job is not None:
+                # Checking for closing and requeueing under the lock means
+                # close() can't drain the queue in between and miss the job.
+                with self.__lock:
+                    closed = self.__closed.is_set()
+                    if not closed:
+                        self.jobs_requeued += 1
+                        self.__jobs.put(job)
+                if closed:
+                    job.future.set_result(False)
+
+
+def connect(address, key, timeout=30.0):
+    """Connects to a coordinator and authenticates, checking that the
+    coordinator knows the key too. Returns the connection and the
+    coordinator's configuration."""
+    sock = socket.create_connection(address, timeout=timeout)
+    sock.settimeout(None)
+    connection = Connection(sock)
+    try:
+        nonce = str(connection.receive().get("nonce"))
+        worker_nonce = os.urandom(16).hex()
+        connection.send(
+            {
+                "type": "auth",
+                "nonce": worker_nonce,
+                "digest": digest(key, "worker", nonce, worker_nonce),
+            }
+        )
+        welcome = connection.receive()
+        config = welcome.get("config")
+        if welcome.get("type") != "welcome" or not hmac.compare_digest(
+            str(welcome.get("digest")),
+            digest(key, "coordinator", nonce, worker_nonce, encode_config(config)),
+        ):
+            raise AuthenticationFailed()
+    except (AuthenticationFailed, ConnectionError, ValueError, AttributeError):
+        connection.close()
+        raise AuthenticationFailed() from None
+    return connection, config
+
+
+def run_worker(address, key, make_test, heartbeat_interval=HEARTBEAT_INTERVAL):
+    """Runs jobs from the coordinator at ``address`` until it goes away.
+    ``make_test`` is called with the coordinator's configuration and must
+    return a function that takes a list of clauses and returns whether they
+    are interesting."""
+    connection, config = connect(address, key)
+    test = make_test(config)
+    stopped = threading.Event()
+
+    def heartbeat():
+        while not stopped.wait(heartbeat_interval):
+            try:
+                connection.send({"type": "heartbeat"})
+            except OSError:
+                return
+
+    heartbeats = threading.Thread(target=heartbeat, daemon=True)
+    heartbeats.start()
+    try:
+        while True:
+            try:
+                message = connection.receive()
+            except (OSError, ValueError):
+                return
+            if message.get("type") != "job":
+                continue
+            try:
+                interesting = bool(test(message["clauses"]))
+                timed_out = False
+                limit_exceeded = None
+            except TimedOut:
+                interesting = False
+                timed_out = True
+                limit_exceeded = None
+            except ResourceLimitExceeded as e:
+                interesting = False
+                timed_out = False
+                limit_exceeded = e.resource
+            try:
+                connection.send(
+                    {
+                        "type": "result",
+                        "id": message["id"],
+                        "interesting": interesting,
+                        "timed_out": timed_out,
+                        "limit_exceeded": limit_exceeded,
+                    }
+                )
+            except OSError:
+                return
+    finally:
+        stopped.set()
+        connection.close()
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
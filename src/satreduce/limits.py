@@ -0,0 +1,279 @@
+"""Keeping concurrent tests from interfering with each other.
+
+Each test subprocess runs in one of a fixed number of slots, one per test
+that may run at once. A slot can pin its tests to a single CPU, and can
+limit their memory and CPU time, either with rlimits or, where cgroup v2
+is available and delegated to us, with a cgroup of its own. Tests that are
+killed for going over a limit are reported with ResourceLimitExceeded.
+"""
+
+import math
+import os
+import resource
+import signal
+from threading import Condition
+
+from satreduce.reducer import ResourceLimitExceeded
+
+
+CGROUP_MOUNT = "/sys/fs/cgroup"
+
+# How a process killed for using too much CPU time exits, either directly
+# or as reported by a shell that ran it. SIGKILL isn't included, as tests
+# are killed with it for many other reasons.
+CPU_LIMIT_STATUSES = {-signal.SIGXCPU, 128 + signal.SIGXCPU}
+
+
+class CgroupsUnavailable(Exception):
+    """Raised when cgroup v2 memory limits are requested but can't be
+    set up, e.g. because the cgroup hierarchy isn't delegated to this
+    user."""
+
+
+def current_cgroup(mount=CGROUP_MOUNT, proc_cgroup="/proc/self/cgroup"):
+    """The directory of the cgroup v2 group this process is in, or None if
+    cgroup v2 isn't in use."""
+    try:
+        with open(proc_cgroup) as i:
+            for line in i:
+                if line.startswith("0::"):
+                    path = os.path.join(mount, line[3:].strip().lstrip("/"))
+                    if os.path.exists(os.path.join(path, "cgroup.controllers")):
+                        return path
+    except OSError:
+        pass
+    return None
+
+
+def read_cgroup_counter(group, filename, name):
+    """Reads a counter such as ``oom_kill`` from ``memory.events`` or
+    ``usage_usec`` from ``cpu.stat``, or 0 if it isn't there."""
+    try:
+        with open(os.path.join(group, filename)) as i:
+            for line in i:
+                key, _, value = line.partition(" ")
+                if key == name:
+                    return int(value)
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def enabled_controllers(group):
+    """The controllers that ``group`` gives its children."""
+    try:
+        with open(os.path.join(group, "cgroup.subtree_control")) as i:
+            return i.read().split()
+    except OSError:
+        return []
+
+
+def write_cgroup_file(group, filename, value):
+    with open(os.path.join(group, filename), "w") as o:
+        o.write(value)
+
+
+class Slot:
+    """Where a single test runs: the CPU it is pinned to, and the cgroup it
+    is put in, if any."""
+
+    def __init__(self, index, cpu, cgroup):
+        self.index = index
+        self.cpu = cpu
+        self.cgroup = cgroup
+
+
+class ResourceLimits:
+    """Runs up to ``slots`` test subprocesses at once, each in a slot of its
+    own.
+
+    * With ``pin_cpus``, each slot's tests only run on one of the CPUs this
+      process may use, so tests don't compete for cores.
+    * ``memory`` limits each test to that many bytes, using the slot's
+      cgroup if ``cgroups`` is set and RLIMIT_AS otherwise. Only the cgroup
+      limit can be reported as such, because under RLIMIT_AS allocations
+      just fail and what happens next is up to the test.
+    * ``cpu_time`` limits each process in a test to that many seconds of
+      CPU time with RLIMIT_CPU. With cgroups, a test is reported as over
+      the limit if its processes used that much CPU time between them.
+      Otherwise it is if it was killed by SIGXCPU, or exited with the
+      status a shell reports for that. A test that ignores SIGXCPU and is
+      then killed by the hard limit just counts as uninteresting.
+
+    Each test takes a slot per subprocess with ``acquire()``, starts each
+    subprocess with ``preexec(slot)`` as its ``preexec_fn`` after noting
+    ``before(slot)``, passes its exit status to ``check`` once it has
+    finished, and then gives the slots back with ``release()``.
+    """
+
+    def __init__(
+        self,
+        slots,
+        memory=None,
+        cpu_time=None,
+        pin_cpus=False,
+        cgroups=False,
+        cgroup_parent=None,
+    ):
+        self.memory = memory
+        self.cpu_time = cpu_time
+        self.pin_cpus = pin_cpus
+        self.cgroups = cgroups
+        self.__condition = Condition()
+        self.__group = None
+        self.__home = None
+        self.__enabled = None
+
+        cpus = sorted(os.sched_getaffinity(0)) if pin_cpus else [None]
+        groups = [None] * slots
+        if cgroups:
+            groups = self.__make_cgroups(slots, cgroup_parent)
+        self.__free = [
+            Slot(i, cpus[i % len(cpus)], groups[i]) for i in reversed(range(slots))
+        ]
+
+    def __make_cgroups(self, slots, parent):
+        own = parent is None
+        if own:
+            parent = current_cgroup()
+        if parent is None:
+            raise CgroupsUnavailable("cgroup v2 is not available")
+        group = os.path.join(parent, f"satreduce-{os.getpid()}")
+        try:
+            os.mkdir(group)
+            self.__group = group
+            if own:
+                # A cgroup with processes in it can't give its children
+                # controllers, so move this process out of the cgroup it is
+                # in and into a leaf next to the slots.
+                main = os.path.join(group, "main")
+                os.mkdir(main)
+                write_cgroup_file(main, "cgroup.procs", str(os.getpid()))
+                self.__home = parent
+            # Only children of a group that has memory in its
+            # cgroup.subtree_control can have memory limits.
+            if "memory" not in enabled_controllers(parent):
+                write_cgroup_file(parent, "cgroup.subtree_control", "+memory")
+                self.__enabled = parent
+            write_cgroup_file(group, "cgroup.subtree_control", "+memory")
+            result = []
+            for i in range(slots):
+                path = os.path.join(group, f"slot-{i}")
+                os.mkdir(path)
+                if self.memory is not None:
+                    write_cgroup_file(path, "memory.max", str(self.memory))
+                    try:
+                        write_cgroup_file(path, "memory.swap.max", "0")
+                    except FileNotFoundError:
+                        # The kernel was built without swap accounting.
+                        pass
+                result.append(path)
+            return result
+        except OSError as e:
+            self.close()
+            raise CgroupsUnavailable(
+                f"Could not create cgroups under {parent}: {e}. This usually "
+                "means the cgroup hierarchy hasn't been delegated to you, e.g. "
+                "with systemd-run --user --scope -p Delegate=yes."
+            ) from None
+
+    def acquire(self, count=1):
+        """Blocks until ``count`` slots are free and returns them. Taking
+        them all at once means that tests needing several can't deadlock
+        each holding some of them."""
+        with self.__condition:
+            while len(self.__free) < count:
+                self.__condition.wait()
+            return [self.__free.pop() for _ in range(count)]
+
+    def release(self, slots):
+        with self.__condition:
+            self.__free.extend(slots)
+            self.__condition.notify_all()
+
+    def before(self, slot):
+        """State to compare against in ``check`` once the test finishes."""
+        if slot.cgroup is None:
+            return None
+        return (
+            read_cgroup_counter(slot.cgroup, "memory.events", "oom_kill"),
+            read_cgroup_counter(slot.cgroup, "cpu.stat", "usage_usec"),
+        )
+
+    def preexec(self, slot):
+        """Returns a function to run in the test's process before it starts,
+        which puts it in its own process group and applies the limits."""
+        memory_rlimit = self.memory if slot.cgroup is None else None
+
+        def preexec():
+            os.setsid()
+            if slot.cpu is not None:
+                os.sched_setaffinity(0, {slot.cpu})
+            if slot.cgroup is not None:
+                with open(os.path.join(slot.cgroup, "cgroup.procs"), "w") as o:
+                    o.write(str(os.getpid()))
+            if memory_rlimit is not None:
+                resource.setrlimit(resource.RLIMIT_AS, (memory_rlimit, memory_rlimit))
+            if self.cpu_time is not None:
+                # The soft limit sends SIGXCPU, and the hard limit a second
+                # later kills anything that ignores it.
+                soft = math.ceil(self.cpu_time)
+                resource.setrlimit(resource.RLIMIT_CPU, (soft, soft + 1))
+
+        return preexec
+
+    def check(self, slot, returncode, before):
+        """Raises ResourceLimitExceeded if a test run in ``slot`` that exited
+        with ``returncode`` was killed for going over a limit."""
+        if slot.cgroup is not None:
+            oom_kills, usage = before
+            if (
+                read_cgroup_counter(slot.cgroup, "memory.events", "oom_kill")
+                > oom_kills
+            ):
+                raise ResourceLimitExceeded("memory")
+            if self.cpu_time is not None:
+                used = (
+                    read_cgroup_counter(slot.cgroup, "cpu.stat", "usage_usec") - usage
+                )
+                if used >= self.cpu_time * 1e6:
+                    raise ResourceLimitExceeded("cpu")
+        elif self.cpu_time is not None and returncode in CPU_LIMIT_STATUSES:
+            raise ResourceLimitExceeded("cpu")
+
+    def as_dict(self):
+        return {
+            "memory": self.memory,
+            "cpu_time": self.cpu_time,
+            "pin_cpus": self.pin_cpus,
+            "cgroups": self.cgroups,
+        }
+
+    def close(self):
+        """Removes any cgroups that were created, moving this process back
+        to the cgroup it started in if it was moved out of it."""
+        group = self.__group
+        if group is None:
+            return
+        self.__group = None
+        home, self.__home = self.__home, None
+        enabled, self.__enabled = self.__enabled, None
+        for name in os.listdir(group):
+            path = os.path.join(group, name)
+            if os.path.isdir(path) and not (home is not None and name == "main"):
+                try:
+                    os.rmdir(path)
+                except OSError:
+                    pass
+        try:
+            if home is not None:
+                # The cgroup this process started in can only take it back
+                # once the controllers turned on below it are off again.
+                write_cgroup_file(group, "cgroup.subtree_control", "-memory")
+                if enabled is not None:
+                    write_cgroup_file(enabled, "cgroup.subtree_control", "-memory")
+                write_cgroup_file(home, "cgroup.procs", str(os.getpid()))
+                os.rmdir(os.path.join(group, "main"))
+            os.rmdir(group)
+        except OSError:
+            pass
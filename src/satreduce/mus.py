@@ -0,0 +1,119 @@
+"""Minimal unsatisfiable subsets (MUSes) of unsatisfiable formulas.
+
+When the property a reduction needs to preserve is just "this formula is
+unsatisfiable", a SAT solver can find a minimal subset of the clauses with
+that property far more cheaply than testing clause deletions one at a time
+against an external test.
+"""
+
+from satreduce import minisat
+
+
+def falsified(clause, model):
+    return all(-l in model for l in clause)
+
+
+def remove_pure_clauses(clauses):
+    """Removes clauses containing a literal whose negation appears in no
+    other remaining clause. Such a clause can always be satisfied without
+    affecting the rest of the formula, so it is in no MUS."""
+    clauses = list(clauses)
+    while True:
+        literals = {l for c in clauses for l in c}
+        kept = [c for c in clauses if all(-l in literals for l in c)]
+        if len(kept) == len(clauses):
+            return kept
+        clauses = kept
+
+
+def deletion_mus(clauses, find_solution=None):
+    """Returns a minimal unsatisfiable subset of ``clauses`` using
+    deletion-based extraction, longest clauses first.
+
+    Whenever a clause turns out to be necessary the satisfying assignment
+    that proves it is rotated: flipping each variable of that clause in
+    turn gives assignments that often falsify exactly one other clause,
+    which must then be necessary too, without any further solver calls.
+    Whenever a clause turns out to be unnecessary, clauses that can no
+    longer take part in any MUS are dropped as well.
+    Raises ValueError if ``clauses`` is satisfiable."""
+    if find_solution is None:
+        find_solution = minisat.find_solution
+    clauses = [tuple(c) for c in dict.fromkeys(tuple(sorted(set(c))) for c in clauses)]
+    if find_solution(clauses) is not None:
+        raise ValueError("Formula is satisfiable, so has no MUS.")
+    if not all(clauses):
+        return [()]
+
+    necessary = set()
+    unknown = remove_pure_clauses(clauses)
+    unknown.sort(key=len)
+
+    def rotate(clause, model):
+        stack = [(clause, model)]
+        while stack:
+            clause, model = stack.pop()
+            for l in clause:
+                rotated = (model - {-l}) | {l}
+                broken = [c for c in necessary.union(unknown) if falsified(c, rotated)]
+                if len(broken) == 1 and broken[0] not in necessary:
+                    necessary.add(broken[0])
+                    unknown.remove(broken[0])
+                    stack.append((broken[0], rotated))
+
+    while unknown:
+        clause = unknown.pop()
+        rest = list(necessary) + unknown
+        model = find_solution(rest)
+        if model is None:
+            # We can do without it. Anything that now has a pure literal
+            # can't be needed either.
+            refined = set(remove_pure_clauses(rest))
+            unknown = [c for c in unknown if c in refined]
+        else:
+            necessary.add(clause)
+            rotate(clause, set(model))
+
+    return [c for c in clauses if c in necessary]
+
+
+def quickxplain(clauses, find_solution=None):
+    """Returns a minimal unsatisfiable subset of ``clauses`` using
+    QuickXplain, which recursively splits the clauses in half. This needs
+    far fewer solver calls than deletion when the MUS is much smaller than
+    the formula. Raises ValueError if ``clauses`` is satisfiable."""
+    if find_solution is None:
+        find_solution = minisat.find_solution
+    clauses = [tuple(c) for c in dict.fromkeys(tuple(sorted(set(c))) for c in clauses)]
+    if find_solution(clauses) is not None:
+        raise ValueError("Formula is satisfiable, so has no MUS.")
+    if not all(clauses):
+        return [()]
+
+    def unsatisfiable(background):
+        return find_solution(background) is None
+
+    def explain(background, has_delta, candidates):
+        if has_delta and unsatisfiable(background):
+            return []
+        if len(candidates) == 1:
+            return list(candidates)
+        half = len(candidates) // 2
+        left = candidates[:half]
+        right = candidates[half:]
+        from_right = explain(background + left, bool(left), right)
+        from_left = explain(background + from_right, bool(from_right), left)
+        return from_left + from_right
+
+    result = set(explain([], False, remove_pure_clauses(clauses)))
+    return [c for c in clauses if c in result]
+
+
+MUS_ALGORITHMS = {
+    "deletion": deletion_mus,
+    "quickxplain": quickxplain,
+}
+
+
+def find_mus(clauses, algorithm="deletion", find_solution=None):
+    return MUS_ALGORITHMS[algorithm](clauses, find_solution=find_solution)
@@ -0,0 +1,50 @@
+"""Splitting large formulas into regions of closely connected clauses."""
+
+from collections import defaultdict
+from collections import deque
+
+
+def partition_clauses(clauses, n_regions):
+    """Partitions ``clauses`` into at most roughly ``n_regions`` lists of
+    clauses of similar size. Each region is grown breadth first through the
+    clause-variable graph from its lowest unassigned clause, so clauses that
+    share variables tend to end up in the same region."""
+    clauses = list(clauses)
+    if not clauses:
+        return []
+    target = -(-len(clauses) // max(n_regions, 1))
+
+    occurrences = defaultdict(list)
+    for i, c in enumerate(clauses):
+        for l in c:
+            occurrences[abs(l)].append(i)
+
+    assigned = [False] * len(clauses)
+    regions = []
+    next_seed = 0
+    while next_seed < len(clauses):
+        if assigned[next_seed]:
+            next_seed += 1
+            continue
+        region = []
+        queue = deque([next_seed])
+        assigned[next_seed] = True
+        seen_variables = set()
+        while queue and len(region) < target:
+            i = queue.popleft()
+            region.append(i)
+            for l in clauses[i]:
+                v = abs(l)
+                if v in seen_variables:
+                    continue
+                seen_variables.add(v)
+                for j in occurrences[v]:
+                    if not assigned[j]:
+                        assigned[j] = True
+                        queue.append(j)
+        # Anything we queued but didn't have room for goes back in the pool
+        # for later regions.
+        for i in queue:
+            assigned[i] = False
+        regions.append([clauses[i] for i in sorted(region)])
+    return regions
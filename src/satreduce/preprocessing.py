@@ -0,0 +1,191 @@
+"""Simplifications that can be found without running the test.
+
+Subsumption and self-subsuming resolution give a logically equivalent
+formula. Pure literal and blocked clause elimination only preserve whether
+the formula is satisfiable, so are only used when that is all the test is
+known to care about. Bounded variable elimination doesn't preserve models
+either, but removes variables rather than clauses, so the reducer proposes
+it as an ordinary candidate for the test to accept or reject. Everything
+here works from occurrence lists, so is cheap enough to apply to the whole
+formula at once.
+"""
+
+from collections import defaultdict
+
+
+def normalise(clauses):
+    """Sorts and deduplicates ``clauses``, dropping any that contain both a
+    literal and its negation as they are always true."""
+    return sorted(
+        {tuple(sorted(set(c))) for c in clauses if not any(-l in c for l in c)},
+        key=lambda c: (len(c), c),
+    )
+
+
+def occurrence_lists(clauses):
+    occurrences = defaultdict(set)
+    for i, c in enumerate(clauses):
+        for l in c:
+            occurrences[l].add(i)
+    return occurrences
+
+
+def remove_subsumed(clauses):
+    """Removes duplicate clauses and clauses that are supersets of other
+    clauses."""
+    # Shorter clauses come first, so anything that subsumes a clause has
+    # already been kept by the time we see it. Each kept clause is indexed
+    # under just one of its literals, which is enough to find it from any
+    # clause containing it.
+    watches = defaultdict(list)
+    kept = []
+    for c in normalise(clauses):
+        literals = set(c)
+        if any(literals.issuperset(other) for l in c for other in watches[l]):
+            continue
+        kept.append(c)
+        if c:
+            watches[c[0]].append(c)
+    return kept
+
+
+def strengthen(clauses):
+    """Applies self-subsuming resolution: if ``C | l`` is a clause and
+    ``D | -l`` is another with ``C`` contained in ``D``, then ``-l`` can be
+    removed from the second clause."""
+    clauses = normalise(clauses)
+    occurrences = occurrence_lists(clauses)
+    strengthened = [set(c) for c in clauses]
+    # A clause that has just been strengthened may strengthen others in
+    # turn, so it goes back on the queue. Doing this here rather than with
+    # repeated passes over the whole formula keeps long chains of
+    # strengthenings linear in the size of the formula.
+    queue = list(range(len(clauses)))
+    while queue:
+        c = strengthened[queue.pop()]
+        for l in list(c):
+            rest = set(c)
+            rest.discard(l)
+            for j in list(occurrences[-l]):
+                other = strengthened[j]
+                if -l in other and rest.issubset(other) and len(other) > 1:
+                    other.discard(-l)
+                    occurrences[-l].discard(j)
+                    queue.append(j)
+    return normalise(strengthened)
+
+
+def remove_pure_literals(clauses):
+    """Removes every clause containing a literal whose negation appears
+    nowhere in the formula."""
+    clauses = normalise(clauses)
+    while True:
+        literals = {l for c in clauses for l in c}
+        kept = [c for c in clauses if all(-l in literals for l in c)]
+        if len(kept) == len(clauses):
+            return kept
+        clauses = kept
+
+
+def is_blocked(clause, literal, clauses, occurrences):
+    """A clause is blocked on one of its literals if every resolvent on
+    that literal is a tautology."""
+    others = {-m for m in clause if m != literal}
+    return all(others.intersection(clauses[j]) for j in occurrences[-literal])
+
+
+def remove_blocked_clauses(clauses):
+    """Repeatedly removes clauses that are blocked on some literal."""
+    clauses = normalise(clauses)
+    occurrences = occurrence_lists(clauses)
+    removed = set()
+    queue = list(range(len(clauses)))
+    while queue:
+        i = queue.pop()
+        if i in removed:
+            continue
+        clause = clauses[i]
+        if any(is_blocked(clause, l, clauses, occurrences) for l in clause):
+            removed.add(i)
+            for l in clause:
+                occurrences[l].discard(i)
+                # Clauses containing -l have lost a resolution partner, so
+                # may be blocked now.
+                queue.extend(occurrences[-l])
+    return [c for i, c in enumerate(clauses) if i not in removed]
+
+
+def simplify(clauses, satisfiability_only=False):
+    """Applies every simplification until none of them change anything.
+    Formulas that contain an empty clause are returned unchanged."""
+    clauses = normalise(clauses)
+    if not all(clauses):
+        return clauses
+    while True:
+        prev = clauses
+        clauses = remove_subsumed(strengthen(clauses))
+        if satisfiability_only:
+            clauses = remove_blocked_clauses(remove_pure_literals(clauses))
+        if clauses == prev:
+            return clauses
+
+
+def resolvents(positive, negative, variable, limit):
+    """The non-tautological resolvents on ``variable`` of each clause in
+    ``positive`` with each clause in ``negative``, or None if there would be
+    more than ``limit`` of them."""
+    result = set()
+    for p in positive:
+        for n in negative:
+            resolvent = set(p)
+            resolvent.discard(variable)
+            resolvent.update(l for l in n if l != -variable)
+            if any(-l in resolvent for l in resolvent):
+                continue
+            result.add(tuple(sorted(resolvent)))
+            if len(result) > limit:
+                return None
+    return result
+
+
+def elimination_order(clauses):
+    """Variables of ``clauses`` in the order to try eliminating them:
+    those with the fewest possible resolvents first."""
+    occurrences = occurrence_lists(normalise(clauses))
+    variables = {abs(l) for l in occurrences}
+    return sorted(
+        variables,
+        key=lambda v: (len(occurrences[v]) * len(occurrences[-v]), v),
+    )
+
+
+def eliminate_variables(clauses, variables):
+    """Eliminates each of ``variables`` in turn by replacing the clauses
+    that mention it with all their resolvents on it, skipping any variable
+    for which that would increase the number of clauses or produce the
+    empty clause. The result is satisfiable exactly when ``clauses`` is.
+    Returns the new clauses and the variables actually eliminated."""
+    live = set(normalise(clauses))
+    occurrences = defaultdict(set)
+    for c in live:
+        for l in c:
+            occurrences[l].add(c)
+    eliminated = []
+    for v in variables:
+        positive = occurrences[v]
+        negative = occurrences[-v]
+        if not positive and not negative:
+            continue
+        replacements = resolvents(positive, negative, v, len(positive) + len(negative))
+        if replacements is None or () in replacements:
+            continue
+        for c in positive | negative:
+            live.discard(c)
+            for l in c:
+                occurrences[l].discard(c)
+        for c in replacements - live:
+            live.add(c)
+            for l in c:
+                occurrences[l].add(c)
+        eliminated.append(v)
+    return normalise(live), eliminated
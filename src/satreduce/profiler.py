@@ -0,0 +1,202 @@
+"""A sampling profiler for the reducer's own overhead.
+
+When tests are fast, the time the reducer spends choosing and building
+candidates starts to dominate. ``SamplingProfiler`` looks at the stack of
+every thread that is doing reduction work at regular intervals, which
+costs little enough to leave on for a whole run, and sorts each sample
+into one of three categories:
+
+* ``test``: running a test, including waiting for its subprocess.
+* ``waiting``: blocked waiting for tests running on other threads.
+* ``reducer``: anything else, i.e. the reducer's own work.
+
+Threads with no reducer code on their stack, such as idle workers, aren't
+sampled.
+"""
+
+import marshal
+import os
+import sys
+import threading
+from collections import Counter
+from time import monotonic
+
+
+CATEGORIES = ("reducer", "waiting", "test")
+
+REDUCER_FILE = os.path.join(os.path.dirname(__file__), "reducer.py")
+
+# Where a thread's innermost Python frame is when it is blocked waiting
+# for something else to happen.
+WAITING_FILES = {
+    os.path.join("concurrent", "futures", "_base.py"),
+    "queue.py",
+    "selectors.py",
+    "threading.py",
+}
+
+
+def is_waiting(filename):
+    return any(filename.endswith(os.sep + f) for f in WAITING_FILES)
+
+
+class SamplingProfiler:
+    """Samples the stacks of reducer threads every ``interval`` seconds
+    between ``start()`` and ``stop()``."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = 0
+        self.stacks = Counter()
+        self.categories = Counter()
+        self.wall_time = 0.0
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__start = None
+
+    def start(self):
+        self.__start = monotonic()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is None:
+            return
+        self.__stop.set()
+        self.__thread.join()
+        self.__thread = None
+        self.wall_time = monotonic() - self.__start
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __run(self):
+        me = threading.get_ident()
+        while not self.__stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self.sample(frame)
+
+    def sample(self, frame):
+        """Records the stack that ``frame`` is the innermost frame of, if it
+        is doing reduction work."""
+        stack = []
+        in_reducer = False
+        in_test = False
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            if code.co_filename == REDUCER_FILE:
+                in_reducer = True
+                if code.co_name == "__run_test":
+                    in_test = True
+            frame = frame.f_back
+        if not in_reducer:
+            return
+        stack.reverse()
+        if in_test:
+            category = "test"
+        elif is_waiting(stack[-1][0]):
+            category = "waiting"
+        else:
+            category = "reducer"
+        self.samples += 1
+        self.categories[category] += 1
+        self.stacks[(category, tuple(stack))] += 1
+
+    def write_collapsed(self, path):
+        """Writes the samples in the collapsed stack format used by
+        flamegraph.pl and speedscope, with the category as the root frame
+        of each stack."""
+        with open(path, "w") as o:
+            for (category, stack), count in sorted(self.stacks.items()):
+                frames = [f"[{category}]"] + [
+                    f"{name} ({os.path.basename(filename)}:{line})"
+                    for filename, line, name in stack
+                ]
+                o.write(";".join(frames) + f" {count}\n")
+
+    def pstats_data(self):
+        """The samples in the format that pstats.Stats loads, with each
+        sample counting as ``interval`` seconds."""
+        stats = {}
+        callers = {}
+        for (_, stack), count in self.stacks.items():
+            seconds = count * self.interval
+            seen = set()
+            for i, function in enumerate(stack):
+                cc, nc, tt, ct = stats.get(function, (0, 0, 0.0, 0.0))
+                if i == len(stack) - 1:
+                    tt += seconds
+                if function not in seen:
+                    # Recursive functions only count once towards the
+                    # cumulative time of a sample.
+                    seen.add(function)
+                    ct += seconds
+                    nc += count
+                    cc += count
+                stats[function] = (cc, nc, tt, ct)
+                if i > 0:
+                    edges = callers.setdefault(function, {})
+                    ecc, enc, ett, ect = edges.get(stack[i - 1], (0, 0, 0.0, 0.0))
+                    edges[stack[i - 1]] = (
+                        ecc + count,
+                        enc + count,
+                        ett + (seconds if i == len(stack) - 1 else 0.0),
+                        ect + seconds,
+                    )
+        return {f: v + (callers.get(f, {}),) for f, v in stats.items()}
+
+    def write_pstats(self, path):
+        with open(path, "wb") as o:
+            marshal.dump(self.pstats_data(), o)
+
+    def write(self, path, format=None):
+        """Writes the profile to ``path``, as pstats if ``format`` is
+        "pstats" or ``path`` ends in .prof or .pstats, and as collapsed
+        stacks otherwise."""
+        if format is None:
+            format = "pstats" if path.endswith((".prof", ".pstats")) else "collapsed"
+        if format == "pstats":
+            self.write_pstats(path)
+        else:
+            self.write_collapsed(path)
+
+    def as_dict(self):
+        return {
+            "samples": self.samples,
+            "interval": self.interval,
+            "wall_time": self.wall_time,
+            "categories": {c: self.categories[c] for c in CATEGORIES},
+        }
+
+    def hottest(self, category="reducer", n=10):
+        """The ``n`` functions with the most samples in ``category`` where
+        they were the innermost frame, as (count, function) pairs."""
+        counts = Counter()
+        for (c, stack), count in self.stacks.items():
+            if c == category:
+                counts[stack[-1]] += count
+        return [(count, function) for function, count in counts.most_common(n)]
+
+    def format_summary(self, n=10):
+        total = max(self.samples, 1)
+        lines = [
+            f"profile: {self.samples} samples over {self.wall_time:.2f}s, "
+            + ", ".join(
+                f"{c} {100 * self.categories[c] / total:.0f}%" for c in CATEGORIES
+            )
+        ]
+        hottest = self.hottest("reducer", n)
+        if hottest:
+            lines.append("hottest reducer code:")
+            for count, (filename, line, name) in hottest:
+                lines.append(
+                    f"  {100 * count / total:5.1f}%  {name} "
+                    f"({os.path.basename(filename)}:{line})"
+                )
+        return "\n".join(lines)
@@ -1,14 +1,28 @@
 import hashlib
 from collections import Counter
 from collections import defaultdict
+from concurrent.futures import Future
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from functools import wraps
 from itertools import islice
+from threading import Event
 from threading import Lock
+from threading import Timer
+from threading import get_ident
+from time import monotonic
+from time import thread_time
 
 from satreduce.booleanequivalence import Inconsistency
-from satreduce.decomposition import ReducedSatProblem
+from satreduce.canonical import isomorphism_key
+from satreduce.mus import find_mus
+from satreduce.partition import partition_clauses
+from satreduce.preprocessing import eliminate_variables as eliminate_variables_from
+from satreduce.preprocessing import elimination_order
+from satreduce.preprocessing import simplify
+from satreduce.stats import PassStats
+from satreduce.stats import format_parallelism_summary
+from satreduce.stats import format_stats_table
 
 
 def shrink_sat(clauses, test_function, **kwargs):
@@ -22,24 +36,89 @@ def reduction_pass(fn):
     def accept(self):
         self.debug(fn.__name__)
         prev = self.current
-        fn(self)
+        with self.recording_pass(fn.__name__):
+            fn(self)
         if prev is not self.current:
             self.house_keeping_shrinks()
 
     return accept
 
 
+def reduced_sat_problem(clauses):
+    # decomposition needs networkx, which takes longer to import than the
+    # rest of satreduce put together, so it is only loaded once a pass
+    # actually needs it. This keeps scripts that just import satreduce
+    # fast to start.
+    from satreduce.decomposition import ReducedSatProblem
+
+    return ReducedSatProblem.from_sat(clauses)
+
+
 class SATShrinker:
-    def __init__(self, starting_point, test_function, debug=False, parallelism=1):
+    def __init__(
+        self,
+        starting_point,
+        test_function,
+        debug=False,
+        parallelism=1,
+        max_tests=None,
+        deadline=None,
+        trace=None,
+        canonical_labelling=False,
+        track_necessary=True,
+        verify_necessary=True,
+        split_components=False,
+        coarse_threshold=1000,
+        speculate=True,
+        parallelism_controller=None,
+        test_property=None,
+        mus_algorithm="deletion",
+        executor=None,
+    ):
+        if test_property not in (None, "unsat"):
+            raise ValueError(f"Unknown test property {test_property!r}")
         self.current = canonicalise(starting_point)
         self.__test_function = test_function
         self.__cache = {}
+        self.__pending = {}
         self.__debug = debug
         self.__on_reduce_callbacks = []
+        self.__on_cancel_callbacks = []
+        self.__max_tests = max_tests
+        self.__deadline = None if deadline is None else monotonic() + deadline
+        self.__cancelled = Event()
+        self.__trace = trace
+        self.__canonical_labelling = canonical_labelling
+        self.__isomorphism_cache = {}
+        self.__known_necessary = KnownNecessary(enabled=track_necessary)
+        self.__verify_necessary = verify_necessary
+        self.__split_components = split_components
+        self.__coarse_threshold = coarse_threshold
+        self.__test_property = test_property
+        self.__clause_block_size = None
+        self.__preprocessed = None
+        self.__mus_algorithm = mus_algorithm
+        self.__speculate = speculate and parallelism > 1
+        self.__speculating = 0
+        self.__speculation_base = None
+        self.__speculation = None
         self.__parallelism = parallelism
+        self.__controller = parallelism_controller
+        self.__pass_stats = {}
+        self.__active_pass = None
+        self.__overall = PassStats("total")
+        self.__reducer_thread = get_ident()
+        self.__in_flight = 0
+        self.__start_time = monotonic()
+        self.__start_cpu = thread_time()
 
         if parallelism > 1:
-            self.__executor = ThreadPoolExecutor(max_workers=parallelism)
+            # Several reducers can share one executor, e.g. when reducing a
+            # batch of files, in which case the controller they also share
+            # is what limits how many tests run at once.
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=parallelism)
+            self.__executor = executor
             self.__lock = Lock()
 
         if not self.test_function(self.current):
@@ -48,26 +127,210 @@ class SATShrinker:
     def on_reduce(self, fn):
         self.__on_reduce_callbacks.append(fn)
 
+    def on_cancel(self, fn):
+        """Registers ``fn`` to be called when the reduction stops early
+        because its budget has run out, so that any tests still running
+        can be abandoned."""
+        self.__on_cancel_callbacks.append(fn)
+
+    @property
+    def budget_exhausted(self):
+        return self.__cancelled.is_set()
+
+    @property
+    def has_budget(self):
+        return self.__max_tests is not None or self.__deadline is not None
+
+    def remaining_time(self):
+        if self.__deadline is None:
+            return float("inf")
+        return self.__deadline - monotonic()
+
+    def __out_of_budget(self):
+        return (
+            self.__cancelled.is_set()
+            or (
+                self.__max_tests is not None
+                and self.__overall.test_calls + self.__in_flight >= self.__max_tests
+            )
+            or self.remaining_time() <= 0
+        )
+
+    def cancel(self):
+        """Stops the reduction as soon as possible, leaving ``current`` as
+        the best result found so far."""
+        with self.locked():
+            if self.__cancelled.is_set():
+                return
+            self.__cancelled.set()
+        self.debug("Reduction budget exhausted")
+        for f in self.__on_cancel_callbacks:
+            f()
+
     def debug(self, *args, **kwargs):
         if self.__debug:
             print(*args, **kwargs)
 
+    @property
+    def passes(self):
+        passes = [
+            self.preprocess,
+            self.delete_clauses,
+            self.delete_literals,
+            self.force_literals,
+            self.delete_literals_from_clauses,
+            self.eliminate_variables,
+            self.merge_variables,
+        ]
+        if self.__split_components:
+            passes.insert(0, self.reduce_components_independently)
+        if self.__test_property == "unsat":
+            passes.insert(0, self.extract_mus)
+        if (
+            self.__coarse_threshold is not None
+            and len(self.current) >= self.__coarse_threshold
+        ):
+            passes.insert(0, self.delete_regions)
+        return passes
+
+    @property
+    def pass_stats(self):
+        return dict(self.__pass_stats)
+
+    def stats_for(self, name):
+        try:
+            return self.__pass_stats[name]
+        except KeyError:
+            return self.__pass_stats.setdefault(name, PassStats(name))
+
+    def stats_report(self):
+        """Returns a JSON-serialisable summary of where the reduction
+        has spent its time so far."""
+        overall = self.__overall
+        overall.runs = sum(s.runs for s in self.__pass_stats.values())
+        overall.bytes_removed = sum(s.bytes_removed for s in self.__pass_stats.values())
+        overall.wall_time = monotonic() - self.__start_time
+        overall.cpu_time = thread_time() - self.__start_cpu
+        report = {
+            "passes": {
+                name: stats.as_dict() for name, stats in self.__pass_stats.items()
+            },
+            "total": overall.as_dict(),
+        }
+        if self.__controller is not None:
+            report["parallelism"] = self.__controller.as_dict()
+        return report
+
+    def format_stats(self):
+        report = self.stats_report()
+        table = format_stats_table(report)
+        if "parallelism" in report:
+            table += "\n\n" + format_parallelism_summary(report["parallelism"])
+        return table
+
+    def __record_wait(self, elapsed):
+        self.__overall.wait_time += elapsed
+        if self.__active_pass is not None:
+            self.__active_pass.wait_time += elapsed
+
+    @contextmanager
+    def recording_pass(self, name):
+        stats = self.stats_for(name)
+        prev_pass = self.__active_pass
+        self.__active_pass = stats
+        initial_size = size_in_bytes(self.current)
+        start = monotonic()
+        start_cpu = thread_time()
+        try:
+            yield stats
+        finally:
+            self.__active_pass = prev_pass
+            stats.record_run(
+                bytes_removed=max(0, initial_size - size_in_bytes(self.current)),
+                wall_time=monotonic() - start,
+                cpu_time=thread_time() - start_cpu,
+            )
+
+    def scheduled_passes(self):
+        """Returns the passes to run this round, most productive first.
+        Passes that have repeatedly failed to make progress are skipped
+        for an exponentially growing number of rounds."""
+        passes = []
+        for p in self.passes:
+            stats = self.stats_for(p.__name__)
+            if stats.should_skip():
+                stats.skip_round()
+            else:
+                passes.append(p)
+        if self.has_budget:
+            # When running against a budget, passes that are unlikely to
+            # finish in the time remaining go last so that they don't
+            # starve cheaper ones.
+            remaining = self.remaining_time()
+
+            def cost_key(p):
+                stats = self.stats_for(p.__name__)
+                mean_cost = stats.wall_time / stats.runs if stats.runs else 0.0
+                return (mean_cost > remaining, -stats.expected_gain_rate())
+
+            passes.sort(key=cost_key)
+        else:
+            passes.sort(key=lambda p: -self.stats_for(p.__name__).expected_gain_rate())
+        return passes
+
     def reduce(self):
-        prev = None
-        while prev is not self.current:
+        self.__reducer_thread = get_ident()
+        timer = None
+        if self.__deadline is not None:
+            # Checking the deadline before each test doesn't stop the tests
+            # that are already running when it passes, so cancel them then.
+            timer = Timer(max(0.0, self.remaining_time()), self.cancel)
+            timer.daemon = True
+            timer.start()
+        try:
+            self.__reduce_to_fixpoint()
+        except BudgetExhausted:
+            pass
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def __reduce_to_fixpoint(self):
+        while True:
             prev = self.current
             self.house_keeping_shrinks()
-            self.delete_clauses()
-            self.delete_literals()
-            self.force_literals()
-            self.delete_literals_from_clauses()
-            self.merge_variables()
+            scheduled = self.scheduled_passes()
+            for reduction in scheduled:
+                reduction()
+            if prev is not self.current:
+                continue
+            if len(scheduled) < len(self.passes):
+                # Some passes were skipped, so we can't yet be sure that we've
+                # reached a fixpoint. Run everything once to check.
+                self.debug("Verifying fixpoint")
+                for reduction in self.passes:
+                    reduction()
+                if prev is not self.current:
+                    continue
+            if not self.__verify_necessary or not self.__known_necessary.skipped:
+                return
+            # Deletions we skipped because they failed against an earlier
+            # version of the problem might succeed now, so check them all.
+            self.debug("Verifying known necessary clauses and literals")
+            self.__known_necessary.skipped = 0
+            with self.__known_necessary.suspended():
+                for reduction in self.passes:
+                    reduction()
+            if prev is self.current:
+                return
 
     def house_keeping_shrinks(self):
-        self.replace_with_core()
-        self.move_to_components()
-        self.renumber_variables()
+        with self.recording_pass("house_keeping_shrinks"):
+            self.replace_with_core()
+            self.move_to_components()
+            self.renumber_variables()
 
+    @reduction_pass
     def delete_literals(self):
         counts = Counter()
         for clause in self.current:
@@ -104,7 +367,7 @@ class SATShrinker:
             if prev != self.current:
                 prev = self.current
                 try:
-                    problem = ReducedSatProblem.from_sat(self.current)
+                    problem = reduced_sat_problem(self.current)
                 except Inconsistency:
                     return
             try:
@@ -116,32 +379,48 @@ class SATShrinker:
 
     def replace_with_core(self):
         try:
-            self.try_reduced_problem(ReducedSatProblem.from_sat(self.current))
+            self.try_reduced_problem(reduced_sat_problem(self.current))
         except Inconsistency:
             pass
 
-    def try_reduced_problem(self, problem):
-        if self.test_function(problem.core):
-            return
+    def reduced_candidates(self, problem):
+        """Returns the core of ``problem``, then the core with its forced
+        literals added back, then that with its merged variables added back
+        as equivalences, which is equivalent to the clauses ``problem`` was
+        built from."""
         variables = {abs(l) for c in self.current for l in c}
-        filled = list(problem.core)
+        core = list(problem.core)
+        forced = list(core)
         for k, v in problem.forced.items():
             if not v:
                 k = -k
-            filled.append([k])
-        if self.test_function(filled):
-            return
+            forced.append([k])
+        merged = list(forced)
         for k in variables:
             k2 = problem.merge_table.find(k)
             if k2 == k:
                 continue
-            filled.extend(
+            merged.extend(
                 [
                     [-k, k2],
                     [-k2, k],
                 ]
             )
-        self.test_function(filled)
+        return [core, forced, merged]
+
+    def try_reduced_problem(self, problem):
+        candidates = self.reduced_candidates(problem)
+        if self.__parallelism <= 1:
+            for candidate in candidates:
+                if self.test_function(candidate):
+                    return
+        else:
+            # Each candidate is only worth trying if the previous ones fail,
+            # but with spare workers it's cheaper to try them all at once.
+            try:
+                self.find_first(candidates, self.test_function, len(candidates))
+            except NotFound:
+                pass
 
     @contextmanager
     def locked(self):
@@ -154,7 +433,7 @@ class SATShrinker:
             finally:
                 self.__lock.release()
 
-    def find_first(self, ls, f):
+    def find_first(self, ls, f, initial_chunk_size=1):
         if not ls:
             raise NotFound()
         if self.__parallelism <= 1:
@@ -164,16 +443,87 @@ class SATShrinker:
             raise NotFound()
         else:
             it = iter(ls)
-            chunk_size = 1
+            chunk_size = initial_chunk_size
             while True:
                 chunk = list(islice(it, chunk_size))
                 if not chunk:
                     raise NotFound()
-                for x, b in zip(chunk, self.__executor.map(f, chunk)):
-                    if b:
-                        return x
+                start = monotonic()
+                try:
+                    results = self.__executor.map(f, chunk)
+                    self.__fill_idle_workers(busy=len(chunk))
+                    for x, b in zip(chunk, results):
+                        if b:
+                            return x
+                finally:
+                    self.__record_wait(monotonic() - start)
                 chunk_size *= 2
 
+    @property
+    def concurrency_limit(self):
+        """The number of tests that may currently run at once."""
+        if self.__controller is not None:
+            return self.__controller.limit
+        return self.__parallelism
+
+    def __fill_idle_workers(self, busy):
+        """Uses any workers not needed by the current pass to test
+        candidates that later passes are likely to try against the current
+        problem, so that their results are already cached when those passes
+        get to them. Candidates are discarded unrun if the problem changes
+        before a worker picks them up."""
+        if not self.__speculate:
+            return
+        with self.locked():
+            idle = self.concurrency_limit - busy - self.__speculating
+            if idle <= 0:
+                return
+            base = self.current
+            if self.__speculation_base is not base:
+                self.__speculation_base = base
+                self.__speculation = self.__speculative_candidates(base)
+            candidates = list(islice(self.__speculation, idle))
+            self.__speculating += len(candidates)
+        for candidate in candidates:
+            self.__executor.submit(self.__speculate_on, base, candidate)
+
+    def __speculate_on(self, base, candidate):
+        try:
+            if self.current is base and not self.__cancelled.is_set():
+                self.test_function(candidate)
+        except BudgetExhausted:
+            pass
+        finally:
+            with self.locked():
+                self.__speculating -= 1
+
+    def __speculative_candidates(self, base):
+        # The candidates delete_clauses will try if none of them work: at
+        # each block size, keeping each block alone when there are only a
+        # few, then deleting the first few blocks before moving on to a
+        # finer size, and finally deleting single clauses...
+        initial = list(reversed(base))
+        n = len(initial)
+        k = self.__first_clause_block_size(n)
+        while True:
+            starts = range(0, n, k)
+            if k > 1:
+                if n <= 4 * k:
+                    for j in starts:
+                        yield initial[j : j + k]
+                starts = starts[: max(2, self.__parallelism)]
+            for j in starts:
+                block = initial[j : j + k]
+                if not any(self.__known_necessary.is_known(initial, c) for c in block):
+                    yield initial[:j] + initial[j + k :]
+            if k == 1:
+                break
+            k //= 2
+        # ...followed by those delete_literals will.
+        counts = Counter(l for c in base for l in c)
+        for l in sorted(counts, key=counts.__getitem__, reverse=True):
+            yield [set(c) - {l} for c in base]
+
     def move_to_components(self):
         merges = UnionFind()
 
@@ -192,24 +542,270 @@ class SATShrinker:
             if self.test_function(attempt):
                 return
 
+    @reduction_pass
+    def preprocess(self):
+        """Tries the problem simplified by everything in
+        satreduce.preprocessing at once, so that a single test can confirm
+        any number of removals that needed no tests to find. Simplifications
+        that only preserve satisfiability are used when the test is
+        declared to only care about unsatisfiability. Does nothing if the
+        problem hasn't changed since the last time it ran, as simplifying it
+        again would only find the same candidates."""
+        if self.__preprocessed is self.current:
+            return
+        self.__preprocessed = self.current
+        satisfiability_only = self.__test_property == "unsat"
+        bases = [self.current]
+        try:
+            core, _, merged = self.reduced_candidates(reduced_sat_problem(self.current))
+        except Inconsistency:
+            pass
+        else:
+            bases.append(merged)
+            if satisfiability_only:
+                bases.append(core)
+
+        candidates = []
+        for base in bases:
+            simplified = canonicalise(simplify(base, satisfiability_only))
+            if (
+                sort_key(simplified) < sort_key(self.current)
+                and simplified not in candidates
+            ):
+                candidates.append(simplified)
+        candidates.sort(key=sort_key)
+
+        if self.__parallelism <= 1:
+            for candidate in candidates:
+                if self.test_function(candidate):
+                    return
+        else:
+            try:
+                self.find_first(candidates, self.test_function, len(candidates))
+            except NotFound:
+                pass
+
+    @reduction_pass
+    def extract_mus(self):
+        """When the test is declared to only care that the problem is
+        unsatisfiable, jumps straight to a minimal unsatisfiable subset found
+        with a SAT solver, so that the test only has to confirm it."""
+        try:
+            mus = find_mus(self.current, self.__mus_algorithm)
+        except ValueError:
+            self.debug("Problem is satisfiable, so cannot extract a MUS")
+            return
+        self.test_function(mus)
+
+    @reduction_pass
+    def reduce_components_independently(self):
+        """Reduces each variable-disjoint component of the problem with its
+        own shrinker, concurrently, holding the other components at their
+        latest reduced state."""
+        parts = split_components(self.current)
+        if len(parts) <= 1:
+            return
+        parts_lock = Lock()
+
+        def reduce_part(i):
+            def test(part):
+                with parts_lock:
+                    attempt = list(parts)
+                attempt[i] = part
+                return self.test_function(join_components(attempt))
+
+            try:
+                shrinker = SATShrinker(
+                    parts[i],
+                    test,
+                    track_necessary=self.__known_necessary.enabled,
+                    verify_necessary=self.__verify_necessary,
+                )
+            except ValueError:
+                # The other components have changed underneath us in a way
+                # that means this one no longer works as it is.
+                return
+
+            @shrinker.on_reduce
+            def _(part):
+                with parts_lock:
+                    parts[i] = part
+
+            shrinker.reduce()
+
+        workers = min(len(parts), max(self.__parallelism, 1))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(reduce_part, range(len(parts))):
+                pass
+
+        self.test_function(join_components(parts))
+
+    @reduction_pass
+    def delete_regions(self):
+        """Coarse-to-fine deletion for very large problems. Splits the
+        clauses into regions of the clause-variable graph, tries keeping
+        each region alone and then deleting whole regions, and recurses
+        into whatever survives until regions are small enough that the
+        clause-at-a-time passes can take over."""
+        n_regions = max(2, 2 * self.__parallelism)
+        regions = partition_clauses(self.current, n_regions)
+        if len(regions) <= 1:
+            return
+        chunk_size = self.__parallelism
+
+        def keep_only(region):
+            return self.test_function(region)
+
+        try:
+            self.find_first(regions, keep_only, initial_chunk_size=chunk_size)
+        except NotFound:
+            pass
+        else:
+            return
+
+        min_region_size = 8
+        while regions:
+            i = 0
+            while i < len(regions):
+                current = self.current
+                present = set(current)
+                regions = [[c for c in r if c in present] for r in regions]
+                regions = [r for r in regions if r]
+                if i >= len(regions):
+                    break
+
+                def can_delete(j):
+                    region = set(regions[j])
+                    return self.test_function([c for c in current if c not in region])
+
+                try:
+                    i = self.find_first(
+                        range(i, len(regions)),
+                        can_delete,
+                        initial_chunk_size=chunk_size,
+                    )
+                except NotFound:
+                    break
+                # We don't delete regions[i] here: when running in parallel,
+                # a different successful deletion may have been the one that
+                # became current. Filtering against current at the top of
+                # the loop drops whichever regions are actually gone.
+
+            present = set(self.current)
+            regions = [
+                half
+                for r in regions
+                if len(r) > min_region_size
+                for half in partition_clauses([c for c in r if c in present], 2)
+            ]
+
     @reduction_pass
     def delete_clauses(self):
+        """Hierarchical delta debugging over the clause list: tries deleting
+        blocks of clauses, starting large and halving the block size
+        whenever most deletions at the current size fail. The size to start
+        at is learned from where earlier runs found deletions, so that
+        problems that are nearly minimal don't pay for the coarse levels
+        every time."""
+        k = self.__first_clause_block_size(len(self.current))
+        largest_success = 0
+        while True:
+            successes, attempts = self.__delete_clause_blocks(k)
+            if successes:
+                largest_success = max(largest_success, k)
+            if k == 1:
+                break
+            if 2 * successes <= attempts:
+                k //= 2
+            k = max(1, min(k, len(self.current) // 2))
+        self.__clause_block_size = 2 * largest_success if largest_success else 1
+
+    def __first_clause_block_size(self, n):
+        return max(1, min(self.__clause_block_size or n // 2, n // 2))
+
+    def __delete_clause_blocks(self, k):
+        """Tries deleting each block of ``k`` consecutive clauses, newest
+        first, giving up early if the first few blocks can't be deleted.
+        When there are only a few blocks, also tries keeping each block
+        alone. Returns the number of deletions that succeeded and the number
+        attempted."""
+        successes = 0
+        attempts = 0
+
+        def counted(f):
+            def accept(j):
+                nonlocal attempts
+                with self.locked():
+                    attempts += 1
+                return f(j)
+
+            return accept
+
+        initial = list(reversed(self.current))
+        if k > 1 and len(initial) <= 4 * k:
+
+            @counted
+            def keep_only(j):
+                return self.test_function(initial[j : j + k])
+
+            try:
+                self.find_first(
+                    range(0, len(initial), k), keep_only, self.__parallelism
+                )
+            except NotFound:
+                pass
+            else:
+                return 1, attempts
+
         i = 0
         while i < len(self.current):
             initial = list(reversed(self.current))
 
-            def can_delete(j, k):
-                if j + k > len(initial):
+            @counted
+            def can_delete(j):
+                block = initial[j : j + k]
+                if any(self.__known_necessary.is_known(initial, c) for c in block):
                     return False
-                return self.test_function(initial[:j] + initial[j + k :])
-
+                result = self.test_function(initial[:j] + initial[j + k :])
+                if k == 1 and not result:
+                    self.__known_necessary.record(initial, initial[j])
+                return result
+
+            starts = range(i, len(initial), k)
+            if k > 1 and not successes:
+                # Until something works at this block size, only probe a
+                # few blocks before moving on to a finer one.
+                starts = starts[: max(2, self.__parallelism)]
             try:
-                i = self.find_first(range(i, len(initial)), lambda j: can_delete(j, 1))
+                i = self.find_first(starts, can_delete, self.__parallelism)
             except NotFound:
                 break
+            successes += 1
+        return successes, attempts
 
-            find_integer(lambda k: can_delete(i, k))
-            i += 1
+    @reduction_pass
+    def eliminate_variables(self):
+        """Bounded variable elimination: removes variables by replacing the
+        clauses that mention them with their resolvents, where that doesn't
+        increase the number of clauses. First tries eliminating every such
+        variable at once, then falls back to finding long runs of them that
+        can be eliminated together."""
+        variables = elimination_order(self.current)
+        attempt, eliminated = eliminate_variables_from(self.current, variables)
+        if not eliminated or self.test_function(attempt):
+            return
+
+        i = 0
+        while i < len(variables):
+            current = self.current
+
+            def can_eliminate(k):
+                if i + k > len(variables):
+                    return False
+                attempt, _ = eliminate_variables_from(current, variables[i : i + k])
+                return self.test_function(attempt)
+
+            i += find_integer(can_eliminate) + 1
 
     @reduction_pass
     def merge_variables(self):
@@ -252,6 +848,11 @@ class SATShrinker:
                 j = 0
                 changed = False
                 while j < len(clause):
+                    if not changed and self.__known_necessary.is_known(
+                        current, clause, clause[j]
+                    ):
+                        j += 1
+                        continue
                     attempt = list(current)
                     attempt[i] = list(clause)
                     del attempt[i][j]
@@ -259,6 +860,8 @@ class SATShrinker:
                         clause = attempt[i]
                         changed = True
                     else:
+                        if not changed:
+                            self.__known_necessary.record(current, clause, clause[j])
                         j += 1
                 return changed
 
@@ -268,32 +871,161 @@ class SATShrinker:
                 break
             i += 1
 
+    def __record_cache_hit(self, deduplicated=False):
+        with self.locked():
+            for stats in (self.__overall, self.__active_pass):
+                if stats is not None:
+                    stats.cache_hits += 1
+                    if deduplicated:
+                        stats.deduplicated += 1
+
     def test_function(self, clauses):
         keys = [cache_key(clauses)]
         try:
-            return self.__cache[keys[0]]
+            result = self.__cache[keys[0]]
         except KeyError:
             pass
+        else:
+            self.__record_cache_hit()
+            return result
 
         clauses = canonicalise(clauses)
         keys.append(cache_key(clauses))
+        with self.locked():
+            result = self.__cache.get(keys[-1])
+            if result is not None:
+                self.__cache[keys[0]] = result
+        if result is not None:
+            self.__record_cache_hit()
+            return result
+
+        active = self.__active_pass
+        iso_key = None
+
+        if self.__canonical_labelling:
+            # Canonical labelling is much more expensive than the exact
+            # lookup, so it is only worth doing once that has missed.
+            iso_key, exact = isomorphism_key(clauses)
+            if not exact:
+                # An inexact key may be shared by formulas that aren't
+                # isomorphic, so a verdict cached under it could be wrong
+                # for this one either way.
+                iso_key = None
+
+        isomorphic_hit = False
+        with self.locked():
+            try:
+                result = self.__cache[keys[-1]]
+            except KeyError:
+                result = None
+                if iso_key is not None:
+                    result = self.__isomorphism_cache.get(iso_key)
+                    isomorphic_hit = result is not None
+            if result is not None:
+                for key in keys:
+                    self.__cache[key] = result
+                pending = None
+            else:
+                pending = self.__pending.get(keys[-1])
+                if pending is None:
+                    future = Future()
+                    self.__pending[keys[-1]] = future
+
+        if result is not None:
+            self.__record_cache_hit()
+            if result and isomorphic_hit:
+                self.__consider(clauses, active)
+            return result
+
+        if pending is not None:
+            # Someone else is already testing exactly this candidate, so
+            # wait for their answer rather than running it again.
+            self.__record_cache_hit(deduplicated=True)
+            start = monotonic()
+            try:
+                result = pending.result()
+            finally:
+                if get_ident() == self.__reducer_thread:
+                    self.__record_wait(monotonic() - start)
+            with self.locked():
+                self.__cache[keys[0]] = result
+            return result
+
         try:
-            result = self.__cache[keys[-1]]
-        except KeyError:
-            result = self.__test_function(clauses)
-            if result:
-                with self.locked():
-                    if sort_key(clauses) < sort_key(self.current):
-                        self.debug(
-                            f"Shrunk to {len(clauses)} clauses over {len(calc_variables(clauses))} variables"
+            result = self.__run_test(clauses, keys, iso_key, active)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self.locked():
+                del self.__pending[keys[-1]]
+        return result
+
+    def __run_test(self, clauses, keys, iso_key, active):
+        with self.locked():
+            out_of_budget = self.__out_of_budget()
+            if not out_of_budget:
+                self.__in_flight += 1
+                queue_depth = self.__in_flight
+        if out_of_budget:
+            self.cancel()
+            raise BudgetExhausted()
+        controller = self.__controller
+        if controller is not None:
+            controller.acquire()
+        start = monotonic()
+        timed_out = False
+        limit_exceeded = None
+        try:
+            result = bool(self.__test_function(clauses))
+        except TimedOut:
+            result = False
+            timed_out = True
+        except ResourceLimitExceeded as e:
+            result = False
+            limit_exceeded = e.resource
+        finally:
+            runtime = monotonic() - start
+            if controller is not None:
+                controller.release()
+            with self.locked():
+                self.__in_flight -= 1
+                for stats in (self.__overall, active):
+                    if stats is not None:
+                        stats.record_test(
+                            runtime, queue_depth, timed_out, limit_exceeded
                         )
-                        self.current = clauses
-                        for f in self.__on_reduce_callbacks:
-                            f(clauses)
-        for key in keys:
-            self.__cache[key] = result
+        if self.__trace is not None and not self.__cancelled.is_set():
+            # Tests killed by cancellation don't have a real verdict.
+            self.__trace.record(keys[-1], result, runtime)
+        if get_ident() == self.__reducer_thread:
+            self.__record_wait(runtime)
+        if result:
+            self.__consider(clauses, active)
+        with self.locked():
+            if iso_key is not None:
+                self.__isomorphism_cache[iso_key] = result
+            for key in keys:
+                self.__cache[key] = result
         return result
 
+    def __consider(self, clauses, active):
+        """Makes ``clauses``, which are known to be interesting, the current
+        best if they are an improvement on it."""
+        with self.locked():
+            if sort_key(clauses) < sort_key(self.current):
+                self.debug(
+                    f"Shrunk to {len(clauses)} clauses over {len(calc_variables(clauses))} variables"
+                )
+                self.current = clauses
+                for stats in (self.__overall, active):
+                    if stats is not None:
+                        stats.reductions += 1
+                for f in self.__on_reduce_callbacks:
+                    f(clauses)
+
     def renumber_variables(self):
         renumbering = {}
 
@@ -311,15 +1043,50 @@ class SATShrinker:
             renumbering[l] = result
             return result
 
-        renumbered = [[renumber(l) for l in c] for c in self.current]
+        prev = self.current
+        renumbered = [[renumber(l) for l in c] for c in prev]
 
         self.test_function(renumbered)
+        if self.current is not prev and self.current == canonicalise(renumbered):
+            renaming = {}
+            for v in calc_variables(prev):
+                renaming[v] = renumber(v)
+                renaming[-v] = -renaming[v]
+            self.__known_necessary.rename(renaming)
+
+
+def split_components(clauses):
+    """Splits ``clauses`` into groups that share no variables."""
+    merges = UnionFind()
+    for clause in clauses:
+        merges.merge_all(map(abs, clause))
+    components = defaultdict(list)
+    for clause in clauses:
+        key = merges.find(abs(clause[0])) if clause else None
+        components[key].append(clause)
+    return [canonicalise(c) for c in components.values()]
+
+
+def join_components(parts):
+    """Combines formulas into one, shifting the variables of each so that
+    no two parts share a variable."""
+    result = []
+    offset = 0
+    for part in parts:
+        result.extend([l + offset if l > 0 else l - offset for l in c] for c in part)
+        offset += max((abs(l) for c in part for l in c), default=0)
+    return result
 
 
 def calc_variables(clauses):
     return {abs(l) for c in clauses for l in c}
 
 
+def size_in_bytes(clauses):
+    """Approximate size of the DIMACS body for ``clauses``."""
+    return sum(len(repr(l)) + 1 for c in clauses for l in c) + 2 * len(clauses)
+
+
 def sort_key(clauses):
     n_variables = len(calc_variables(clauses))
     n_clauses = len(clauses)
@@ -425,10 +1192,108 @@ class UnionFind:
         return f"UnionFind({list(self.partitions())})"
 
 
+class KnownNecessary:
+    """Remembers single clause and literal deletions that failed, together
+    with the neighbourhood of the clause (every clause sharing a variable
+    with it) in the problem they were tried against. While that
+    neighbourhood is unchanged, retrying the deletion is very likely to
+    fail again, so passes skip it."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.skipped = 0
+        self.__failures = {}
+        self.__index_for = None
+        self.__index = None
+        self.__lock = Lock()
+
+    def __neighbourhood(self, problem, clause):
+        with self.__lock:
+            if self.__index_for is not problem:
+                index = defaultdict(list)
+                for c in problem:
+                    for l in c:
+                        index[abs(l)].append(c)
+                self.__index = index
+                self.__index_for = problem
+            index = self.__index
+        return frozenset(d for l in clause for d in index[abs(l)])
+
+    def record(self, problem, clause, literal=None):
+        if self.enabled:
+            self.__failures[(tuple(clause), literal)] = self.__neighbourhood(
+                problem, clause
+            )
+
+    def is_known(self, problem, clause, literal=None):
+        if not self.enabled:
+            return False
+        try:
+            neighbourhood = self.__failures[(tuple(clause), literal)]
+        except KeyError:
+            return False
+        if neighbourhood != self.__neighbourhood(problem, clause):
+            return False
+        with self.__lock:
+            self.skipped += 1
+        return True
+
+    @contextmanager
+    def suspended(self):
+        enabled = self.enabled
+        self.enabled = False
+        try:
+            yield
+        finally:
+            self.enabled = enabled
+
+    def rename(self, renaming):
+        """Updates every recorded failure after the variables of the problem
+        have been renamed according to the dict ``renaming``. Failures that
+        mention variables no longer in the problem are forgotten."""
+
+        def rename_clause(clause):
+            return tuple(sorted(renaming[l] for l in clause))
+
+        failures = {}
+        for (clause, literal), neighbourhood in self.__failures.items():
+            try:
+                key = (
+                    rename_clause(clause),
+                    None if literal is None else renaming[literal],
+                )
+                failures[key] = frozenset(map(rename_clause, neighbourhood))
+            except KeyError:
+                continue
+        self.__failures = failures
+
+
 class NotFound(Exception):
     pass
 
 
+class BudgetExhausted(Exception):
+    """Raised inside the shrinker when its test or time budget has run out,
+    to unwind whatever pass is currently running."""
+
+
+class TimedOut(Exception):
+    """May be raised by a test function to report that the test was
+    abandoned because it ran for too long. The candidate is treated as
+    uninteresting, but counted separately in the statistics."""
+
+
+class ResourceLimitExceeded(Exception):
+    """May be raised by a test function to report that the test was killed
+    for going over a limit on ``resource``, such as "memory" or "cpu". The
+    candidate is treated as uninteresting, but counted separately in the
+    statistics."""
+
+    def __init__(self, resource):
+        super().__init__(resource)
+        self.resource = resource
+
+
 def canonicalise(clauses):
     return tuple(
         sorted(
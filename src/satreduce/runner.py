@@ -0,0 +1,671 @@
+import codecs
+import importlib
+import multiprocessing
+import os
+import re
+import select
+import selectors
+import signal
+import subprocess
+import sys
+import time
+import traceback
+from tempfile import TemporaryDirectory
+from threading import Lock
+from threading import Thread
+
+from satreduce.dimacscnf import clauses_to_dimacs
+from satreduce.mus import falsified
+from satreduce.reducer import ResourceLimitExceeded
+from satreduce.reducer import TimedOut
+
+
+def signal_group(sp, signal):
+    gid = os.getpgid(sp.pid)
+    assert gid != os.getgid()
+    os.killpg(gid, signal)
+
+
+def interrupt_wait_and_kill(sp, timeout=0.1):
+    if sp.returncode is None:
+        try:
+            # In case the subprocess forked. Python might hang if you don't close
+            # all pipes.
+            for pipe in [sp.stdout, sp.stderr, sp.stdin]:
+                if pipe:
+                    pipe.close()
+            signal_group(sp, signal.SIGINT)
+            for _ in range(10):
+                if sp.poll() is not None:
+                    return
+                time.sleep(timeout)
+            signal_group(sp, signal.SIGKILL)
+        except ProcessLookupError:  # pragma: no cover
+            # This is incredibly hard to trigger reliably, because it only happens
+            # if the process exits at exactly the wrong time.
+            pass
+        sp.wait(timeout=timeout)
+
+
+class StreamMatcher:
+    """Watches a stream of output from a test for a regular expression."""
+
+    def __init__(self, pattern, echo=None):
+        self.pattern = pattern
+        self.echo = echo
+        self.matched = False
+        self.text = ""
+        self.__searched = 0
+        self.__decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def feed(self, data):
+        chunk = self.__decoder.decode(data)
+        if self.echo is not None:
+            self.echo.write(chunk)
+            self.echo.flush()
+        if self.matched:
+            return
+        self.text += chunk
+        if self.pattern.search(self.text, self.__searched):
+            self.matched = True
+            self.text = ""
+        else:
+            # Only the last, possibly incomplete, line could become part of
+            # a match once more output arrives.
+            self.__searched = self.text.rfind("\n") + 1
+
+
+class TestCommand:
+    """Runs an external command as an interestingness test, passing it each
+    candidate as a DIMACS CNF file named ``basename``. Calling it returns
+    True if the command exits with a status in ``exit_codes`` (by default
+    just 0), and raises TimedOut if it runs for longer than ``timeout``.
+
+    If ``stdout_match`` or ``stderr_match`` are given, the test is instead
+    interesting if those regular expressions match the corresponding
+    output, and also exits with a status in ``exit_codes`` if that was
+    given explicitly. Output is read as it arrives, and the command is
+    killed as soon as the answer is known.
+
+    If ``adaptive_timeout`` is given, it chooses the timeout for every call
+    after the first, and learns from the runtimes of calls that complete.
+
+    If ``limits`` (a satreduce.limits.ResourceLimits) is given, the command
+    runs in one of its slots, and raises ResourceLimitExceeded if it goes
+    over one of its limits.
+    """
+
+    def __init__(
+        self,
+        command,
+        basename,
+        input_type="all",
+        timeout=None,
+        debug=False,
+        adaptive_timeout=None,
+        stdout_match=None,
+        stderr_match=None,
+        exit_codes=None,
+        limits=None,
+    ):
+        self.command = command
+        self.basename = basename
+        self.input_type = input_type
+        self.timeout = timeout
+        self.debug = debug
+        self.adaptive_timeout = adaptive_timeout
+        self.stdout_match = stdout_match
+        self.stderr_match = stderr_match
+        self.exit_codes = None if exit_codes is None else frozenset(exit_codes)
+        self.limits = limits
+        self.first_call = True
+        self.__running = set()
+        self.__lock = Lock()
+
+    def __call__(self, clauses):
+        if not clauses or not all(clauses):
+            assert not self.first_call
+            return False
+        if self.limits is None:
+            return self.__run(clauses, None)
+        slots = self.limits.acquire()
+        try:
+            return self.__run(clauses, slots[0])
+        finally:
+            self.limits.release(slots)
+
+    def __run(self, clauses, slot):
+        cnf = clauses_to_dimacs(clauses)
+        with TemporaryDirectory() as d:
+            working = os.path.join(d, self.basename)
+            with open(working, "w") as o:
+                o.write(cnf)
+
+            if self.input_type in ("all", "arg"):
+                command = self.command + [working]
+            else:
+                command = self.command
+
+            kwargs = dict(
+                universal_newlines=True,
+                preexec_fn=os.setsid,
+                cwd=d,
+            )
+            if self.input_type in ("all", "stdin"):
+                kwargs["stdin"] = subprocess.PIPE
+                input_string = cnf
+            else:
+                kwargs["stdin"] = subprocess.DEVNULL
+                input_string = ""
+
+            patterns = {}
+            for stream, pattern in [
+                ("stdout", self.stdout_match),
+                ("stderr", self.stderr_match),
+            ]:
+                if pattern is not None:
+                    kwargs[stream] = subprocess.PIPE
+                    patterns[stream] = re.compile(pattern, re.MULTILINE)
+                elif not self.debug:
+                    kwargs[stream] = subprocess.DEVNULL
+
+            timeout = self.timeout
+            if self.adaptive_timeout is not None and not self.first_call:
+                timeout = self.adaptive_timeout.timeout_for(len(cnf))
+
+            if slot is not None:
+                kwargs["preexec_fn"] = self.limits.preexec(slot)
+                before = self.limits.before(slot)
+
+            start = time.monotonic()
+            sp = subprocess.Popen(command, **kwargs)
+            with self.__lock:
+                self.__running.add(sp)
+
+            try:
+                if patterns:
+                    result = self.__watch(sp, input_string, patterns, timeout)
+                else:
+                    sp.communicate(input_string, timeout=timeout)
+                    result = sp.returncode in (self.exit_codes or {0})
+                if slot is not None:
+                    self.limits.check(slot, sp.returncode, before)
+            except subprocess.TimeoutExpired:
+                if self.first_call:
+                    raise ValueError(
+                        f"Initial test call exceeded timeout of {timeout}s. Try raising or disabling timeout."
+                    )
+                raise TimedOut()
+            except ResourceLimitExceeded as e:
+                if self.first_call:
+                    raise ValueError(
+                        f"Initial test call exceeded the {e.resource} limit. Try raising it."
+                    )
+                raise
+            else:
+                # A test decided early from its output is killed before it
+                # finishes, so how long it ran says nothing about how long
+                # tests take.
+                if self.adaptive_timeout is not None and sp.poll() is not None:
+                    self.adaptive_timeout.record(time.monotonic() - start, len(cnf))
+            finally:
+                self.first_call = False
+                with self.__lock:
+                    self.__running.discard(sp)
+                interrupt_wait_and_kill(sp)
+            return result
+
+    def __watch(self, sp, input_string, patterns, timeout):
+        """Reads the output of ``sp`` until it is known whether the test is
+        interesting, raising TimeoutExpired if that takes longer than
+        ``timeout``."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining():
+            if deadline is None:
+                return None
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise subprocess.TimeoutExpired(sp.args, timeout)
+            return left
+
+        echoes = {"stdout": sys.stdout, "stderr": sys.stderr}
+        with selectors.DefaultSelector() as selector:
+            if sp.stdin is not None:
+                # Like communicate(), feed input a pipe buffer at a time so
+                # that we never block on a test that isn't reading it.
+                pending = memoryview(input_string.encode("utf-8"))
+                selector.register(sp.stdin.fileno(), selectors.EVENT_WRITE)
+            matchers = []
+            for name, pattern in patterns.items():
+                matcher = StreamMatcher(pattern, echoes[name] if self.debug else None)
+                matchers.append(matcher)
+                selector.register(
+                    getattr(sp, name).fileno(), selectors.EVENT_READ, matcher
+                )
+
+            while selector.get_map():
+                if self.exit_codes is None and all(m.matched for m in matchers):
+                    return True
+                for key, _ in selector.select(remaining()):
+                    if key.data is None:
+                        try:
+                            written = os.write(key.fd, pending[: select.PIPE_BUF])
+                        except BrokenPipeError:
+                            written = len(pending)
+                        pending = pending[written:]
+                        if not pending:
+                            selector.unregister(key.fd)
+                            sp.stdin.close()
+                        continue
+                    data = os.read(key.fd, 65536)
+                    if data:
+                        key.data.feed(data)
+                    else:
+                        selector.unregister(key.fd)
+                        if not key.data.matched:
+                            # The stream is finished and never matched.
+                            return False
+
+        if not all(m.matched for m in matchers):
+            return False
+        if self.exit_codes is None:
+            return True
+        sp.wait(timeout=remaining())
+        return sp.returncode in self.exit_codes
+
+    def kill_all(self):
+        """Kills every test that is currently running."""
+        with self.__lock:
+            running = list(self.__running)
+        for sp in running:
+            try:
+                signal_group(sp, signal.SIGKILL)
+            except ProcessLookupError:  # pragma: no cover
+                pass
+
+
+def load_test_function(spec):
+    """Imports the function named by ``spec``, which has the form
+    ``module:function``. Raises ValueError if it can't be found."""
+    module_name, _, name = spec.partition(":")
+    if not module_name or not name:
+        raise ValueError(f"{spec!r} is not of the form module:function")
+    try:
+        target = importlib.import_module(module_name)
+        for part in name.split("."):
+            target = getattr(target, part)
+    except (ImportError, AttributeError) as e:
+        raise ValueError(f"Could not load {spec}: {e}") from None
+    if not callable(target):
+        raise ValueError(f"{spec} is not callable")
+    return target
+
+
+def call_test_function(function, clauses):
+    """Returns ``(result, None)`` if ``function`` returned normally on
+    ``clauses``, or ``(False, traceback)`` if it raised."""
+    try:
+        return bool(function(clauses)), None
+    except Exception:
+        return False, traceback.format_exc()
+
+
+def python_test_worker(spec, path, connection):
+    """Loads the test function in a worker process and answers calls to it
+    sent over ``connection`` until that is closed."""
+    sys.path[:] = path
+    function = load_test_function(spec)
+    connection.send(None)
+    while True:
+        try:
+            clauses = connection.recv()
+        except EOFError:
+            return
+        connection.send(call_test_function(function, clauses))
+
+
+class PythonTest:
+    """Runs a Python function as an interestingness test, calling it on each
+    candidate as a tuple of clauses, each a tuple of ints. ``spec`` names
+    the function as ``module:function``, and it is imported once.
+
+    By default the function is called in the calling thread. If ``timeout``
+    is given then each call runs in a thread of its own so that it can be
+    abandoned, but a call that is abandoned can't be stopped, so carries on
+    in the background. With ``processes=True`` calls are sent to a pool of
+    worker processes instead, and a worker whose call times out is killed
+    and replaced.
+
+    Calls that raise an exception are uninteresting, except on the first
+    call, where they are reported as a ValueError. Timeouts work as for
+    TestCommand.
+    """
+
+    def __init__(
+        self,
+        spec,
+        processes=False,
+        timeout=None,
+        debug=False,
+        adaptive_timeout=None,
+    ):
+        self.spec = spec
+        self.processes = processes
+        self.timeout = timeout
+        self.debug = debug
+        self.adaptive_timeout = adaptive_timeout
+        self.first_call = True
+        self.__function = None if processes else load_test_function(spec)
+        self.__idle = []
+        self.__workers = set()
+        self.__lock = Lock()
+
+    def __call__(self, clauses):
+        size = sum(map(len, clauses))
+        timeout = self.timeout
+        if self.adaptive_timeout is not None and not self.first_call:
+            timeout = self.adaptive_timeout.timeout_for(size)
+
+        start = time.monotonic()
+        try:
+            if self.processes:
+                result, error = self.__call_in_process(clauses, timeout)
+            else:
+                result, error = self.__call_in_thread(clauses, timeout)
+        except TimedOut:
+            if self.first_call:
+                raise ValueError(
+                    f"Initial test call exceeded timeout of {timeout}s. Try raising or disabling timeout."
+                )
+            raise
+        finally:
+            first_call = self.first_call
+            self.first_call = False
+
+        if error is not None:
+            if first_call:
+                raise ValueError(f"Initial test call raised an exception:\n{error}")
+            if self.debug:
+                sys.stderr.write(error)
+        elif self.adaptive_timeout is not None:
+            self.adaptive_timeout.record(time.monotonic() - start, size)
+        return result
+
+    def __call_in_thread(self, clauses, timeout):
+        if timeout is None:
+            return call_test_function(self.__function, clauses)
+        outcome = []
+        thread = Thread(
+            target=lambda: outcome.append(call_test_function(self.__function, clauses)),
+            daemon=True,
+        )
+        thread.start()
+        thread.join(timeout)
+        if not outcome:
+            raise TimedOut()
+        return outcome[0]
+
+    def __call_in_process(self, clauses, timeout):
+        with self.__lock:
+            worker = self.__idle.pop() if self.__idle else None
+        if worker is None:
+            worker = self.__start_worker()
+        process, connection = worker
+        try:
+            connection.send(clauses)
+            if not connection.poll(timeout):
+                self.__stop_worker(worker)
+                raise TimedOut()
+            outcome = connection.recv()
+        except (EOFError, OSError):
+            # The worker died, e.g. because the test crashed the
+            # interpreter or because kill_all was called.
+            self.__stop_worker(worker)
+            return False, None
+        with self.__lock:
+            if worker in self.__workers:
+                self.__idle.append(worker)
+        return outcome
+
+    def __start_worker(self):
+        # Forking a process with running threads isn't safe, so workers are
+        # started fresh and import the test function for themselves.
+        context = multiprocessing.get_context("spawn")
+        connection, child = context.Pipe()
+        process = context.Process(
+            target=python_test_worker,
+            args=(self.spec, list(sys.path), child),
+            daemon=True,
+        )
+        process.start()
+        child.close()
+        # Wait for the worker to be ready, so that the time it takes to
+        # start doesn't count against the timeout of its first call.
+        try:
+            connection.recv()
+        except EOFError:
+            process.join()
+            connection.close()
+            raise ValueError(f"Worker process could not load {self.spec}") from None
+        worker = (process, connection)
+        with self.__lock:
+            self.__workers.add(worker)
+        return worker
+
+    def __stop_worker(self, worker):
+        process, connection = worker
+        with self.__lock:
+            self.__workers.discard(worker)
+        process.kill()
+        process.join()
+        connection.close()
+
+    def kill_all(self):
+        """Kills every worker process, abandoning any calls in progress."""
+        with self.__lock:
+            workers = list(self.__workers)
+            self.__idle.clear()
+        for worker in workers:
+            self.__stop_worker(worker)
+
+
+SATISFIABLE = "SATISFIABLE"
+UNSATISFIABLE = "UNSATISFIABLE"
+
+SAT_EXIT_CODES = {10: SATISFIABLE, 20: UNSATISFIABLE}
+
+
+def parse_solver_output(returncode, output):
+    """Reads a SAT solver's answer from its exit code (10 for satisfiable and
+    20 for unsatisfiable, as is conventional) or failing that from an
+    ``s SATISFIABLE`` or ``s UNSATISFIABLE`` line in its output. Returns
+    the answer, or None if there wasn't one, and the literals of any model
+    given on ``v`` lines."""
+    verdict = SAT_EXIT_CODES.get(returncode)
+    model = []
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith("v "):
+            model.extend(int(l) for l in line[2:].split() if l != "0")
+            continue
+        if line.startswith("s "):
+            line = line[2:].strip()
+        if verdict is None and line in (SATISFIABLE, UNSATISFIABLE):
+            verdict = line
+    return verdict, model
+
+
+def differential_verdict(clauses, answers, check_models=False):
+    """Decides whether solvers disagree about ``clauses``, given ``answers``
+    from parse_solver_output for each solver that has finished, and None
+    for each that hasn't. Returns None if that can't be known until more of
+    them finish.
+
+    A solver that gave no answer makes the candidate uninteresting. With
+    ``check_models``, a solver claiming satisfiability with a model that
+    falsifies a clause makes it interesting whatever the others say."""
+    finished = [a for a in answers if a is not None]
+    if check_models:
+        for verdict, model in finished:
+            if verdict == SATISFIABLE and model:
+                model = set(model)
+                if any(falsified(c, model) for c in clauses):
+                    return True
+    if any(verdict is None for verdict, _ in finished):
+        return False
+    if len(finished) < len(answers):
+        return None
+    return len({verdict for verdict, _ in finished}) > 1
+
+
+class DifferentialTest:
+    """Runs several SAT solvers concurrently on each candidate, which is
+    interesting if they disagree about whether it is satisfiable. Each
+    solver is given the path of a DIMACS CNF file named ``basename`` as its
+    last argument, and its answer is read as in parse_solver_output.
+
+    As soon as the outcome is known, e.g. because a solver crashed without
+    answering, the others are killed. Timeouts and ``limits`` work as for
+    TestCommand, with each solver in a slot of its own, and
+    ``check_models`` is as for differential_verdict.
+    """
+
+    def __init__(
+        self,
+        commands,
+        basename,
+        timeout=None,
+        debug=False,
+        adaptive_timeout=None,
+        check_models=False,
+        limits=None,
+    ):
+        self.commands = commands
+        self.basename = basename
+        self.timeout = timeout
+        self.debug = debug
+        self.adaptive_timeout = adaptive_timeout
+        self.check_models = check_models
+        self.limits = limits
+        self.first_call = True
+        self.__running = set()
+        self.__lock = Lock()
+
+    def __call__(self, clauses):
+        if not clauses or not all(clauses):
+            assert not self.first_call
+            return False
+        if self.limits is None:
+            return self.__run(clauses, None)
+        slots = self.limits.acquire(len(self.commands))
+        try:
+            return self.__run(clauses, slots)
+        finally:
+            self.limits.release(slots)
+
+    def __run(self, clauses, slots):
+        cnf = clauses_to_dimacs(clauses)
+        timeout = self.timeout
+        if self.adaptive_timeout is not None and not self.first_call:
+            timeout = self.adaptive_timeout.timeout_for(len(cnf))
+
+        with TemporaryDirectory() as d:
+            working = os.path.join(d, self.basename)
+            with open(working, "w") as o:
+                o.write(cnf)
+
+            befores = []
+            start = time.monotonic()
+            processes = []
+            try:
+                for i, command in enumerate(self.commands):
+                    preexec_fn = os.setsid
+                    if slots is not None:
+                        preexec_fn = self.limits.preexec(slots[i])
+                        befores.append(self.limits.before(slots[i]))
+                    sp = subprocess.Popen(
+                        command + [working],
+                        stdin=subprocess.DEVNULL,
+                        stdout=subprocess.PIPE,
+                        stderr=None if self.debug else subprocess.DEVNULL,
+                        preexec_fn=preexec_fn,
+                        cwd=d,
+                    )
+                    processes.append(sp)
+                    with self.__lock:
+                        self.__running.add(sp)
+                result = self.__watch(clauses, processes, timeout, slots, befores)
+            except subprocess.TimeoutExpired:
+                if self.first_call:
+                    raise ValueError(
+                        f"Initial test call exceeded timeout of {timeout}s. Try raising or disabling timeout."
+                    )
+                raise TimedOut()
+            except ResourceLimitExceeded as e:
+                if self.first_call:
+                    raise ValueError(
+                        f"Initial test call exceeded the {e.resource} limit. Try raising it."
+                    )
+                raise
+            else:
+                # Solvers still running once the verdict is known are
+                # killed, and don't say how long a full run takes.
+                if self.adaptive_timeout is not None and all(
+                    sp.poll() is not None for sp in processes
+                ):
+                    self.adaptive_timeout.record(time.monotonic() - start, len(cnf))
+            finally:
+                self.first_call = False
+                with self.__lock:
+                    self.__running.difference_update(processes)
+                for sp in processes:
+                    interrupt_wait_and_kill(sp)
+            return result
+
+    def __watch(self, clauses, processes, timeout, slots, befores):
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining():
+            if deadline is None:
+                return None
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise subprocess.TimeoutExpired(self.commands, timeout)
+            return left
+
+        outputs = [bytearray() for _ in processes]
+        answers = [None for _ in processes]
+        with selectors.DefaultSelector() as selector:
+            for i, sp in enumerate(processes):
+                selector.register(sp.stdout.fileno(), selectors.EVENT_READ, i)
+            while True:
+                verdict = differential_verdict(clauses, answers, self.check_models)
+                if verdict is not None:
+                    return verdict
+                for key, _ in selector.select(remaining()):
+                    i = key.data
+                    data = os.read(key.fd, 65536)
+                    if data:
+                        outputs[i].extend(data)
+                        continue
+                    selector.unregister(key.fd)
+                    sp = processes[i]
+                    sp.wait(remaining())
+                    if slots is not None:
+                        self.limits.check(slots[i], sp.returncode, befores[i])
+                    output = outputs[i].decode("utf-8", errors="replace")
+                    if self.debug:
+                        sys.stdout.write(output)
+                        sys.stdout.flush()
+                    answers[i] = parse_solver_output(sp.returncode, output)
+
+    def kill_all(self):
+        """Kills every solver that is currently running."""
+        with self.__lock:
+            running = list(self.__running)
+        for sp in running:
+            try:
+                signal_group(sp, signal.SIGKILL)
+            except ProcessLookupError:  # pragma: no cover
+                pass
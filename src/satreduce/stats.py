@@ -0,0 +1,203 @@
+import math
+
+
+class LatencyHistogram:
+    """Counts of test latencies in power-of-two millisecond buckets. Bucket
+    ``n`` holds latencies in ``[2 ** (n - 1), 2 ** n)`` milliseconds, with
+    bucket 0 holding everything under a millisecond."""
+
+    def __init__(self):
+        self.buckets = {}
+
+    def record(self, seconds):
+        millis = seconds * 1000
+        bucket = 0 if millis < 1 else int(math.log2(millis)) + 1
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    @staticmethod
+    def bucket_label(bucket):
+        if bucket == 0:
+            return "<1ms"
+        return f"<{2 ** bucket}ms"
+
+    def as_dict(self):
+        return {
+            self.bucket_label(bucket): self.buckets[bucket]
+            for bucket in sorted(self.buckets)
+        }
+
+
+class PassStats:
+    """Running totals for a single reduction pass, used to decide how
+    often it is worth running and to report where time goes."""
+
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.successes = 0
+        self.reductions = 0
+        self.test_calls = 0
+        self.cache_hits = 0
+        self.deduplicated = 0
+        self.timeouts = 0
+        self.limits_exceeded = {}
+        self.test_time = 0.0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.wait_time = 0.0
+        self.bytes_removed = 0
+        self.max_queue_depth = 0
+        self.total_queue_depth = 0
+        self.latencies = LatencyHistogram()
+        self.runs_without_progress = 0
+        self.rounds_to_skip = 0
+
+    def record_test(self, runtime, queue_depth, timed_out=False, limit_exceeded=None):
+        self.test_calls += 1
+        if timed_out:
+            self.timeouts += 1
+        if limit_exceeded is not None:
+            self.limits_exceeded[limit_exceeded] = (
+                self.limits_exceeded.get(limit_exceeded, 0) + 1
+            )
+        self.test_time += runtime
+        self.total_queue_depth += queue_depth
+        self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+        self.latencies.record(runtime)
+
+    def record_run(self, bytes_removed, wall_time, cpu_time=0.0):
+        self.runs += 1
+        self.wall_time += wall_time
+        self.cpu_time += cpu_time
+        self.bytes_removed += bytes_removed
+        if bytes_removed > 0:
+            self.successes += 1
+            self.runs_without_progress = 0
+            self.rounds_to_skip = 0
+        else:
+            self.runs_without_progress += 1
+            # Back off exponentially from passes that keep failing to make
+            # progress: skip 1, 2, 4, ... rounds before trying them again.
+            if self.runs_without_progress >= 2:
+                self.rounds_to_skip = 2 ** (self.runs_without_progress - 2)
+
+    def should_skip(self):
+        return self.rounds_to_skip > 0
+
+    def skip_round(self):
+        """Records that the pass was skipped for a round because of
+        ``should_skip()``."""
+        self.rounds_to_skip = max(0, self.rounds_to_skip - 1)
+
+    def expected_gain_rate(self):
+        """Estimated bytes removed per second of test time. Passes that
+        have never run are treated as infinitely promising so that every
+        pass gets measured at least once."""
+        if self.runs == 0:
+            return float("inf")
+        return (self.bytes_removed + 1) / max(self.test_time, 1e-6)
+
+    @property
+    def mean_queue_depth(self):
+        if self.test_calls == 0:
+            return 0.0
+        return self.total_queue_depth / self.test_calls
+
+    @property
+    def reducer_time(self):
+        """Wall time spent in the reducer itself rather than waiting for
+        tests to complete."""
+        return max(0.0, self.wall_time - self.wait_time)
+
+    def as_dict(self):
+        return {
+            "runs": self.runs,
+            "successes": self.successes,
+            "reductions": self.reductions,
+            "test_calls": self.test_calls,
+            "cache_hits": self.cache_hits,
+            "deduplicated": self.deduplicated,
+            "timeouts": self.timeouts,
+            "limits_exceeded": dict(self.limits_exceeded),
+            "bytes_removed": self.bytes_removed,
+            "wall_time": self.wall_time,
+            "test_time": self.test_time,
+            "wait_time": self.wait_time,
+            "reducer_time": self.reducer_time,
+            "reducer_cpu_time": self.cpu_time,
+            "max_queue_depth": self.max_queue_depth,
+            "mean_queue_depth": self.mean_queue_depth,
+            "latency_histogram": self.latencies.as_dict(),
+        }
+
+    def __repr__(self):
+        return (
+            f"PassStats({self.name!r}, runs={self.runs}, "
+            f"successes={self.successes}, test_calls={self.test_calls}, "
+            f"bytes_removed={self.bytes_removed})"
+        )
+
+
+TABLE_COLUMNS = [
+    ("pass", "{}"),
+    ("runs", "{}"),
+    ("tests", "{}"),
+    ("hits", "{}"),
+    ("timeouts", "{}"),
+    ("limits", "{}"),
+    ("reductions", "{}"),
+    ("bytes", "{}"),
+    ("wall", "{:.2f}s"),
+    ("waiting", "{:.2f}s"),
+    ("cpu", "{:.2f}s"),
+    ("depth", "{}"),
+]
+
+
+def format_stats_table(report):
+    """Formats the ``passes`` and ``total`` sections of a stats report as a
+    plain text table."""
+    rows = []
+    sections = list(report["passes"].items()) + [("total", report["total"])]
+    for name, s in sections:
+        values = [
+            name,
+            s["runs"],
+            s["test_calls"],
+            s["cache_hits"],
+            s["timeouts"],
+            sum(s["limits_exceeded"].values()),
+            s["reductions"],
+            s["bytes_removed"],
+            s["wall_time"],
+            s["wait_time"],
+            s["reducer_cpu_time"],
+            s["max_queue_depth"],
+        ]
+        rows.append([fmt.format(v) for (_, fmt), v in zip(TABLE_COLUMNS, values)])
+
+    header = [title for title, _ in TABLE_COLUMNS]
+    widths = [max(len(r[i]) for r in rows + [header]) for i in range(len(header))]
+
+    def line(cells):
+        return "  ".join(
+            c.ljust(w) if i == 0 else c.rjust(w)
+            for i, (c, w) in enumerate(zip(cells, widths))
+        )
+
+    return "\n".join([line(header)] + [line(r) for r in rows])
+
+
+def format_parallelism_summary(report):
+    """Summarises the ``parallelism`` section of a stats report."""
+    lines = [
+        f"parallelism: finished at {report['limit']} "
+        f"(min {report['min']}, max {report['max']}), "
+        f"{len(report['decisions'])} adjustments"
+    ]
+    for d in report["decisions"]:
+        lines.append(
+            f"  {d['time']:.2f}s: {d['from']} -> {d['to']} ({d['reason']}, "
+            f"{d['throughput']:.1f} tests/s)"
+        )
+    return "\n".join(lines)
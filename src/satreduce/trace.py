@@ -0,0 +1,102 @@
+"""Recording and replaying the results of interestingness tests.
+
+A trace is an append-only text file with one line per test invocation::
+
+    <cache key> <0 or 1> <latency in seconds>
+
+Replaying a trace lets changes to the reducer be benchmarked against the
+verdicts of a real, possibly very slow, test without rerunning it.
+"""
+
+import time
+from threading import Lock
+
+from satreduce.reducer import cache_key
+from satreduce.reducer import canonicalise
+
+
+class TraceWriter:
+    def __init__(self, path):
+        self.path = path
+        self.__file = open(path, "a")
+        self.__lock = Lock()
+
+    def record(self, key, result, latency):
+        line = f"{key} {int(bool(result))} {latency:.6f}\n"
+        with self.__lock:
+            self.__file.write(line)
+            self.__file.flush()
+
+    def close(self):
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load_trace(path):
+    """Returns a dict mapping cache keys to ``(result, latency)`` pairs. If a
+    key appears more than once the first verdict wins."""
+    results = {}
+    with open(path) as i:
+        for line in i:
+            parts = line.split()
+            if len(parts) != 3:
+                # A partially written final line from an interrupted run.
+                continue
+            key, result, latency = parts
+            results.setdefault(key, (result == "1", float(latency)))
+    return results
+
+
+class UnseenCandidate(Exception):
+    pass
+
+
+class ReplayOracle:
+    """A test function that answers from a recorded trace.
+
+    Candidates that do not appear in the trace are passed to ``fallback`` if
+    one is given, raise ``UnseenCandidate`` if ``strict`` is set, and are
+    otherwise treated as uninteresting. If ``simulate_latency`` is set then
+    each replayed answer sleeps for the recorded latency multiplied by
+    ``latency_scale``.
+    """
+
+    def __init__(
+        self,
+        path,
+        fallback=None,
+        strict=False,
+        simulate_latency=False,
+        latency_scale=1.0,
+    ):
+        self.trace = load_trace(path)
+        self.fallback = fallback
+        self.strict = strict
+        self.simulate_latency = simulate_latency
+        self.latency_scale = latency_scale
+        self.hits = 0
+        self.misses = 0
+        self.__lock = Lock()
+
+    def __call__(self, clauses):
+        key = cache_key(canonicalise(clauses))
+        try:
+            result, latency = self.trace[key]
+        except KeyError:
+            with self.__lock:
+                self.misses += 1
+            if self.strict:
+                raise UnseenCandidate(key)
+            if self.fallback is not None:
+                return self.fallback(clauses)
+            return False
+        with self.__lock:
+            self.hits += 1
+        if self.simulate_latency:
+            time.sleep(latency * self.latency_scale)
+        return result
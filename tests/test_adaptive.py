@@ -0,0 +1,220 @@
+import threading
+
+import pytest
+
+from satreduce.adaptive import AdaptiveTimeout
+from satreduce.adaptive import ParallelismController
+from satreduce.adaptive import system_load_average
+from satreduce.adaptive import system_memory_available
+from satreduce.reducer import SATShrinker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def controller(**kwargs):
+    clock = FakeClock()
+    kwargs.setdefault("load_average", lambda: None)
+    kwargs.setdefault("memory_available", lambda: None)
+    return ParallelismController(window=1, clock=clock, **kwargs), clock
+
+
+def run_window(c, clock, duration, saturate=True):
+    """Simulates one window of tests taking ``duration`` seconds in total,
+    optionally with every slot in use."""
+    n = c.limit if saturate else 1
+    c.window = n
+    for _ in range(n):
+        c.acquire()
+    clock.now += duration
+    for _ in range(n):
+        c.release()
+
+
+def test_raises_limit_while_throughput_holds():
+    c, clock = controller(min_parallelism=1, max_parallelism=4, initial=1)
+    for _ in range(5):
+        run_window(c, clock, 1.0)
+    assert c.limit == 4
+    assert [d["to"] for d in c.decisions] == [2, 3, 4]
+
+
+def test_does_not_raise_limit_when_slots_are_unused():
+    c, clock = controller(min_parallelism=1, max_parallelism=4, initial=2)
+    run_window(c, clock, 1.0, saturate=False)
+    assert c.limit == 2
+    assert c.decisions == []
+
+
+def test_turns_around_when_throughput_falls():
+    c, clock = controller(min_parallelism=1, max_parallelism=8, initial=2)
+    run_window(c, clock, 1.0)
+    assert c.limit == 3
+    run_window(c, clock, 2.0)
+    assert c.limit == 2
+    assert c.decisions[-1]["reason"] == "throughput fell"
+
+
+def test_backs_off_under_load():
+    c, clock = controller(
+        min_parallelism=2, max_parallelism=8, initial=4, load_average=lambda: 100.0
+    )
+    for _ in range(5):
+        run_window(c, clock, 1.0)
+    assert c.limit == 2
+    assert {d["reason"] for d in c.decisions} == {"load average"}
+    assert c.decisions[0]["load_average"] == 100.0
+
+
+def test_halves_limit_under_memory_pressure():
+    c, clock = controller(
+        min_parallelism=1, max_parallelism=8, initial=8, memory_available=lambda: 0.01
+    )
+    run_window(c, clock, 1.0)
+    assert c.limit == 4
+    assert c.decisions[0]["reason"] == "memory pressure"
+
+
+def test_rejects_inconsistent_limits():
+    with pytest.raises(ValueError):
+        ParallelismController(min_parallelism=4, max_parallelism=2)
+
+
+def test_clamps_initial_limit():
+    assert (
+        ParallelismController(min_parallelism=2, max_parallelism=3, initial=10).limit
+        == 3
+    )
+    assert (
+        ParallelismController(min_parallelism=2, max_parallelism=3, initial=1).limit
+        == 2
+    )
+
+
+def test_blocks_when_at_limit():
+    c = ParallelismController(min_parallelism=1, max_parallelism=1, window=100)
+    c.acquire()
+    acquired = threading.Event()
+
+    def second():
+        c.acquire()
+        acquired.set()
+        c.release()
+
+    t = threading.Thread(target=second)
+    t.start()
+    assert not acquired.wait(0.1)
+    c.release()
+    assert acquired.wait(5)
+    t.join()
+
+
+def test_system_probes_return_sensible_values(tmpdir):
+    load = system_load_average()
+    assert load is None or load >= 0
+    memory = system_memory_available()
+    assert memory is None or 0 <= memory <= 1
+
+    meminfo = tmpdir / "meminfo"
+    meminfo.write("MemTotal: 1000 kB\nMemAvailable: 250 kB\n")
+    assert system_memory_available(str(meminfo)) == 0.25
+    meminfo.write("MemTotal: 1000 kB\n")
+    assert system_memory_available(str(meminfo)) is None
+    assert system_memory_available(str(tmpdir / "missing")) is None
+
+
+def test_shrinker_respects_controller_and_reports_decisions():
+    c = ParallelismController(
+        min_parallelism=1,
+        max_parallelism=3,
+        initial=1,
+        window=5,
+        load_average=lambda: None,
+        memory_available=lambda: None,
+    )
+    lock = threading.Lock()
+    running = 0
+    most = 0
+
+    def test(clauses):
+        nonlocal running, most
+        with lock:
+            running += 1
+            most = max(most, running)
+        threading.Event().wait(0.001)
+        with lock:
+            running -= 1
+        return any(len(c) >= 3 for c in clauses)
+
+    shrinker = SATShrinker(
+        [[i, i + 1, i + 2] for i in range(1, 30)],
+        test,
+        parallelism=3,
+        parallelism_controller=c,
+    )
+    shrinker.reduce()
+    assert len(shrinker.current) == 1
+    assert most <= 3
+    report = shrinker.stats_report()
+    assert report["parallelism"]["min"] == 1
+    assert report["parallelism"]["max"] == 3
+    assert report["parallelism"]["decisions"] == c.decisions
+    assert "parallelism: finished at" in shrinker.format_stats()
+
+
+def test_timeout_is_cap_until_calibrated():
+    assert AdaptiveTimeout(cap=10.0).timeout_for(100) == 10.0
+    assert AdaptiveTimeout().timeout_for(100) is None
+
+
+def test_timeout_is_multiple_of_observed_runtime():
+    t = AdaptiveTimeout(multiplier=3.0, floor=0.0, cap=100.0)
+    for _ in range(99):
+        t.record(1.0, 100)
+    t.record(2.0, 100)
+    assert t.timeout_for(100) == 3.0
+    t.record(2.0, 100)
+    assert t.timeout_for(100) == 6.0
+
+
+def test_timeout_shrinks_with_the_formula():
+    t = AdaptiveTimeout(multiplier=2.0, floor=0.0)
+    t.record(1.0, 100)
+    t.record(4.0, 1000)
+    assert t.timeout_for(1000) == 8.0
+    assert t.timeout_for(500) == 5.0
+
+
+def test_timeout_never_shrinks_below_fixed_overhead():
+    t = AdaptiveTimeout(multiplier=5.0, floor=0.0)
+    # A test that spends half a second starting up, whatever the size.
+    for size in (10000, 8000, 5000):
+        t.record(0.5 + size * 1e-6, size)
+    assert t.timeout_for(500) >= 5.0 * 0.5
+
+
+def test_timeout_respects_floor_and_cap():
+    t = AdaptiveTimeout(multiplier=2.0, floor=0.5, cap=3.0)
+    t.record(0.01, 10)
+    assert t.timeout_for(10) == 0.5
+    t.record(10.0, 10)
+    assert t.timeout_for(10) == 3.0
+
+
+def test_timeout_forgets_old_runtimes():
+    t = AdaptiveTimeout(multiplier=1.0, floor=0.0, window=2)
+    t.record(10.0, 1)
+    t.record(1.0, 1)
+    t.record(1.0, 1)
+    assert t.timeout_for(1) == 1.0
+    assert t.as_dict()["samples"] == 2
+
+
+def test_timeout_rejects_cap_below_floor():
+    with pytest.raises(ValueError):
+        AdaptiveTimeout(floor=2.0, cap=1.0)
@@ -0,0 +1,102 @@
+import threading
+
+from satreduce.batch import BatchReducer
+from satreduce.batch import find_batch_files
+from satreduce.batch import format_batch_report
+from satreduce.reducer import SATShrinker
+
+
+def test_finds_cnf_files_recursively(tmpdir):
+    (tmpdir / "b.cnf").write("")
+    (tmpdir / "notes.txt").write("")
+    (tmpdir / "sub").mkdir()
+    (tmpdir / "sub" / "a.cnf").write("")
+    other = tmpdir / "other.dimacs"
+    other.write("")
+    files = find_batch_files([str(tmpdir), str(other), str(tmpdir / "b.cnf")])
+    assert files == [
+        str(tmpdir / "b.cnf"),
+        str(tmpdir / "sub" / "a.cnf"),
+        str(other),
+    ]
+
+
+def test_reduces_every_file_sharing_slots():
+    lock = threading.Lock()
+    running = 0
+    most = 0
+
+    def test(clauses):
+        nonlocal running, most
+        with lock:
+            running += 1
+            most = max(most, running)
+        threading.Event().wait(0.001)
+        with lock:
+            running -= 1
+        return any(len(c) >= 3 for c in clauses)
+
+    reported = []
+    batch = BatchReducer(3, max_active=4, progress=reported.append)
+    shrinkers = {}
+    for n in range(6):
+
+        def make_shrinker(n=n, **shared):
+            shrinker = SATShrinker(
+                [[i, i + 1, i + 2] for i in range(1, 10 + n)], test, **shared
+            )
+            shrinkers[n] = shrinker
+            return shrinker
+
+        batch.add(f"file{n}", make_shrinker)
+
+    results = batch.run()
+
+    assert [r.name for r in results] == [f"file{n}" for n in range(6)]
+    assert sorted(map(id, reported)) == sorted(map(id, results))
+    assert all(len(s.current) == 1 for s in shrinkers.values())
+    assert all(r.final_clauses == 1 and r.error is None for r in results)
+    assert most <= 3
+
+    report = batch.report()
+    assert report["files"] == 6
+    assert report["failed"] == 0
+    assert report["test_calls"] == sum(r.test_calls for r in results)
+    assert report["tests_per_second"] > 0
+    assert "6 files (0 failed)" in format_batch_report(report)
+
+
+def test_records_files_that_cannot_be_reduced():
+    batch = BatchReducer(2)
+    batch.add("good", lambda **shared: SATShrinker([[1, 2]], lambda c: True, **shared))
+    batch.add("bad", lambda **shared: SATShrinker([[1, 2]], lambda c: False, **shared))
+    good, bad = batch.run()
+    assert good.error is None
+    assert bad.error == "Initial argument does not satisfy test."
+    assert "bad: Initial argument" in str(bad)
+    assert batch.report()["failed"] == 1
+
+
+def test_runs_serially_with_one_slot():
+    running = 0
+    most = 0
+    lock = threading.Lock()
+
+    def test(clauses):
+        nonlocal running, most
+        with lock:
+            running += 1
+            most = max(most, running)
+        threading.Event().wait(0.001)
+        with lock:
+            running -= 1
+        return bool(clauses)
+
+    batch = BatchReducer(1, max_active=3)
+    for n in range(3):
+        batch.add(
+            str(n),
+            lambda **shared: SATShrinker([[1, 2], [2, 3], [3, 4]], test, **shared),
+        )
+    assert all(r.final_clauses == 1 for r in batch.run())
+    assert most == 1
@@ -0,0 +1,45 @@
+import pytest
+
+from benchmarks.run import compare
+from benchmarks.run import run_workload
+from benchmarks.startup import CORE_MODULES
+from benchmarks.startup import measure_import
+from benchmarks.workloads import is_satisfiable
+from benchmarks.workloads import pigeonhole
+from benchmarks.workloads import workloads
+
+
+@pytest.mark.parametrize(
+    "workload",
+    [w for w in workloads() if w.scale == "small"],
+    ids=lambda w: w.name,
+)
+def test_small_workloads_are_interesting(workload):
+    assert workload.test(workload.clauses)
+
+
+def test_pigeonhole_is_unsatisfiable():
+    assert not is_satisfiable(pigeonhole(3))
+    assert is_satisfiable(pigeonhole(3)[1:])
+
+
+def test_runs_a_workload():
+    workload = next(w for w in workloads() if w.name == "pigeonhole-3")
+
+    result = run_workload(workload)
+
+    assert result["test_calls"] > 0
+    assert result["final_clauses"] <= result["initial_clauses"]
+
+
+def test_compare_flags_regressions():
+    baseline = {"wall_time": 1.0, "test_calls": 100, "peak_memory": 1000}
+    result = {"wall_time": 2.0, "test_calls": 101, "peak_memory": 1000}
+
+    assert compare(result, baseline, 1.25) == [("wall_time", 2.0)]
+
+
+@pytest.mark.parametrize("module", CORE_MODULES)
+def test_core_modules_import_without_heavy_dependencies(module):
+    _, loaded = measure_import(module, repeat=1)
+    assert loaded == []
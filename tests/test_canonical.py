@@ -0,0 +1,104 @@
+import random
+
+from hypothesis import given
+from hypothesis import strategies as st
+
+from satreduce import reducer as reducer_module
+from satreduce.canonical import canonical_form
+from satreduce.canonical import invariant_hash
+from satreduce.canonical import isomorphism_key
+from satreduce.reducer import SATShrinker
+from tests.sat_strategies import sat_clauses
+
+
+def rename(clauses, seed):
+    rnd = random.Random(seed)
+    variables = sorted({abs(l) for c in clauses for l in c})
+    targets = list(range(1, len(variables) + 1))
+    rnd.shuffle(targets)
+    renaming = {v: t * rnd.choice((-1, 1)) for v, t in zip(variables, targets)}
+    clauses = [[renaming[abs(l)] * (1 if l > 0 else -1) for l in c] for c in clauses]
+    rnd.shuffle(clauses)
+    return clauses
+
+
+@given(sat_clauses(), st.integers())
+def test_renamings_have_the_same_key(clauses, seed):
+    assert isomorphism_key(clauses) == isomorphism_key(rename(clauses, seed))
+
+
+@given(sat_clauses(), st.integers())
+def test_renamings_have_the_same_invariant_hash(clauses, seed):
+    assert invariant_hash(clauses) == invariant_hash(rename(clauses, seed))
+
+
+def test_distinguishes_non_isomorphic_formulas():
+    assert isomorphism_key([[1, 2]]) != isomorphism_key([[1], [2]])
+    assert isomorphism_key([[1, 2], [-1, 2]]) != isomorphism_key([[1, 2], [1, 2, 3]])
+
+
+def test_canonical_form_identifies_polarity_flips():
+    assert canonical_form([[1, -2], [2, 3]]) == canonical_form([[-1, 2], [-2, -3]])
+
+
+def test_large_formulas_fall_back_to_a_hash():
+    clauses = [[i, i + 1] for i in range(1, 30)]
+
+    key, exact = isomorphism_key(clauses, max_exact_variables=10)
+
+    assert not exact
+    assert key.startswith("hash:")
+
+
+def test_symmetric_formulas_fall_back_when_search_is_too_expensive():
+    clauses = [[i] for i in range(1, 8)]
+
+    _, exact = isomorphism_key(clauses, budget=10)
+
+    assert not exact
+
+
+def test_isomorphic_candidates_share_a_cache_entry():
+    reducer = SATShrinker([[1, 2], [2, 3]], lambda c: True, canonical_labelling=True)
+    assert reducer.test_function([[3, 1], [1, 2]])
+    before = reducer.stats_report()["total"]["test_calls"]
+
+    assert reducer.test_function([[-4, 5], [5, 6]])
+
+    assert reducer.stats_report()["total"]["test_calls"] == before
+
+
+def test_exact_cache_hits_skip_canonical_labelling(monkeypatch):
+    reducer = SATShrinker([[1, 2], [2, 3]], lambda c: True, canonical_labelling=True)
+    assert reducer.test_function([[1, 3], [1, 2]])
+
+    calls = []
+
+    def counting_isomorphism_key(clauses):
+        calls.append(clauses)
+        return isomorphism_key(clauses)
+
+    monkeypatch.setattr(reducer_module, "isomorphism_key", counting_isomorphism_key)
+    # The same formula, but not in canonical order.
+    assert reducer.test_function([[3, 1], [2, 1]])
+    assert calls == []
+
+
+def test_inexact_keys_never_decide_a_candidate(monkeypatch):
+    tested = []
+
+    def test(clauses):
+        tested.append(clauses)
+        return len(clauses) != 3
+
+    reducer = SATShrinker([[1, 2], [2, 3]], test, canonical_labelling=True)
+    # Every formula gets the same inexact key, as if colour refinement
+    # couldn't tell any of them apart.
+    monkeypatch.setattr(
+        reducer_module, "isomorphism_key", lambda clauses: ("hash:same", False)
+    )
+    assert not reducer.test_function([[1, 2], [2, 3], [3, 4]])
+    assert reducer.test_function([[1], [2]])
+    assert reducer.test_function([[5], [6]])
+
+    assert len(tested) == 4
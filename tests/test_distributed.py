@@ -0,0 +1,438 @@
+import json
+import socket
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+from satreduce import __main__
+from satreduce.dimacscnf import clauses_to_dimacs
+from satreduce.dimacscnf import dimacs_to_clauses
+from satreduce.distributed import AuthenticationFailed
+from satreduce.distributed import Connection
+from satreduce.distributed import Coordinator
+from satreduce.distributed import NoWorkers
+from satreduce.distributed import connect
+from satreduce.distributed import digest
+from satreduce.distributed import encode_config
+from satreduce.distributed import parse_address
+from satreduce.distributed import run_worker
+from satreduce.reducer import SATShrinker
+from satreduce.reducer import TimedOut
+
+
+KEY = b"correct horse battery staple"
+
+
+def start_worker(coordinator, test, key=KEY):
+    thread = threading.Thread(
+        target=run_worker,
+        args=(coordinator.address, key, lambda config: test),
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def test_reduces_using_remote_workers():
+    def test(clauses):
+        return any(len(c) > 2 for c in clauses)
+
+    with Coordinator("127.0.0.1", 0, KEY) as coordinator:
+        workers = [start_worker(coordinator, test) for _ in range(3)]
+        shrinker = SATShrinker(
+            [[1, 2, 3, 4], [-1, 2], [3, -4], [1, 2, 5]],
+            coordinator.test_function,
+            parallelism=3,
+        )
+        shrinker.reduce()
+        assert list(map(list, shrinker.current)) == [[1, 2, 3]]
+    for w in workers:
+        w.join(timeout=5)
+        assert not w.is_alive()
+
+
+def test_workers_receive_the_coordinators_configuration():
+    config = {"command": ["true"], "timeout": 1.0}
+    seen = []
+
+    def make_test(c):
+        seen.append(c)
+        return lambda clauses: True
+
+    with Coordinator("127.0.0.1", 0, KEY, config=config) as coordinator:
+        thread = threading.Thread(
+            target=run_worker, args=(coordinator.address, KEY, make_test), daemon=True
+        )
+        thread.start()
+        assert coordinator.test_function([[1]])
+    assert seen == [config]
+
+
+def test_relays_timeouts_from_workers():
+    def test(clauses):
+        raise TimedOut()
+
+    with Coordinator("127.0.0.1", 0, KEY) as coordinator:
+        start_worker(coordinator, test)
+        with pytest.raises(TimedOut):
+            coordinator.test_function([[1]])
+
+
+def test_rejects_workers_with_the_wrong_key():
+    with Coordinator("127.0.0.1", 0, KEY) as coordinator:
+        with pytest.raises(AuthenticationFailed):
+            connect(coordinator.address, b"wrong key")
+        assert coordinator.n_workers == 0
+
+
+def fake_coordinator(welcome):
+    """Listens for a single worker and answers its authentication with
+    whatever ``welcome`` returns when given the two nonces."""
+    server = socket.create_server(("127.0.0.1", 0))
+
+    def serve():
+        sock, _ = server.accept()
+        connection = Connection(sock)
+        connection.send({"type": "challenge", "nonce": "c"})
+        reply = connection.receive()
+        connection.send(welcome("c", reply["nonce"]))
+        # Wait for the worker to hang up.
+        with pytest.raises(ConnectionError):
+            connection.receive()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server
+
+
+def test_rejects_coordinators_with_the_wrong_key():
+    config = {"command": ["rm", "-rf", "/"]}
+    server = fake_coordinator(
+        lambda nonce, worker_nonce: {
+            "type": "welcome",
+            "config": config,
+            "digest": digest(
+                b"wrong key", "coordinator", nonce, worker_nonce, encode_config(config)
+            ),
+        }
+    )
+    with server:
+        with pytest.raises(AuthenticationFailed):
+            connect(server.getsockname(), KEY)
+
+
+def test_rejects_coordinators_that_replay_the_workers_digest():
+    # A coordinator without the key can get a worker to sign any nonce by
+    # sending it as a challenge, so the two sides' digests must differ.
+    def welcome(nonce, worker_nonce):
+        return {
+            "type": "welcome",
+            "config": {},
+            "digest": digest(KEY, "worker", nonce, worker_nonce),
+        }
+
+    with fake_coordinator(welcome) as server:
+        with pytest.raises(AuthenticationFailed):
+            connect(server.getsockname(), KEY)
+
+
+def test_rejects_tampered_configuration():
+    def welcome(nonce, worker_nonce):
+        return {
+            "type": "welcome",
+            "config": {"command": ["sh", "-c", "evil"]},
+            "digest": digest(
+                KEY, "coordinator", nonce, worker_nonce, encode_config({})
+            ),
+        }
+
+    with fake_coordinator(welcome) as server:
+        with pytest.raises(AuthenticationFailed):
+            connect(server.getsockname(), KEY)
+
+
+def fake_worker(coordinator):
+    """Authenticates with the coordinator and waits for a job, without ever
+    answering it."""
+    connection = Connection(socket.create_connection(coordinator.address))
+    challenge = connection.receive()
+    connection.send(
+        {
+            "type": "auth",
+            "nonce": "n",
+            "digest": digest(KEY, "worker", challenge["nonce"], "n"),
+        }
+    )
+    assert connection.receive()["type"] == "welcome"
+    job = connection.receive()
+    assert job["type"] == "job"
+    return connection
+
+
+def test_requeues_jobs_from_disconnected_workers():
+    with Coordinator("127.0.0.1", 0, KEY) as coordinator:
+        result = []
+        caller = threading.Thread(
+            target=lambda: result.append(coordinator.test_function([[1, 2]]))
+        )
+        caller.start()
+        fake_worker(coordinator).close()
+        start_worker(coordinator, lambda clauses: True)
+        caller.join(timeout=5)
+        assert result == [True]
+        assert coordinator.jobs_requeued == 1
+        assert coordinator.workers_lost == 1
+
+
+def test_requeues_jobs_from_workers_that_stop_sending_heartbeats():
+    with Coordinator("127.0.0.1", 0, KEY, heartbeat_timeout=0.2) as coordinator:
+        result = []
+        caller = threading.Thread(
+            target=lambda: result.append(coordinator.test_function([[1, 2]]))
+        )
+        caller.start()
+        silent = fake_worker(coordinator)
+        start_worker(coordinator, lambda clauses: False)
+        caller.join(timeout=5)
+        silent.close()
+        assert result == [False]
+        assert coordinator.jobs_requeued == 1
+
+
+def test_slow_tests_are_kept_alive_by_heartbeats():
+    def slow(clauses):
+        threading.Event().wait(0.5)
+        return True
+
+    with Coordinator("127.0.0.1", 0, KEY, heartbeat_timeout=0.3) as coordinator:
+        thread = threading.Thread(
+            target=run_worker,
+            args=(coordinator.address, KEY, lambda config: slow),
+            kwargs={"heartbeat_interval": 0.05},
+            daemon=True,
+        )
+        thread.start()
+        assert coordinator.test_function([[1]])
+        assert coordinator.jobs_requeued == 0
+
+
+def test_closing_fails_outstanding_jobs():
+    coordinator = Coordinator("127.0.0.1", 0, KEY)
+    result = []
+    caller = threading.Thread(
+        target=lambda: result.append(coordinator.test_function([[1]]))
+    )
+    caller.start()
+    coordinator.close()
+    caller.join(timeout=5)
+    assert result == [False]
+    assert not coordinator.test_function([[1]])
+
+
+def test_closing_fails_jobs_from_workers_lost_while_closing():
+    for _ in range(20):
+        coordinator = Coordinator("127.0.0.1", 0, KEY)
+        result = []
+        caller = threading.Thread(
+            target=lambda: result.append(coordinator.test_function([[1]])),
+            daemon=True,
+        )
+        caller.start()
+        worker = fake_worker(coordinator)
+        dropper = threading.Thread(target=worker.close)
+        dropper.start()
+        coordinator.close()
+        dropper.join()
+        caller.join(timeout=5)
+        assert result == [False]
+
+
+def test_fails_tests_when_no_workers_connect():
+    with Coordinator("127.0.0.1", 0, KEY, worker_timeout=0.2) as coordinator:
+        with pytest.raises(NoWorkers):
+            coordinator.test_function([[1]])
+
+
+def test_parse_address():
+    assert parse_address("example.com:1234") == ("example.com", 1234)
+    assert parse_address(":1234") == ("127.0.0.1", 1234)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_command_line_coordinator_and_worker(tmpdir):
+    key_file = str(tmpdir / "key")
+    with open(key_file, "w") as o:
+        o.write("sekrit\n")
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2, 3], [-1, 2]]))
+    address = f"127.0.0.1:{free_port()}"
+
+    results = {}
+
+    def run_coordinator():
+        results["main"] = CliRunner().invoke(
+            __main__.main,
+            [
+                "true",
+                target,
+                "--parallelism=2",
+                f"--listen={address}",
+                f"--auth-key-file={key_file}",
+            ],
+        )
+
+    coordinator = threading.Thread(target=run_coordinator)
+    coordinator.start()
+
+    def run_workers():
+        while True:
+            result = CliRunner().invoke(
+                __main__.worker,
+                [
+                    address,
+                    f"--auth-key-file={key_file}",
+                    "--parallelism=2",
+                    "--test=true",
+                ],
+            )
+            # The coordinator may not be listening yet.
+            if result.exit_code == 0 or not coordinator.is_alive():
+                results["worker"] = result
+                return
+
+    workers = threading.Thread(target=run_workers, daemon=True)
+    workers.start()
+    coordinator.join(timeout=30)
+    workers.join(timeout=5)
+
+    assert results["main"].exit_code == 0, results["main"].output
+    assert results["worker"].exit_code == 0, results["worker"].output
+    with open(target) as i:
+        assert dimacs_to_clauses(i.read()) == [[1]]
+
+
+def test_worker_reports_authentication_failures(tmpdir):
+    key_file = str(tmpdir / "key")
+    with open(key_file, "w") as o:
+        o.write("wrong")
+    with Coordinator("127.0.0.1", 0, KEY) as coordinator:
+        host, port = coordinator.address
+        result = CliRunner().invoke(
+            __main__.worker,
+            [
+                f"{host}:{port}",
+                f"--auth-key-file={key_file}",
+                "--parallelism=1",
+                "--test=true",
+            ],
+        )
+    assert result.exit_code != 0
+    assert "authenticate" in result.output
+
+
+def test_worker_requires_a_local_test(tmpdir):
+    key_file = str(tmpdir / "key")
+    with open(key_file, "w") as o:
+        o.write("key")
+    result = CliRunner().invoke(
+        __main__.worker, [f"127.0.0.1:{free_port()}", f"--auth-key-file={key_file}"]
+    )
+    assert result.exit_code != 0
+    assert "--test" in result.output
+
+
+def test_worker_warns_when_its_test_differs(tmpdir):
+    key_file = str(tmpdir / "key")
+    with open(key_file, "w") as o:
+        o.write("sekrit")
+    config = {
+        "command": ["/somewhere/else/test.sh"],
+        "basename": "../../escape.cnf",
+        "input_type": "arg",
+        "timeout": None,
+    }
+    with Coordinator("127.0.0.1", 0, b"sekrit", config=config) as coordinator:
+        host, port = coordinator.address
+        result = []
+        caller = threading.Thread(
+            target=lambda: result.append(coordinator.test_function([[1]]))
+        )
+        caller.start()
+
+        def run_worker_command():
+            result.append(
+                CliRunner().invoke(
+                    __main__.worker,
+                    [
+                        f"{host}:{port}",
+                        f"--auth-key-file={key_file}",
+                        "--parallelism=1",
+                        "--test=true",
+                    ],
+                )
+            )
+
+        worker = threading.Thread(target=run_worker_command, daemon=True)
+        worker.start()
+        caller.join(timeout=10)
+        assert result == [True]
+    worker.join(timeout=10)
+    assert "/somewhere/else/test.sh" in result[1].output
+
+
+def test_worker_reports_connection_failures(tmpdir):
+    key_file = str(tmpdir / "key")
+    with open(key_file, "w") as o:
+        o.write("key")
+    result = CliRunner().invoke(
+        __main__.worker,
+        [f"127.0.0.1:{free_port()}", f"--auth-key-file={key_file}", "--test=true"],
+    )
+    assert result.exit_code != 0
+    assert "Could not connect" in result.output
+
+
+def test_listen_requires_a_key(tmpdir):
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1]]))
+    result = CliRunner().invoke(__main__.main, ["true", target, "--listen=:0"])
+    assert result.exit_code != 0
+    assert "--auth-key-file" in result.output
+
+
+def test_reports_when_no_workers_connect(tmpdir):
+    key_file = str(tmpdir / "key")
+    with open(key_file, "w") as o:
+        o.write("sekrit\n")
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1]]))
+    result = CliRunner().invoke(
+        __main__.main,
+        [
+            "true",
+            target,
+            f"--listen=127.0.0.1:{free_port()}",
+            f"--auth-key-file={key_file}",
+            "--worker-timeout=0.2",
+        ],
+    )
+    assert result.exit_code == 1
+    assert "No workers" in result.output
+
+
+def test_messages_are_json_lines():
+    a, b = socket.socketpair()
+    left, right = Connection(a), Connection(b)
+    left.send({"type": "heartbeat", "n": [1, 2]})
+    assert right.receive() == json.loads('{"type": "heartbeat", "n": [1, 2]}')
+    left.close()
+    with pytest.raises(ConnectionError):
+        right.receive()
@@ -0,0 +1,168 @@
+import errno
+import os
+import signal
+import sys
+import threading
+
+import pytest
+
+from satreduce import limits as limits_module
+from satreduce import runner
+from satreduce.limits import CgroupsUnavailable
+from satreduce.limits import ResourceLimits
+from satreduce.limits import current_cgroup
+from satreduce.limits import read_cgroup_counter
+from satreduce.reducer import ResourceLimitExceeded
+
+
+def python_command(source):
+    return [sys.executable, "-c", source]
+
+
+def test_finds_current_cgroup(tmpdir):
+    (tmpdir / "user.slice").mkdir()
+    (tmpdir / "user.slice" / "cgroup.controllers").write("memory\n")
+    proc = tmpdir / "cgroup"
+    proc.write("0::/user.slice\n")
+    assert current_cgroup(str(tmpdir), str(proc)) == str(tmpdir / "user.slice")
+    proc.write("1:name=systemd:/user.slice\n")
+    assert current_cgroup(str(tmpdir), str(proc)) is None
+    assert current_cgroup(str(tmpdir), str(tmpdir / "missing")) is None
+
+
+def test_reads_cgroup_counters(tmpdir):
+    (tmpdir / "memory.events").write("low 0\noom 2\noom_kill 1\n")
+    assert read_cgroup_counter(str(tmpdir), "memory.events", "oom_kill") == 1
+    assert read_cgroup_counter(str(tmpdir), "cpu.stat", "usage_usec") == 0
+
+
+def test_acquires_slots_together():
+    limits = ResourceLimits(3)
+    first = limits.acquire(2)
+    acquired = threading.Event()
+
+    def second():
+        slots = limits.acquire(2)
+        acquired.set()
+        limits.release(slots)
+
+    t = threading.Thread(target=second)
+    t.start()
+    assert not acquired.wait(0.1)
+    limits.release(first)
+    assert acquired.wait(5)
+    t.join()
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_getaffinity"), reason="Linux only")
+def test_pins_tests_to_one_cpu():
+    limits = ResourceLimits(2, pin_cpus=True)
+    command = runner.TestCommand(
+        python_command("import os, sys; sys.exit(len(os.sched_getaffinity(0)) != 1)"),
+        basename="test.cnf",
+        limits=limits,
+    )
+    assert command([[1]])
+
+
+def test_reports_cpu_time_limit():
+    command = runner.TestCommand(
+        python_command("while True: pass"),
+        basename="test.cnf",
+        input_type="basename",
+        limits=ResourceLimits(1, cpu_time=0.5),
+    )
+    command.first_call = False
+    with pytest.raises(ResourceLimitExceeded) as e:
+        command([[1]])
+    assert e.value.resource == "cpu"
+
+
+def test_only_sigxcpu_counts_as_going_over_the_cpu_time_limit():
+    limits = ResourceLimits(1, cpu_time=1)
+    (slot,) = limits.acquire()
+    for status in (-signal.SIGKILL, 128 + signal.SIGKILL, 1):
+        limits.check(slot, status, None)
+    for status in (-signal.SIGXCPU, 128 + signal.SIGXCPU):
+        with pytest.raises(ResourceLimitExceeded):
+            limits.check(slot, status, None)
+
+
+def test_initial_limit_violation_is_an_error():
+    command = runner.TestCommand(
+        python_command("while True: pass"),
+        basename="test.cnf",
+        input_type="basename",
+        limits=ResourceLimits(1, cpu_time=0.5),
+    )
+    with pytest.raises(ValueError):
+        command([[1]])
+
+
+def test_memory_rlimit_makes_allocations_fail():
+    limits = ResourceLimits(1, memory=256 * 1024 * 1024)
+    command = runner.TestCommand(
+        python_command("bytearray(1024 * 1024 * 1024)"),
+        basename="test.cnf",
+        input_type="basename",
+        limits=limits,
+    )
+    command.first_call = False
+    assert not command([[1]])
+    assert runner.TestCommand(
+        python_command("bytearray(1024 * 1024 * 1024)"),
+        basename="test.cnf",
+        input_type="basename",
+    )([[1]])
+
+
+def test_reports_memory_limit_from_cgroup(tmpdir):
+    limits = ResourceLimits(
+        2, memory=1024 * 1024, cgroups=True, cgroup_parent=str(tmpdir)
+    )
+    group = tmpdir / f"satreduce-{os.getpid()}"
+    assert (group / "slot-1" / "memory.max").read() == str(1024 * 1024)
+    (slot,) = limits.acquire()
+    before = limits.before(slot)
+    limits.check(slot, 0, before)
+    with open(os.path.join(slot.cgroup, "memory.events"), "w") as o:
+        o.write("oom_kill 1\n")
+    with pytest.raises(ResourceLimitExceeded) as e:
+        limits.check(slot, 0, before)
+    assert e.value.resource == "memory"
+
+
+def test_moves_out_of_its_own_cgroup_before_creating_slots(tmpdir, monkeypatch):
+    parent = str(tmpdir)
+    pid = os.getpid()
+    procs = {parent: {pid}}
+
+    def write_cgroup_file(group, filename, value):
+        if filename == "cgroup.procs":
+            for members in procs.values():
+                members.discard(int(value))
+            procs.setdefault(group, set()).add(int(value))
+        elif filename == "cgroup.subtree_control" and value[0] == "+":
+            # cgroup v2 won't let a group with processes in it give its
+            # children controllers.
+            if procs.get(group):
+                raise OSError(errno.EBUSY, "Device or resource busy")
+
+    monkeypatch.setattr(limits_module, "current_cgroup", lambda: parent)
+    monkeypatch.setattr(limits_module, "write_cgroup_file", write_cgroup_file)
+
+    limits = ResourceLimits(2, cgroups=True)
+    group = os.path.join(parent, f"satreduce-{pid}")
+    assert procs[os.path.join(group, "main")] == {pid}
+    assert sorted(os.listdir(group)) == ["main", "slot-0", "slot-1"]
+    (slot,) = limits.acquire()
+    assert os.path.dirname(slot.cgroup) == group
+
+    limits.close()
+    assert procs[parent] == {pid}
+    assert not os.path.exists(group)
+
+
+def test_reports_unavailable_cgroups(tmpdir):
+    with pytest.raises(CgroupsUnavailable):
+        ResourceLimits(1, cgroups=True, cgroup_parent=str(tmpdir / "missing"))
@@ -1,4 +1,5 @@
 """Test cases for the __main__ module."""
+import json
 import os
 import signal
 import subprocess
@@ -10,6 +11,7 @@ from click.testing import CliRunner
 from satreduce import __main__
 from satreduce.dimacscnf import clauses_to_dimacs
 from satreduce.dimacscnf import dimacs_to_clauses
+from satreduce.runner import interrupt_wait_and_kill
 
 
 @pytest.fixture
@@ -208,7 +210,7 @@ def test_sigkills_stubborn_processes(tmpdir):
     except subprocess.TimeoutExpired:
         pass
 
-    __main__.interrupt_wait_and_kill(sp)
+    interrupt_wait_and_kill(sp)
     assert sp.returncode == -9
 
 
@@ -236,3 +238,364 @@ def test_resolves_command_to_path(tmpdir, monkeypatch) -> None:
 
     validated = __main__.validate_command(..., ..., "test.sh")
     assert validated[0] == target
+
+
+def test_writes_stats_file(runner: CliRunner, tmpdir) -> None:
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2, 3], [2, 3]]))
+    stats = str(tmpdir / "stats.json")
+    result = runner.invoke(__main__.main, ["true", target, "--stats", stats])
+    assert result.exit_code == 0
+
+    with open(stats) as i:
+        report = json.load(i)
+
+    assert report["total"]["test_calls"] > 0
+    assert "delete_clauses" in report["passes"]
+    assert "total" in result.output
+
+
+def test_can_match_on_test_output(runner: CliRunner, tmpdir) -> None:
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2, 3], [-1, 2], [2, 3]]))
+    result = runner.invoke(
+        __main__.main,
+        [
+            "grep -- -1",
+            target,
+            "--input-type=arg",
+            "--stdout-match=^-1",
+            "--exit-codes=0,1",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    with open(target) as i:
+        shrunk = dimacs_to_clauses(i.read())
+    assert shrunk == [[-1]]
+
+
+def test_rejects_invalid_output_patterns(runner: CliRunner, tmpdir) -> None:
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1]]))
+    result = runner.invoke(__main__.main, ["true", target, "--stdout-match=("])
+    assert result.exit_code != 0
+    assert "regular expression" in result.output
+    result = runner.invoke(__main__.main, ["true", target, "--exit-codes=zero"])
+    assert result.exit_code != 0
+    assert "exit codes" in result.output
+
+
+def test_reports_adaptive_timeouts(runner: CliRunner, tmpdir) -> None:
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2, 3], [2, 3]]))
+    stats = str(tmpdir / "stats.json")
+    result = runner.invoke(
+        __main__.main,
+        ["true", target, "--stats", stats, "--adaptive-timeout", "--timeout=5"],
+    )
+    assert result.exit_code == 0, result.output
+
+    with open(stats) as i:
+        report = json.load(i)
+
+    assert report["timeout"]["cap"] == 5
+    assert report["timeout"]["samples"] > 0
+    assert report["total"]["timeouts"] == 0
+    assert "timeouts" in result.output
+
+
+def test_reports_adaptive_parallelism(runner: CliRunner, tmpdir) -> None:
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2, 3], [2, 3]]))
+    stats = str(tmpdir / "stats.json")
+    result = runner.invoke(
+        __main__.main,
+        [
+            "true",
+            target,
+            "--stats",
+            stats,
+            "--adaptive-parallelism",
+            "--parallelism=2",
+            "--min-parallelism=2",
+            "--max-parallelism=4",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+
+    with open(stats) as i:
+        report = json.load(i)
+
+    assert report["parallelism"]["min"] == 2
+    assert report["parallelism"]["max"] == 4
+    assert 2 <= report["parallelism"]["limit"] <= 4
+    assert "parallelism: finished at" in result.output
+
+
+def test_rejects_min_parallelism_above_max(runner: CliRunner, tmpdir) -> None:
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2, 3]]))
+    result = runner.invoke(
+        __main__.main,
+        [
+            "true",
+            target,
+            "--adaptive-parallelism",
+            "--min-parallelism=4",
+            "--max-parallelism=2",
+        ],
+    )
+    assert result.exit_code != 0
+    assert "--min-parallelism" in result.output
+
+
+def test_stops_at_max_tests(runner: CliRunner, tmpdir) -> None:
+    target = str(tmpdir / "test.cnf")
+    clauses = [[-i, i + 1] for i in range(1, 20)]
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs(clauses))
+    result = runner.invoke(
+        __main__.main, ["true", target, "--max-tests=3", "--parallelism=1"]
+    )
+    assert result.exit_code == 0
+    assert "budget" in result.output
+
+    with open(target) as i:
+        shrunk = dimacs_to_clauses(i.read())
+
+    assert 1 <= len(shrunk) < len(clauses)
+
+
+def test_kills_running_tests_at_deadline(runner: CliRunner, tmpdir) -> None:
+    contents = clauses_to_dimacs([[1, 2, 3], [1, 2], [1, 3]])
+    script = str(tmpdir / "stupid.py")
+    with open(script, "w") as o:
+        o.write(STUPID_TIMEOUT_SCRIPT)
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(contents)
+    start = time.time()
+    result = runner.invoke(
+        __main__.main,
+        [
+            f"python {script}",
+            target,
+            "--timeout=0",
+            "--deadline=1",
+            "--input-type=stdin",
+        ],
+    )
+    assert time.time() - start < 5
+    assert result.exit_code == 0
+    assert "budget" in result.output
+
+
+def test_can_record_and_replay_trace(runner: CliRunner, tmpdir) -> None:
+    contents = clauses_to_dimacs([[1, 2, 3], [1, 2], [1, 3]])
+    target = str(tmpdir / "test.cnf")
+    trace = str(tmpdir / "trace.txt")
+    with open(target, "w") as o:
+        o.write(contents)
+    result = runner.invoke(
+        __main__.main, ["true", target, "--parallelism=1", "--record-trace", trace]
+    )
+    assert result.exit_code == 0
+    with open(target) as i:
+        recorded = i.read()
+
+    with open(target, "w") as o:
+        o.write(contents)
+    result = runner.invoke(
+        __main__.main,
+        [
+            "false",
+            target,
+            "--parallelism=1",
+            "--replay-trace",
+            trace,
+            "--replay-unseen",
+            "error",
+        ],
+    )
+    assert result.exit_code == 0
+    with open(target) as i:
+        assert i.read() == recorded
+
+
+def test_reports_candidates_missing_from_replayed_trace(
+    runner: CliRunner, tmpdir
+) -> None:
+    target = str(tmpdir / "test.cnf")
+    trace = str(tmpdir / "trace.txt")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2, 3], [1, 2], [1, 3]]))
+    result = runner.invoke(
+        __main__.main,
+        ["true", target, "--parallelism=1", "--max-tests=1", "--record-trace", trace],
+    )
+    assert result.exit_code == 0
+
+    result = runner.invoke(
+        __main__.main,
+        [
+            "true",
+            target,
+            "--parallelism=1",
+            "--replay-trace",
+            trace,
+            "--replay-unseen",
+            "error",
+        ],
+    )
+    assert result.exit_code == 1
+    assert "Traceback" not in result.output
+    assert "is not in the replayed trace" in result.output
+    assert trace in result.output
+
+
+def test_reduces_a_batch_of_files(runner: CliRunner, tmpdir) -> None:
+    (tmpdir / "batch").mkdir()
+    targets = []
+    for n in range(3):
+        target = str(tmpdir / "batch" / f"{n}.cnf")
+        with open(target, "w") as o:
+            o.write(clauses_to_dimacs([[1, 2, 3], [-1, 2 + n]]))
+        targets.append(target)
+    stats = str(tmpdir / "stats.json")
+    result = runner.invoke(
+        __main__.main,
+        ["--batch", str(tmpdir / "batch"), "--parallelism=2", "--stats", stats, "true"],
+    )
+    assert result.exit_code == 0, result.output
+    for target in targets:
+        with open(target) as i:
+            assert dimacs_to_clauses(i.read()) == [[1]]
+        assert os.path.exists(target + ".bak")
+    assert "[3/3]" in result.output
+    assert "3 files (0 failed)" in result.output
+    with open(stats) as i:
+        assert json.load(i)["files"] == 3
+
+
+def test_batch_reports_failures(runner: CliRunner, tmpdir) -> None:
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2, 3]]))
+    result = runner.invoke(__main__.main, ["--batch", target, "false"])
+    assert result.exit_code != 0
+    assert "1 of 1 files could not be reduced" in result.output
+
+
+def test_batch_excludes_single_file_options(runner: CliRunner, tmpdir) -> None:
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2, 3]]))
+    result = runner.invoke(__main__.main, ["--batch", target, "true", target])
+    assert result.exit_code != 0
+    assert "FILENAME can't be used with --batch" in result.output
+    result = runner.invoke(__main__.main, ["--batch", target, "--listen", ":0", "true"])
+    assert result.exit_code != 0
+    result = runner.invoke(__main__.main, ["true"])
+    assert result.exit_code != 0
+    assert "Missing argument" in result.output
+
+
+def test_can_use_python_test(runner: CliRunner, tmpdir, monkeypatch) -> None:
+    monkeypatch.chdir(tmpdir)
+    (tmpdir / "my_satreduce_test.py").write(
+        "def interesting(clauses):\n    return any(len(c) >= 3 for c in clauses)\n"
+    )
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2, 3], [-1, 2]]))
+    for mode in ["--python-test-threads", "--python-test-processes"]:
+        result = runner.invoke(
+            __main__.main,
+            ["--python-test", "my_satreduce_test:interesting", mode, target],
+        )
+        assert result.exit_code == 0, result.output
+        with open(target) as i:
+            assert dimacs_to_clauses(i.read()) == [[1, 2, 3]]
+
+
+def test_rejects_bad_python_tests(runner: CliRunner, tmpdir) -> None:
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2, 3]]))
+    result = runner.invoke(__main__.main, ["--python-test", "no_such_module:f", target])
+    assert result.exit_code != 0
+    assert "Could not load" in result.output
+    result = runner.invoke(
+        __main__.main, ["--python-test", "os:getcwd", "true", target]
+    )
+    assert result.exit_code != 0
+    assert "TEST can't be used with --python-test" in result.output
+
+
+def test_can_reduce_solver_disagreements(runner: CliRunner, tmpdir) -> None:
+    sat = tmpdir / "sat.sh"
+    sat.write("#!/bin/sh\nexit 10\n")
+    sat.chmod(0o755)
+    # Wrongly claims anything with a clause of three literals is unsatisfiable.
+    buggy = tmpdir / "buggy.sh"
+    buggy.write(
+        "#!/bin/sh\n"
+        "grep -qE '^-?[0-9]+ -?[0-9]+ -?[0-9]+ 0' \"$1\" && exit 20\n"
+        "exit 10\n"
+    )
+    buggy.chmod(0o755)
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2], [1, 2, 3], [-1, 2, 3, 4], [-4]]))
+    result = runner.invoke(
+        __main__.main, ["--differential", str(sat), str(buggy), target]
+    )
+    assert result.exit_code == 0, result.output
+    with open(target) as i:
+        assert dimacs_to_clauses(i.read()) == [[1, 2, 3]]
+
+
+def test_reports_resource_limits(runner: CliRunner, tmpdir) -> None:
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2, 3]]))
+    stats = str(tmpdir / "stats.json")
+    result = runner.invoke(
+        __main__.main,
+        ["true", target, "--cpu-time-limit=10", "--memory-limit=512", "--stats", stats],
+    )
+    assert result.exit_code == 0, result.output
+    with open(stats) as i:
+        report = json.load(i)
+    assert report["limits"]["cpu_time"] == 10
+    assert report["limits"]["memory"] == 512 * 1024 * 1024
+    assert report["total"]["limits_exceeded"] == {}
+    assert "limits" in result.output
+
+    result = runner.invoke(
+        __main__.main,
+        ["--python-test", "os:getcwd", target, "--cpu-time-limit=10"],
+    )
+    assert result.exit_code != 0
+    assert "can't be used with --python-test" in result.output
+
+
+@pytest.mark.parametrize("name", ["profile.folded", "profile.prof"])
+def test_writes_profile(runner: CliRunner, tmpdir, name) -> None:
+    target = str(tmpdir / "test.cnf")
+    with open(target, "w") as o:
+        o.write(clauses_to_dimacs([[1, 2, 3], [2, 3], [-1, 4]]))
+    profile = str(tmpdir / name)
+    result = runner.invoke(
+        __main__.main,
+        ["true", target, "--profile", profile, "--profile-interval=0.001"],
+    )
+    assert result.exit_code == 0, result.output
+    assert "profile:" in result.output
+    assert os.path.exists(profile)
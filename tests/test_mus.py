@@ -0,0 +1,72 @@
+import pytest
+from hypothesis import given
+from hypothesis import settings
+
+import satreduce.minisat as ms
+from satreduce.mus import find_mus
+from satreduce.mus import remove_pure_clauses
+from satreduce.reducer import SATShrinker
+from tests.sat_strategies import sat_clauses
+from tests.sat_strategies import unsatisfiable_clauses
+
+
+def is_mus(subset, clauses):
+    normalised = {tuple(sorted(set(c))) for c in clauses}
+    if not all(tuple(sorted(set(c))) in normalised for c in subset):
+        return False
+    if ms.is_satisfiable(subset):
+        return False
+    return all(
+        ms.is_satisfiable(subset[:i] + subset[i + 1 :]) for i in range(len(subset))
+    )
+
+
+@pytest.mark.parametrize("algorithm", ["deletion", "quickxplain"])
+@settings(deadline=None, max_examples=50)
+@given(clauses=unsatisfiable_clauses())
+def test_finds_minimal_unsatisfiable_subset(algorithm, clauses):
+    assert is_mus(find_mus(clauses, algorithm), clauses)
+
+
+@pytest.mark.parametrize("algorithm", ["deletion", "quickxplain"])
+def test_empty_clause_is_its_own_mus(algorithm):
+    assert find_mus([[1, 2], [], [-1]], algorithm) == [()]
+
+
+@pytest.mark.parametrize("algorithm", ["deletion", "quickxplain"])
+@settings(deadline=None, max_examples=20)
+@given(clauses=sat_clauses())
+def test_rejects_satisfiable_formulas(algorithm, clauses):
+    if ms.is_satisfiable(clauses):
+        with pytest.raises(ValueError):
+            find_mus(clauses, algorithm)
+
+
+def test_removes_clauses_with_pure_literals():
+    # 3 is pure, and once [1, 3] is gone so is 1.
+    assert remove_pure_clauses([(1, 3), (-1, 2), (-2,), (2,)]) == [(-2,), (2,)]
+
+
+@pytest.mark.parametrize("algorithm", ["deletion", "quickxplain"])
+def test_user_test_only_confirms_the_mus(algorithm):
+    clauses = [[1, 2], [-1, 2], [1, -2], [-1, -2]] + [
+        [i, i + 1, i + 2] for i in range(3, 40)
+    ]
+    calls = 0
+
+    def test(clauses):
+        nonlocal calls
+        calls += 1
+        return not ms.is_satisfiable(clauses)
+
+    shrinker = SATShrinker(
+        clauses, test, test_property="unsat", mus_algorithm=algorithm
+    )
+    shrinker.extract_mus()
+    assert calls == 2
+    assert len(shrinker.current) == 4
+
+
+def test_rejects_unknown_properties():
+    with pytest.raises(ValueError):
+        SATShrinker([[1]], lambda clauses: True, test_property="sat")
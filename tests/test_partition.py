@@ -0,0 +1,29 @@
+from hypothesis import given
+from hypothesis import strategies as st
+
+from satreduce.partition import partition_clauses
+from tests.sat_strategies import sat_clauses
+
+
+@given(sat_clauses(), st.integers(1, 10))
+def test_partition_covers_every_clause_once(clauses, n):
+    clauses = list(map(tuple, clauses))
+
+    regions = partition_clauses(clauses, n)
+
+    assert sorted(c for r in regions for c in r) == sorted(clauses)
+    target = -(-len(clauses) // n)
+    assert all(0 < len(r) <= target for r in regions)
+
+
+def test_keeps_connected_clauses_together():
+    chain_a = [(i, i + 1) for i in range(1, 10)]
+    chain_b = [(i, i + 1) for i in range(20, 29)]
+
+    regions = partition_clauses(chain_a + chain_b, 2)
+
+    assert sorted(map(sorted, regions)) == [sorted(chain_a), sorted(chain_b)]
+
+
+def test_empty_formula_has_no_regions():
+    assert partition_clauses([], 4) == []
@@ -0,0 +1,157 @@
+import itertools
+
+from hypothesis import given
+from hypothesis import settings
+
+from satreduce import reducer as reducer_module
+from satreduce.preprocessing import eliminate_variables
+from satreduce.preprocessing import elimination_order
+from satreduce.preprocessing import normalise
+from satreduce.preprocessing import remove_blocked_clauses
+from satreduce.preprocessing import remove_pure_literals
+from satreduce.preprocessing import remove_subsumed
+from satreduce.preprocessing import simplify
+from satreduce.preprocessing import strengthen
+from satreduce.reducer import SATShrinker
+from tests.sat_strategies import sat_clauses
+
+
+def models(clauses, variables):
+    result = set()
+    for signs in itertools.product((1, -1), repeat=len(variables)):
+        model = {v * s for v, s in zip(variables, signs)}
+        if all(any(l in model for l in c) for c in clauses):
+            result.add(frozenset(model))
+    return result
+
+
+def variables_of(clauses):
+    return sorted({abs(l) for c in clauses for l in c})
+
+
+@settings(max_examples=200)
+@given(sat_clauses())
+def test_simplify_preserves_models(clauses):
+    variables = variables_of(clauses)
+    assert models(simplify(clauses), variables) == models(clauses, variables)
+
+
+@settings(max_examples=200)
+@given(sat_clauses())
+def test_satisfiability_only_simplification_preserves_satisfiability(clauses):
+    variables = variables_of(clauses)
+    simplified = simplify(clauses, satisfiability_only=True)
+    assert bool(models(simplified, variables)) == bool(models(clauses, variables))
+    assert len(simplified) <= len(simplify(clauses))
+
+
+@settings(max_examples=200)
+@given(sat_clauses())
+def test_variable_elimination_preserves_satisfiability(clauses):
+    variables = variables_of(clauses)
+    eliminated, removed = eliminate_variables(clauses, elimination_order(clauses))
+    assert bool(models(eliminated, variables)) == bool(models(clauses, variables))
+    assert len(eliminated) <= len(normalise(clauses))
+    assert not set(removed) & set(variables_of(eliminated))
+
+
+def test_removes_subsumed_and_duplicate_clauses():
+    assert remove_subsumed([[1, 2, 3], [2, 1], [1, 2], [3, 4]]) == [(1, 2), (3, 4)]
+
+
+def test_drops_tautologies():
+    assert remove_subsumed([[1, -1, 2], [3]]) == [(3,)]
+
+
+def test_self_subsuming_resolution():
+    assert strengthen([[1, 2], [-1, 2, 3]]) == [(1, 2), (2, 3)]
+
+
+def test_strengthens_chains_in_one_call():
+    # Each strengthening enables the next one along the chain.
+    chain = [[1]] + [[-i, i + 1] for i in range(1, 50)]
+    assert strengthen(chain) == [(i,) for i in range(1, 51)]
+
+
+def test_removes_pure_literals():
+    # 1 is pure, and once [1, 2] is gone so is -2.
+    assert remove_pure_literals([[1, 2], [-2, 3]]) == []
+    assert remove_pure_literals([[1], [-1], [1, 2]]) == [(-1,), (1,)]
+
+
+def test_removes_blocked_clauses():
+    # [1, 2] is blocked on 1: its only resolvent, with [-1, -2], is a
+    # tautology.
+    assert remove_blocked_clauses([[1, 2], [-1, -2], [2, 3], [-3, -2]]) == []
+    assert remove_blocked_clauses([[1], [-1]]) == [(-1,), (1,)]
+
+
+def test_eliminates_variables_without_adding_clauses():
+    clauses = [[1, 2], [-1, 3], [4], [-4], [5, 6], [-5, 2], [-5, 3], [-5, 4]]
+    eliminated, removed = eliminate_variables(clauses, [1, 4, 5])
+    # Eliminating 4 would produce the empty clause, so is skipped, while
+    # eliminating 5 replaces four clauses with three.
+    assert removed == [1, 5]
+    assert eliminated == [(-4,), (4,), (2, 3), (2, 6), (3, 6), (4, 6)]
+
+
+def test_elimination_order_prefers_fewest_resolvents():
+    # 3 is pure, so has no resolvents, 2 has at most two and 1 at most three.
+    clauses = [[1, 2], [-1, 2], [-1, 3], [-2, 3], [-1, 4]]
+    assert elimination_order(clauses) == [3, 4, 2, 1]
+
+
+def test_leaves_formulas_with_empty_clauses_alone():
+    assert simplify([[1, 2], [], [1]]) == [(), (1,), (1, 2)]
+
+
+def test_confirms_many_removals_with_one_test():
+    core = [[1, 2], [-1, -2], [2, 3]]
+    subsumed = [[1, 2, i] for i in range(3, 500)]
+    calls = []
+
+    def test(clauses):
+        calls.append(clauses)
+        return all(tuple(c) in clauses for c in map(sorted, core))
+
+    reducer = SATShrinker(core + subsumed, test)
+    n = len(calls)
+    reducer.preprocess()
+
+    # The first test confirmed every removal at once. Any after that are
+    # from the usual house keeping that follows a successful pass.
+    assert len(reducer.current) == 3
+    assert calls[n] == reducer.current
+
+
+def test_eliminates_many_variables_with_one_test():
+    n = 10
+    chain = [[1]] + [[-i, i + 1] for i in range(1, n)] + [[-n]]
+    calls = []
+
+    def test(clauses):
+        calls.append(clauses)
+        return not models(clauses, variables_of(clauses))
+
+    reducer = SATShrinker(chain, test)
+    n_calls = len(calls)
+    reducer.eliminate_variables()
+
+    assert reducer.current == ((-1,), (1,))
+    assert len(calls) - n_calls <= 3
+
+
+def test_does_not_preprocess_an_unchanged_problem(monkeypatch):
+    simplified = []
+
+    def counting_simplify(clauses, satisfiability_only=False):
+        simplified.append(clauses)
+        return simplify(clauses, satisfiability_only)
+
+    monkeypatch.setattr(reducer_module, "simplify", counting_simplify)
+    reducer = SATShrinker([[1, 2], [-1, 2], [2, 3]], lambda clauses: len(clauses) > 1)
+    reducer.preprocess()
+    n = len(simplified)
+    assert n > 0
+    reducer.preprocess()
+    assert len(simplified) == n
@@ -0,0 +1,95 @@
+import pstats
+import sys
+import time
+
+from satreduce.profiler import SamplingProfiler
+from satreduce.reducer import SATShrinker
+
+
+def test_ignores_threads_not_doing_reduction_work():
+    profiler = SamplingProfiler()
+    profiler.sample(sys._getframe())
+    assert profiler.samples == 0
+
+
+def test_classifies_samples_taken_while_testing():
+    profiler = SamplingProfiler()
+
+    def test(clauses):
+        profiler.sample(sys._getframe())
+        return len(clauses) > 1
+
+    SATShrinker([[1, 2], [2, 3], [-1]], test).reduce()
+
+    assert profiler.samples > 0
+    assert profiler.categories["test"] == profiler.samples
+
+
+def test_samples_running_reduction():
+    def test(clauses):
+        time.sleep(0.001)
+        return any(len(c) > 2 for c in clauses)
+
+    with SamplingProfiler(interval=0.001) as profiler:
+        SATShrinker(
+            [[1, 2, 3], [2, 3, 4], [-1, 2], [4, 5, 6]], test, parallelism=2
+        ).reduce()
+
+    assert profiler.samples > 0
+    assert profiler.categories["test"] > 0
+    assert profiler.wall_time > 0
+    assert sum(profiler.as_dict()["categories"].values()) == profiler.samples
+    assert "profile:" in profiler.format_summary()
+
+
+def profile_of_reduction():
+    profiler = SamplingProfiler()
+
+    def test(clauses):
+        profiler.sample(sys._getframe())
+        return len(clauses) > 1
+
+    SATShrinker([[1, 2], [2, 3], [-1]], test).reduce()
+    return profiler
+
+
+def test_writes_collapsed_stacks(tmpdir):
+    profiler = profile_of_reduction()
+    path = str(tmpdir / "profile.folded")
+    profiler.write(path)
+
+    with open(path) as i:
+        lines = i.read().splitlines()
+    assert lines
+    total = 0
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert stack.startswith("[test];")
+        assert "test (test_profiler.py:" in stack.split(";")[-1]
+        total += int(count)
+    assert total == profiler.samples
+
+
+def test_writes_pstats(tmpdir):
+    profiler = profile_of_reduction()
+    path = str(tmpdir / "profile.prof")
+    profiler.write(path)
+
+    stats = pstats.Stats(path)
+    assert stats.total_tt == profiler.samples * profiler.interval
+    functions = {name for _, _, name in stats.stats}
+    assert "reduce" in functions
+    assert "test" in functions
+
+
+def test_counts_recursive_functions_once():
+    profiler = SamplingProfiler(interval=1)
+    a = ("reducer.py", 1, "a")
+    b = ("reducer.py", 2, "b")
+    profiler.stacks[("reducer", (a, b, a))] = 3
+
+    data = profiler.pstats_data()
+
+    assert data[a][:4] == (3, 3, 3, 3)
+    assert data[b][:4] == (3, 3, 0, 3)
+    assert data[b][4] == {a: (3, 3, 0, 3)}
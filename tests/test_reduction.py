@@ -1,4 +1,7 @@
 import operator
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 from hypothesis import assume
@@ -8,10 +11,16 @@ from hypothesis import settings
 from hypothesis import strategies as st
 
 import satreduce.minisat as ms
+from satreduce.reducer import KnownNecessary
 from satreduce.reducer import NotFound
+from satreduce.reducer import ResourceLimitExceeded
 from satreduce.reducer import SATShrinker
+from satreduce.reducer import TimedOut
+from satreduce.reducer import calc_variables
 from satreduce.reducer import canonicalise
+from satreduce.reducer import join_components
 from satreduce.reducer import shrink_sat
+from satreduce.reducer import split_components
 from tests.sat_strategies import has_unique_solution
 from tests.sat_strategies import sat_clauses
 from tests.sat_strategies import unsatisfiable_clauses
@@ -182,3 +191,400 @@ def test_shrink_to_original(sat):
 @given(sat_clauses())
 def test_shrink_to_non_trivial(sat):
     assert shrink_sat(sat, lambda t: len(t) >= 1 and all(t)) == ((1,),)
+
+
+def test_records_per_pass_statistics():
+    reducer = SATShrinker([[1, 2], [2, 3], [3, 4]], lambda c: len(c) >= 1)
+
+    reducer.reduce()
+
+    stats = reducer.pass_stats
+    assert stats["delete_clauses"].runs >= 1
+    assert stats["delete_clauses"].successes >= 1
+    assert stats["delete_clauses"].bytes_removed > 0
+    assert stats["delete_clauses"].test_calls > 0
+
+
+def test_skips_passes_that_stop_making_progress():
+    reducer = SATShrinker([[1, 2], [3, 4]], lambda c: True)
+
+    stats = reducer.stats_for("merge_variables")
+    for _ in range(3):
+        stats.record_run(bytes_removed=0, wall_time=1.0)
+
+    names = [p.__name__ for p in reducer.scheduled_passes()]
+    assert "merge_variables" not in names
+    assert "delete_clauses" in names
+
+
+def test_reaches_full_fixpoint_despite_skipped_passes():
+    def test(clauses):
+        return any(len(c) >= 2 for c in clauses)
+
+    reducer = SATShrinker([[1, 2, 3], [4, 5, 6], [1, 4]], test)
+    for p in reducer.passes:
+        for _ in range(5):
+            reducer.stats_for(p.__name__).record_run(bytes_removed=0, wall_time=1.0)
+
+    reducer.reduce()
+
+    assert reducer.current == ((1, 2),)
+
+
+def test_stats_report_counts_cache_hits_and_latencies():
+    reducer = SATShrinker([[1, 2], [2, 3], [3, 4]], lambda c: len(c) >= 1)
+
+    reducer.reduce()
+
+    report = reducer.stats_report()
+    total = report["total"]
+    assert total["test_calls"] == sum(total["latency_histogram"].values())
+    assert total["cache_hits"] > 0
+    assert total["reductions"] > 0
+    assert total["max_queue_depth"] == 1
+    assert "delete_clauses" in reducer.format_stats()
+
+
+@pytest.mark.parametrize("parallel", (1, 2))
+def test_stops_after_max_tests(parallel):
+    calls = 0
+
+    def test(clauses):
+        nonlocal calls
+        calls += 1
+        return len(clauses) >= 1
+
+    chain = [[-i, i + 1] for i in range(1, 30)]
+    reducer = SATShrinker(chain, test, max_tests=5, parallelism=parallel)
+    reducer.reduce()
+
+    assert calls <= 5
+    assert reducer.budget_exhausted
+    assert test(reducer.current)
+
+
+def test_stops_at_deadline_with_best_so_far():
+    def test(clauses):
+        time.sleep(0.01)
+        return len(clauses) >= 3
+
+    chain = [[-i, i + 1] for i in range(1, 100)]
+    reducer = SATShrinker(chain, test, deadline=0.2)
+    start = time.monotonic()
+    reducer.reduce()
+
+    assert time.monotonic() - start < 1
+    assert reducer.budget_exhausted
+    assert 3 <= len(reducer.current) < len(chain)
+
+
+def test_deadline_cancels_tests_that_are_still_running():
+    killed = threading.Event()
+
+    def test(clauses):
+        if len(clauses) < 3:
+            # A slow test, which only finishes early if it's killed.
+            killed.wait(timeout=30)
+            return False
+        return True
+
+    reducer = SATShrinker([[1, 2], [2, 3], [3, 4]], test, deadline=0.5)
+    reducer.on_cancel(killed.set)
+    start = time.monotonic()
+    reducer.reduce()
+
+    assert time.monotonic() - start < 5
+    assert reducer.budget_exhausted
+
+
+def test_cancel_callbacks_run_once():
+    cancellations = []
+    reducer = SATShrinker([[1, 2], [2, 3]], lambda c: True, max_tests=2)
+    reducer.on_cancel(lambda: cancellations.append(True))
+
+    reducer.reduce()
+
+    assert cancellations == [True]
+
+
+def test_expensive_passes_go_last_when_out_of_time():
+    reducer = SATShrinker([[1, 2], [2, 3]], lambda c: True, deadline=10)
+    slow = reducer.stats_for("merge_variables")
+    slow.record_run(bytes_removed=1000, wall_time=100)
+
+    names = [p.__name__ for p in reducer.scheduled_passes()]
+
+    assert names[-1] == "merge_variables"
+
+
+def test_skips_deletions_known_to_be_necessary():
+    calls = []
+
+    def test(clauses):
+        calls.append(clauses)
+        return len(clauses) >= 3
+
+    reducer = SATShrinker([[1, 2], [2, 3], [3, 4], [4, 5]], test)
+    reducer.delete_clauses()
+    n = len(calls)
+    reducer.delete_clauses()
+
+    assert len(calls) == n
+
+
+def test_retries_necessary_deletions_when_neighbourhood_changes():
+    reducer = SATShrinker([[1, 2], [2, 3], [5, 6]], lambda c: len(c) >= 2)
+    tracker = KnownNecessary()
+    tracker.record(reducer.current, (1, 2))
+
+    assert tracker.is_known(reducer.current, (1, 2))
+    assert tracker.is_known([(1, 2), (2, 3)], (1, 2))
+    assert not tracker.is_known([(1, 2), (2, 4)], (1, 2))
+
+
+def test_known_necessary_survives_renaming():
+    tracker = KnownNecessary()
+    tracker.record([(2, 3), (3, 4)], (2, 3), 3)
+
+    tracker.rename({2: 1, -2: -1, 3: -2, -3: 2, 4: 3, -4: -3})
+
+    assert tracker.is_known([(-2, 1), (-2, 3)], (-2, 1), -2)
+
+
+@given(sat_clauses(), st.integers(0, 3))
+def test_result_is_one_minimal_despite_known_necessary(clauses, parity):
+    def test(clauses):
+        return len(clauses) >= 1 and sum(map(len, clauses)) % 4 == parity
+
+    assume(test(canonicalise(clauses)))
+
+    reducer = SATShrinker(clauses, test)
+    reducer.reduce()
+
+    for i in range(len(reducer.current)):
+        assert not test(reducer.current[:i] + reducer.current[i + 1 :])
+
+
+def test_split_and_join_components_round_trip():
+    clauses = canonicalise([[1, 2], [3, -4], [-2, 5], [6]])
+
+    parts = split_components(clauses)
+
+    assert sorted(map(len, parts)) == [1, 1, 2]
+    assert len(split_components(join_components(parts))) == 3
+    assert len(calc_variables(join_components(parts))) == 6
+
+
+@pytest.mark.parametrize("parallel", (1, 2))
+def test_reduces_components_independently(parallel):
+    def test(clauses):
+        # Needs a clause of length three and a separate clause of length two
+        # that don't share any variables.
+        wide = [c for c in clauses if len(c) >= 3]
+        narrow = [c for c in clauses if len(c) == 2]
+        return any(
+            not set(map(abs, a)) & set(map(abs, b)) for a in wide for b in narrow
+        )
+
+    reducer = SATShrinker(
+        [[1, 2, 3, 4], [2, 3, 4], [1, 3], [5, 6, 7], [6, 7], [7, 8]],
+        test,
+        parallelism=parallel,
+        split_components=True,
+    )
+    reducer.reduce_components_independently()
+
+    assert test(reducer.current)
+    assert sorted(map(len, reducer.current)) == [2, 3]
+
+
+@pytest.mark.parametrize("parallel", (1, 4))
+def test_deletes_whole_regions_of_large_problems(parallel):
+    calls = 0
+    clauses = [[i, i + 1, i + 2] for i in range(1, 200)]
+    needed = {(50, 51, 52), (150, 151, 152)}
+
+    def test(attempt):
+        nonlocal calls
+        calls += 1
+        return needed.issubset(attempt)
+
+    reducer = SATShrinker(clauses, test, coarse_threshold=100, parallelism=parallel)
+    reducer.delete_regions()
+
+    assert needed.issubset(reducer.current)
+    assert len(reducer.current) <= 20
+    assert calls < 100
+
+
+def test_only_uses_regions_above_threshold():
+    reducer = SATShrinker([[1, 2], [2, 3]], lambda c: True, coarse_threshold=3)
+
+    assert reducer.delete_regions not in reducer.passes
+
+
+def test_speculates_with_idle_workers():
+    speculated = threading.Event()
+
+    def test(clauses):
+        # find_first below never calls the test, so only speculation can
+        # try a candidate with a clause deleted.
+        if len(clauses) < 4:
+            speculated.set()
+        return True
+
+    reducer = SATShrinker(
+        [[1, 2], [2, 3], [3, 4], [4, 5]], test, parallelism=4, speculate=True
+    )
+    reducer.find_first([0], lambda x: True)
+
+    assert speculated.wait(timeout=10)
+
+
+def test_speculates_on_the_blocks_delete_clauses_will_try():
+    initial = [[i, i + 1] for i in range(1, 9)]
+    speculated = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def test(clauses):
+        if len(clauses) < len(initial):
+            with lock:
+                speculated.append(len(clauses))
+                if len(speculated) == 2:
+                    done.set()
+        return len(clauses) == len(initial)
+
+    reducer = SATShrinker(initial, test, parallelism=4, speculate=True)
+    reducer.find_first([0], lambda x: True)
+
+    assert done.wait(timeout=10)
+    # delete_clauses starts with blocks of half the problem, and with only
+    # two of them tries keeping each one alone. Deleting either block gives
+    # the same candidates again, so they aren't tested twice.
+    assert speculated == [4, 4]
+
+
+def test_does_not_speculate_when_disabled():
+    tested = []
+    lock = threading.Lock()
+
+    def test(clauses):
+        with lock:
+            tested.append(clauses)
+        return True
+
+    reducer = SATShrinker(
+        [[1, 2], [2, 3], [3, 4], [4, 5]], test, parallelism=4, speculate=False
+    )
+    current = reducer.current
+
+    def never(i):
+        reducer.test_function(current[:i])
+        return False
+
+    with pytest.raises(NotFound):
+        reducer.find_first(range(1, 4), never)
+
+    # The initial check, and one call for each prefix, but nothing else.
+    assert len(tested) == 4
+
+
+@given(sat_clauses())
+def test_parallel_speculative_shrink_is_still_valid(sat):
+    def test(clauses):
+        return len(clauses) >= 2 and all(clauses)
+
+    assume(test(canonicalise(sat)))
+
+    result = shrink_sat(sat, test, parallelism=4)
+
+    assert test(result)
+    assert len(result) == 2
+
+
+def test_identical_concurrent_tests_only_run_once():
+    release = threading.Event()
+    calls = []
+
+    def test(clauses):
+        if clauses == ((1, 2),):
+            calls.append(clauses)
+            release.wait(timeout=5)
+            return False
+        return True
+
+    reducer = SATShrinker([[1, 2], [2, 3]], test, parallelism=4)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(reducer.test_function, [[1, 2]])
+        second = executor.submit(reducer.test_function, [[2, 1]])
+        time.sleep(0.1)
+        release.set()
+        assert not first.result()
+        assert not second.result()
+
+    assert len(calls) == 1
+    assert reducer.stats_report()["total"]["deduplicated"] == 1
+
+
+def test_timeouts_are_uninteresting_and_counted_separately():
+    def test(clauses):
+        if len(clauses) == 1:
+            raise TimedOut()
+        return any(len(c) == 3 for c in clauses)
+
+    shrinker = SATShrinker([[1, 2, 3], [-1, 2], [2, 3]], test)
+    shrinker.reduce()
+    assert len(shrinker.current) == 2
+    report = shrinker.stats_report()
+    assert report["total"]["timeouts"] > 0
+    assert report["total"]["timeouts"] < report["total"]["test_calls"]
+
+
+def test_limit_violations_are_uninteresting_and_counted_separately():
+    def test(clauses):
+        if len(clauses) == 1:
+            raise ResourceLimitExceeded("memory")
+        return any(len(c) == 3 for c in clauses)
+
+    shrinker = SATShrinker([[1, 2, 3], [-1, 2], [2, 3]], test)
+    shrinker.reduce()
+    assert len(shrinker.current) == 2
+    report = shrinker.stats_report()
+    assert report["total"]["limits_exceeded"]["memory"] > 0
+    assert report["total"]["timeouts"] == 0
+
+
+@pytest.mark.parametrize("parallelism", [1, 4])
+def test_deletes_irrelevant_clauses_in_large_blocks(parallelism):
+    clauses = [[i, i + 1] for i in range(1, 500)]
+    needed = {(17, 18), (400, 401)}
+    calls = 0
+
+    def test(attempt):
+        nonlocal calls
+        calls += 1
+        return needed.issubset(map(tuple, attempt))
+
+    reducer = SATShrinker(clauses, test, coarse_threshold=None, parallelism=parallelism)
+    reducer.delete_clauses()
+
+    assert set(reducer.current) == needed
+    assert calls < 100
+
+
+def test_block_deletion_falls_back_to_single_clauses():
+    clauses = [[i, i + 1] for i in range(1, 30)]
+    # Every other clause is needed, so no block of two or more can be
+    # deleted, but each of the rest can be individually.
+    needed = {(i, i + 1) for i in range(1, 30, 2)}
+
+    reducer = SATShrinker(
+        clauses,
+        lambda attempt: needed.issubset(map(tuple, attempt)),
+        coarse_threshold=None,
+    )
+    reducer.delete_clauses()
+
+    assert set(reducer.current) == needed
@@ -0,0 +1,301 @@
+import time
+
+import pytest
+
+from satreduce import runner
+from satreduce.adaptive import AdaptiveTimeout
+from satreduce.reducer import TimedOut
+
+
+def test_runs_command_on_candidate():
+    command = runner.TestCommand(["grep", "-q", "1 -2"], basename="test.cnf")
+    assert command([[1, -2]])
+    assert not command([[1, 2]])
+
+
+def test_initial_timeout_is_an_error():
+    command = runner.TestCommand(
+        ["sleep", "5"], basename="test.cnf", input_type="stdin", timeout=0.1
+    )
+    with pytest.raises(ValueError):
+        command([[1]])
+
+
+def test_later_timeouts_raise_timed_out():
+    command = runner.TestCommand(
+        ["sleep", "5"], basename="test.cnf", input_type="stdin", timeout=0.1
+    )
+    command.first_call = False
+    with pytest.raises(TimedOut):
+        command([[1]])
+
+
+def test_adaptive_timeout_learns_from_completed_runs():
+    adaptive = AdaptiveTimeout(multiplier=2.0, floor=0.2, cap=5.0)
+    command = runner.TestCommand(
+        ["true"],
+        basename="test.cnf",
+        input_type="stdin",
+        timeout=5.0,
+        adaptive_timeout=adaptive,
+    )
+    assert command([[1]])
+    assert adaptive.as_dict()["samples"] == 1
+    assert adaptive.timeout_for(5) < 5.0
+
+    command.command = ["sleep", "5"]
+    with pytest.raises(TimedOut):
+        command([[1]])
+    assert adaptive.as_dict()["samples"] == 1
+
+
+def watch(script, **kwargs):
+    command = runner.TestCommand(
+        ["sh", "-c", script], basename="test.cnf", input_type="stdin", **kwargs
+    )
+    command.first_call = False
+    return command
+
+
+def test_stdout_match_kills_as_soon_as_it_matches():
+    command = watch("echo 'WRONG ANSWER'; sleep 10", stdout_match="^WRONG", timeout=5)
+    start = time.monotonic()
+    assert command([[1]])
+    assert time.monotonic() - start < 5
+
+
+def test_adaptive_timeout_ignores_tests_decided_early():
+    adaptive = AdaptiveTimeout(multiplier=2.0, floor=0.2, cap=5.0)
+    command = watch(
+        "echo WRONG; sleep 10", stdout_match="WRONG", adaptive_timeout=adaptive
+    )
+    assert command([[1]])
+    assert adaptive.as_dict()["samples"] == 0
+
+    # With exit codes to check, a matching test has to run to the end.
+    command.exit_codes = {0}
+    command.command = ["sh", "-c", "echo WRONG"]
+    assert command([[1]])
+    assert adaptive.as_dict()["samples"] == 1
+
+
+def test_stderr_match():
+    command = watch("echo 'assertion failed' >&2; exit 1", stderr_match="assertion")
+    assert command([[1]])
+    assert not watch("echo fine >&2", stderr_match="assertion")([[1]])
+
+
+def test_unmatched_output_is_uninteresting():
+    command = watch("echo RIGHT; exec 1>&-; sleep 10", stdout_match="WRONG", timeout=5)
+    start = time.monotonic()
+    assert not command([[1]])
+    assert time.monotonic() - start < 5
+
+
+def test_matches_across_reads():
+    command = watch("printf WR; sleep 0.1; echo ONG", stdout_match="WRONG")
+    assert command([[1]])
+
+
+def test_all_patterns_must_match():
+    script = "echo out; echo err >&2"
+    assert watch(script, stdout_match="out", stderr_match="err")([[1]])
+    assert not watch(script, stdout_match="out", stderr_match="nope")([[1]])
+
+
+def test_match_reads_candidate_on_stdin():
+    assert watch("cat", stdout_match=r"^1 -2 0")([[1, -2]])
+    assert not watch("cat", stdout_match=r"^1 -2 0")([[1, 2]])
+
+
+def test_exit_codes():
+    assert watch("exit 3", exit_codes={1, 3})([[1]])
+    assert not watch("exit 0", exit_codes={1, 3})([[1]])
+
+
+def test_match_and_exit_codes_must_both_hold():
+    assert watch("echo boom; exit 2", stdout_match="boom", exit_codes={2})([[1]])
+    assert not watch("echo boom; exit 0", stdout_match="boom", exit_codes={2})([[1]])
+
+
+def test_streamed_test_can_time_out():
+    command = watch("echo starting; sleep 10", stdout_match="done", timeout=0.2)
+    with pytest.raises(TimedOut):
+        command([[1]])
+
+
+def test_echoes_watched_output_when_debugging(capsys):
+    assert watch("echo WRONG", stdout_match="WRONG", debug=True)([[1]])
+    assert "WRONG" in capsys.readouterr().out
+
+
+def has_long_clause(clauses):
+    return any(len(c) >= 3 for c in clauses)
+
+
+def sleep_if_small(clauses):
+    if len(clauses) < 2:
+        time.sleep(10)
+    return True
+
+
+def fail_if_small(clauses):
+    if len(clauses) < 2:
+        raise RuntimeError("Oh no")
+    return True
+
+
+NOT_A_FUNCTION = 1
+
+
+def test_loads_test_functions():
+    function = runner.load_test_function("tests.test_runner:has_long_clause")
+    assert function.__name__ == "has_long_clause"
+    for spec in [
+        "tests.test_runner",
+        "tests.test_runner:no_such_function",
+        "tests.no_such_module:f",
+        "tests.test_runner:NOT_A_FUNCTION",
+    ]:
+        with pytest.raises(ValueError):
+            runner.load_test_function(spec)
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_runs_python_test_on_clauses(processes):
+    test = runner.PythonTest("tests.test_runner:has_long_clause", processes=processes)
+    try:
+        assert test(((1, 2, 3),))
+        assert not test(((1, 2), (3,)))
+    finally:
+        test.kill_all()
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_python_test_times_out(processes):
+    test = runner.PythonTest(
+        "tests.test_runner:sleep_if_small", processes=processes, timeout=0.5
+    )
+    try:
+        assert test(((1,), (2,)))
+        start = time.monotonic()
+        with pytest.raises(TimedOut):
+            test(((1,),))
+        assert time.monotonic() - start < 5
+        # A replacement worker takes over from one that was killed.
+        assert test(((1,), (2,)))
+    finally:
+        test.kill_all()
+
+
+def test_initial_python_test_timeout_is_an_error():
+    test = runner.PythonTest("tests.test_runner:sleep_if_small", timeout=0.1)
+    with pytest.raises(ValueError):
+        test(((1,),))
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_python_test_exceptions_are_uninteresting(processes):
+    test = runner.PythonTest("tests.test_runner:fail_if_small", processes=processes)
+    try:
+        assert test(((1,), (2,)))
+        assert not test(((1,),))
+    finally:
+        test.kill_all()
+
+    test = runner.PythonTest("tests.test_runner:fail_if_small", processes=processes)
+    try:
+        with pytest.raises(ValueError, match="Oh no"):
+            test(((1,),))
+    finally:
+        test.kill_all()
+
+
+def test_parses_solver_answers():
+    assert runner.parse_solver_output(10, "") == (runner.SATISFIABLE, [])
+    assert runner.parse_solver_output(20, "") == (runner.UNSATISFIABLE, [])
+    assert runner.parse_solver_output(0, "c hi\ns UNSATISFIABLE\n") == (
+        runner.UNSATISFIABLE,
+        [],
+    )
+    assert runner.parse_solver_output(0, "SATISFIABLE\nv 1 -2\nv 3 0\n") == (
+        runner.SATISFIABLE,
+        [1, -2, 3],
+    )
+    assert runner.parse_solver_output(1, "s UNKNOWN\n") == (None, [])
+
+
+def test_decides_disagreements():
+    sat = (runner.SATISFIABLE, [])
+    unsat = (runner.UNSATISFIABLE, [])
+    clauses = [(1, 2), (-1,)]
+    assert runner.differential_verdict(clauses, [sat, unsat])
+    assert not runner.differential_verdict(clauses, [sat, sat])
+    assert runner.differential_verdict(clauses, [sat, None]) is None
+    assert runner.differential_verdict(clauses, [(None, []), None]) is False
+
+    wrong = (runner.SATISFIABLE, [1, 2])
+    assert not runner.differential_verdict(clauses, [wrong, sat])
+    assert runner.differential_verdict(clauses, [wrong, None], check_models=True)
+    right = (runner.SATISFIABLE, [-1, 2])
+    assert not runner.differential_verdict(clauses, [right, sat], check_models=True)
+
+
+def solver(tmpdir, name, script):
+    path = tmpdir / name
+    path.write("#!/bin/sh\n" + script)
+    path.chmod(0o755)
+    return [str(path)]
+
+
+def test_differential_test_finds_disagreements(tmpdir):
+    sat = solver(tmpdir, "sat", "exit 10\n")
+    unsat = solver(tmpdir, "unsat", "echo 's UNSATISFIABLE'\n")
+    assert runner.DifferentialTest([sat, unsat], basename="test.cnf")([[1]])
+    assert not runner.DifferentialTest([sat, sat], basename="test.cnf")([[1]])
+
+
+def test_differential_test_stops_when_a_solver_fails(tmpdir):
+    crash = solver(tmpdir, "crash", "exit 1\n")
+    slow = solver(tmpdir, "slow", "sleep 10\nexit 10\n")
+    test = runner.DifferentialTest([slow, crash], basename="test.cnf")
+    start = time.monotonic()
+    assert not test([[1]])
+    assert time.monotonic() - start < 5
+
+
+def test_differential_adaptive_timeout_ignores_killed_solvers(tmpdir):
+    adaptive = AdaptiveTimeout(multiplier=2.0, floor=0.2, cap=20.0)
+    crash = solver(tmpdir, "crash", "exit 1\n")
+    slow = solver(tmpdir, "slow", "sleep 10\nexit 10\n")
+    sat = solver(tmpdir, "sat", "exit 10\n")
+
+    test = runner.DifferentialTest(
+        [slow, crash], basename="test.cnf", adaptive_timeout=adaptive
+    )
+    assert not test([[1]])
+    assert adaptive.as_dict()["samples"] == 0
+
+    test.commands = [sat, sat]
+    assert not test([[1]])
+    assert adaptive.as_dict()["samples"] == 1
+
+
+def test_differential_test_checks_models(tmpdir):
+    wrong = solver(tmpdir, "wrong", "echo 's SATISFIABLE'\necho 'v -1 0'\n")
+    slow = solver(tmpdir, "slow", "sleep 10\nexit 10\n")
+    test = runner.DifferentialTest(
+        [slow, wrong], basename="test.cnf", check_models=True
+    )
+    start = time.monotonic()
+    assert test([[1]])
+    assert time.monotonic() - start < 5
+
+
+def test_differential_test_times_out(tmpdir):
+    slow = solver(tmpdir, "slow", "sleep 10\nexit 10\n")
+    test = runner.DifferentialTest([slow, slow], basename="test.cnf", timeout=0.2)
+    with pytest.raises(ValueError):
+        test([[1]])
+    with pytest.raises(TimedOut):
+        test([[1]])
@@ -0,0 +1,54 @@
+from satreduce.stats import LatencyHistogram
+from satreduce.stats import PassStats
+from satreduce.stats import format_stats_table
+
+
+def test_histogram_buckets_by_powers_of_two():
+    histogram = LatencyHistogram()
+    histogram.record(0.0005)
+    histogram.record(0.003)
+    histogram.record(0.0035)
+    histogram.record(1.5)
+
+    assert histogram.as_dict() == {"<1ms": 1, "<4ms": 2, "<2048ms": 1}
+
+
+def test_reducer_time_excludes_waiting():
+    stats = PassStats("p")
+    stats.record_run(bytes_removed=0, wall_time=3.0)
+    stats.wait_time = 2.0
+
+    assert stats.reducer_time == 1.0
+
+
+def test_should_skip_does_not_change_backoff():
+    stats = PassStats("p")
+    for _ in range(3):
+        stats.record_run(bytes_removed=0, wall_time=1.0)
+
+    assert stats.should_skip()
+    assert stats.should_skip()
+    stats.skip_round()
+    assert stats.should_skip()
+    stats.skip_round()
+    assert not stats.should_skip()
+
+
+def test_gain_rate_is_per_second_of_test_time():
+    stats = PassStats("p")
+    stats.record_test(0.5, queue_depth=1)
+    stats.record_run(bytes_removed=99, wall_time=10.0)
+
+    assert stats.expected_gain_rate() == 200
+
+
+def test_table_has_a_row_per_pass_and_total():
+    stats = PassStats("delete_clauses")
+    stats.record_test(0.1, queue_depth=2)
+    report = {"passes": {"delete_clauses": stats.as_dict()}, "total": stats.as_dict()}
+
+    lines = format_stats_table(report).splitlines()
+
+    assert len(lines) == 3
+    assert lines[1].startswith("delete_clauses")
+    assert lines[2].startswith("total")
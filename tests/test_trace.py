@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from satreduce.reducer import SATShrinker
+from satreduce.reducer import cache_key
+from satreduce.reducer import canonicalise
+from satreduce.reducer import shrink_sat
+from satreduce.trace import ReplayOracle
+from satreduce.trace import TraceWriter
+from satreduce.trace import UnseenCandidate
+from satreduce.trace import load_trace
+
+
+def interesting(clauses):
+    return any(len(c) >= 2 for c in clauses)
+
+
+CLAUSES = [[1, 2, 3], [-1, 2], [2, 3, 4], [-4, -5]]
+
+
+def test_records_every_test_run(tmpdir):
+    path = str(tmpdir / "trace.txt")
+    calls = 0
+
+    def test(clauses):
+        nonlocal calls
+        calls += 1
+        return interesting(clauses)
+
+    with TraceWriter(path) as trace:
+        shrink_sat(CLAUSES, test, trace=trace)
+
+    recorded = load_trace(path)
+    assert len(recorded) == calls
+    assert recorded[cache_key(canonicalise(CLAUSES))][0]
+
+
+def test_replay_reproduces_reduction_without_running_test(tmpdir):
+    path = str(tmpdir / "trace.txt")
+    with TraceWriter(path) as trace:
+        expected = shrink_sat(CLAUSES, interesting, trace=trace)
+
+    oracle = ReplayOracle(path, strict=True)
+
+    assert shrink_sat(CLAUSES, oracle) == expected
+    assert oracle.misses == 0
+    assert oracle.hits > 0
+
+
+def test_strict_replay_raises_on_unseen(tmpdir):
+    path = str(tmpdir / "trace.txt")
+    with TraceWriter(path) as trace:
+        trace.record(cache_key(canonicalise([[1]])), True, 0.0)
+
+    oracle = ReplayOracle(path, strict=True)
+
+    assert oracle([[1]])
+    with pytest.raises(UnseenCandidate):
+        oracle([[2]])
+
+
+def test_replay_uses_fallback_for_unseen(tmpdir):
+    path = str(tmpdir / "trace.txt")
+    open(path, "w").close()
+
+    oracle = ReplayOracle(path, fallback=lambda c: True)
+
+    assert oracle([[1]])
+    assert oracle.misses == 1
+
+
+def test_unseen_candidates_default_to_uninteresting(tmpdir):
+    path = str(tmpdir / "trace.txt")
+    open(path, "w").close()
+
+    assert not ReplayOracle(path)([[1]])
+
+
+def test_ignores_truncated_lines(tmpdir):
+    path = str(tmpdir / "trace.txt")
+    with open(path, "w") as o:
+        o.write("1:6:abcdef01 1 0.5\n1:6:abcd")
+
+    assert load_trace(path) == {"1:6:abcdef01": (True, 0.5)}
+
+
+def test_simulates_latency(tmpdir):
+    path = str(tmpdir / "trace.txt")
+    key = cache_key(canonicalise([[1]]))
+    with TraceWriter(path) as trace:
+        trace.record(key, True, 0.05)
+
+    oracle = ReplayOracle(path, simulate_latency=True)
+    reducer = SATShrinker([[1]], oracle)
+
+    assert reducer.stats_report()["total"]["test_time"] >= 0.05
+
+
+def test_counts_hits_and_misses_from_many_threads(tmpdir):
+    path = str(tmpdir / "trace.txt")
+    with TraceWriter(path) as trace:
+        trace.record(cache_key(canonicalise([[1]])), True, 0.0)
+    oracle = ReplayOracle(path)
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(oracle, [[[1]], [[2]]] * 1000))
+
+    assert (oracle.hits, oracle.misses) == (1000, 1000)